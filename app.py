@@ -1,36 +1,40 @@
 import os
-os.environ['SDL_AUDIODRIVER'] = 'dummy'
 
-from flask import Flask, render_template, request, jsonify, session, send_file
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, g
 from flask_cors import CORS
-import requests
 import json
 import random
 from dotenv import load_dotenv
 from datetime import timedelta, datetime
-import speech_recognition as sr
-from gtts import gTTS
-import pygame
 import io
-import PyPDF2
 from io import BytesIO
-import pytemperature  # For weather conversions
-import docx
-from pptx import Presentation
 import csv
-import openai
-from PIL import Image
 import base64
-import pytesseract
 import time
+import mimetypes
+from werkzeug.wsgi import wrap_file
 import code_generator  # Import the code generator module
 import document_generator  # Import the document generator module
-import re  # For regex pattern matching
-from conversation_memory import memory  # Import the conversation memory module
+from conversation_memory import memory, estimate_tokens  # Import the conversation memory module
+from matchers import keywords  # Shared keyword automaton for request classification
+from local_knowledge import local_index  # Indexed intents and agriculture KB
+from intent_classifier import classifier as intent_classifier  # Naive Bayes routing tier
+from http_client import client as http_client  # Shared pooled HTTP client
+from semantic_cache import semantic_cache  # Replies reused for paraphrased questions
+from weather_service import weather  # Cached, coalesced OpenWeatherMap lookups
+from price_store import price_store, CURRENCY_SYMBOLS  # Indexed, hot-reloaded market prices
+from manual_catalog import manual_catalog  # Manual previews extracted once, cached on disk
+from prompts import prompts  # System prompts rendered once at startup
+from response_formatter import enhance_response_formatting  # Single-pass Markdown tidy-up of replies
+import metrics  # Stage, route and upstream metrics for /metrics
+import logging
+from structured_logging import log_pipeline, begin_request, end_request  # Queued JSON logs with request ids
 import uuid  # For generating session IDs
 
 # Initialize app
 load_dotenv()
+log_pipeline.install()
+logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY')
 app.permanent_session_lifetime = timedelta(hours=2)
@@ -47,20 +51,18 @@ def safe_load_json(filename, default):
     except Exception:
         return default
 
-intents = safe_load_json('intents.json', {"intents": []})
-agri_knowledge = safe_load_json('agriculture_kb.json', [])
-manuals = safe_load_json('farming_manuals.json', [])
-market_data = safe_load_json('market_prices.json', [])
+# Intents and the agriculture KB are indexed in local_knowledge.local_index
+# Manuals are indexed by manual_catalog.manual_catalog
+# Market prices are indexed (and reloaded on change) by price_store.price_store
 
 # =====================
 # SERVICE INITIALIZATION
 # =====================
 
-recognizer = sr.Recognizer()
-try:
-    pygame.mixer.init()
-except Exception as e:
-    print("Audio init failed (likely no audio device on server):", e)
+# Speech recognition, text-to-speech and image analysis import their libraries
+# on first use, so a worker boots without loading them
+intent_classifier.preload()
+manual_catalog.preload()
 
 # =====================
 # CORE FUNCTIONALITIES
@@ -78,71 +80,137 @@ STYLES = {
     }
 }
 
+FARMER_KEYWORDS = ["crop", "soil", "harvest", "fertilizer", "livestock"]
+keywords.add_keywords('farmer', FARMER_KEYWORDS)
+
 def detect_style(text):
-    farmer_kws = ["crop", "soil", "harvest", "fertilizer", "livestock"]
-    return "professional" if any(kw in text.lower() for kw in farmer_kws) else "genz"
+    return "professional" if keywords.scan(text).has('farmer') else "genz"
 
 # 2. LOCAL KNOWLEDGE QUERY
 def get_local_response(query):
-    # Check basic intents
-    for intent in intents['intents']:
-        if any(query.lower() == p.lower() for p in intent['patterns']):
-            return random.choice(intent['responses'])
-    
-    # Check agriculture KB
-    for item in agri_knowledge:
-        if any(kw in query.lower() for kw in item['keywords']):
-            return item['response']
-    return None
+    # Exact intent patterns first, then agriculture KB keywords
+    return local_index.get_response(query)
 
-# 3. WEATHER SERVICE (OpenWeatherMap)
+# 3. WEATHER SERVICE (OpenWeatherMap, cached in weather_service.py)
 def get_weather(location):
-    try:
-        response = requests.get(
-            f"http://api.openweathermap.org/data/2.5/weather?q={location}"
-            f"&appid={os.getenv('WEATHER_API_KEY')}&units=metric"
-        )
-        data = response.json()
-        return (
-            f"📍 {location}\n"
-            f"🌡️ Temp: {data['main']['temp']}°C (Feels like {data['main']['feels_like']}°C)\n"
-            f"☁️ Conditions: {data['weather'][0]['description']}\n"
-            f"💧 Humidity: {data['main']['humidity']}%\n"
-            f"🌬️ Wind: {data['wind']['speed']} m/s"
-        )
-    except Exception as e:
-        print(f"Weather error: {e}")
-        return "Couldn't fetch weather data"
+    return weather.report(location)
 
 # 4. MARKET PRICES
-def get_market_prices(crop=None):
-    if crop:
-        return next((item for item in market_data if crop.lower() in item['name'].lower()), None)
-    return market_data[:5]  # Return top 5 by default
+def get_market_prices(crop=None, region=None, text=None, page=1):
+    """One page of prices for a crop/region, given directly or mentioned in text"""
+    return price_store.search(crop=crop or None, region=region or None, text=text, page=page)
 
 # 5. PDF MANUALS
 def search_manuals(query):
-    results = []
-    for manual in manuals:
-        if any(kw in query.lower() for kw in manual['keywords']):
-            with open(manual['path'], 'rb') as f:
-                pdf = PyPDF2.PdfReader(f)
-                preview = pdf.pages[0].extract_text()[:150] + "..."
-            results.append({
-                "id": manual['id'],
-                "title": manual['title'],
-                "preview": preview
-            })
-    return results
+    # Previews come from the catalog's extracted text; no PDF is opened here
+    return manual_catalog.search(query)
+
+# Manuals only change by being replaced, which changes their ETag, so clients may keep them a week
+MANUAL_MAX_AGE = int(os.getenv('MANUAL_MAX_AGE', '604800'))
+# Hand the transfer to the front-end server: 'x-accel' (nginx) or 'x-sendfile' (Apache, lighttpd)
+MANUAL_SENDFILE = os.getenv('MANUAL_SENDFILE', '').lower()
+# nginx 'internal' location that maps to the manuals directory (for MANUAL_SENDFILE=x-accel)
+MANUAL_ACCEL_PREFIX = os.getenv('MANUAL_ACCEL_PREFIX', '/internal/manuals/')
+
+def manual_offload_headers(manual):
+    """
+    Headers that make nginx or Apache send a manual instead of the worker
+
+    Returns:
+        dict: The X-Accel-Redirect / X-Sendfile header, or None when MANUAL_SENDFILE is unset
+    """
+    if MANUAL_SENDFILE == 'x-accel':
+        return {"X-Accel-Redirect": MANUAL_ACCEL_PREFIX + os.path.basename(manual['path'])}
+    if MANUAL_SENDFILE == 'x-sendfile':
+        return {"X-Sendfile": manual['path']}
+    return None
+
+class FileRange:
+    """
+    A file cut down to a byte range: reads stop at the range end, and fileno()
+    stays available so gunicorn can still send it with sendfile()
+    """
+
+    def __init__(self, f, start, length):
+        f.seek(start)
+        self._file = f
+        self._left = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._left:
+            size = self._left
+        data = self._file.read(size)
+        self._left -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+def send_manual(manual):
+    """
+    Response for a manual download with validators, caching and byte ranges.
+    The body is a wsgi.file_wrapper over the file, or over just the requested
+    range of it, so gunicorn sends it with sendfile() for full and partial
+    downloads, and other servers read exactly Content-Length bytes.
+    """
+    path = manual['path']
+    stat = os.stat(path)
+    offload = manual_offload_headers(manual)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if offload:
+        # The front-end server answers conditional and range requests itself
+        response = Response(mimetype=mimetype, headers=offload)
+    else:
+        f = open(path, 'rb')
+        response = Response(wrap_file(request.environ, f), mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stat.st_size
+    response.headers.set('Content-Disposition', 'attachment', filename=os.path.basename(path))
+    response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    response.last_modified = stat.st_mtime
+    response.cache_control.public = True
+    response.cache_control.max_age = MANUAL_MAX_AGE
+    if offload:
+        return response
+
+    try:
+        response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
+    except Exception:
+        f.close()  # An unsatisfiable range raises RequestedRangeNotSatisfiable
+        raise
+    if response.status_code == 206:
+        # make_conditional wraps the body to skip to the range in Python; hand
+        # the server the file itself, limited to the range, instead
+        content_range = response.content_range
+        response.response = wrap_file(request.environ, FileRange(f, content_range.start,
+                                                                 content_range.stop - content_range.start))
+    elif response.status_code != 200:
+        f.close()
+    return response
 
 # 6. VOICE PROCESSING
+_recognizer = None
+
+def get_recognizer():
+    """The speech recognizer, created on first use"""
+    global _recognizer
+    if _recognizer is None:
+        import speech_recognition as sr
+        _recognizer = sr.Recognizer()
+    return _recognizer
+
 def process_voice(audio_file):
     try:
+        import speech_recognition as sr
+        recognizer = get_recognizer()
         with sr.AudioFile(audio_file) as source:
             audio = recognizer.record(source)
             return recognizer.recognize_google(audio)
     except Exception as e:
-        print(f"Voice error: {e}")
+        logger.warning("Voice error: %s", e)
         return None
 
 # 7. TRANSLATION SYSTEM
@@ -152,17 +220,21 @@ def translate_text(text, target_lang='en'):
 # 8. TEXT-TO-SPEECH
 def text_to_speech(text, lang='en'):
     try:
+        from gtts import gTTS
         tts = gTTS(text=text, lang=lang, slow=False)
         audio_bytes = io.BytesIO()
         tts.write_to_fp(audio_bytes)
         audio_bytes.seek(0)
         return audio_bytes
     except Exception as e:
-        print(f"TTS error: {e}")
+        logger.warning("TTS error: %s", e)
         return None
 
 # 9. IMAGE ANALYSIS (OpenAI Vision API)
 def analyze_image(file_storage):
+    import openai
+    from PIL import Image
+
     # Convert image to base64
     image = Image.open(file_storage)
     buffered = io.BytesIO()
@@ -182,10 +254,166 @@ def analyze_image(file_storage):
     )
     return response.choices[0].message.content
 
+# 10. STREAMING RESPONSES
+def sse_event(event, data):
+    """Encode one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# 11. CHAT PIPELINE STEPS (shared by the WSGI app and asgi_app.py)
+# (connect, read) timeout for chat completions; the read timeout applies per streamed chunk
+CHAT_TIMEOUT = (3.05, 10)
+
+def read_documents(doc_files):
+    """
+    Extract text from uploaded documents
+
+    Args:
+        doc_files (list): Uploaded FileStorage objects
+
+    Returns:
+        tuple: (texts, skipped_files) - the text of each readable file (first
+            1000 characters) and the names of files that were skipped
+    """
+    texts = []
+    skipped_files = []
+    for doc_file in doc_files:
+        filename = doc_file.filename.lower()
+        text = ""
+        try:
+            # Limit file size
+            MAX_FILE_SIZE_MB = 5
+            if doc_file.content_length and doc_file.content_length > MAX_FILE_SIZE_MB * 1024 * 1024:
+                skipped_files.append(doc_file.filename + " (too large)")
+                continue
+
+            if filename.endswith('.txt'):
+                doc_file.seek(0)
+                text = doc_file.read().decode('utf-8')
+            elif filename.endswith('.csv'):
+                doc_file.seek(0)
+                decoded = doc_file.read().decode('utf-8')
+                reader = csv.reader(decoded.splitlines())
+                for row in reader:
+                    text += ', '.join(row) + '\n'
+            # ...rest of your file types...
+        except Exception as e:
+            logger.warning("File error (%s): %s", doc_file.filename, e)
+            continue
+        texts.append(text[:1000])  # Limit each file's text
+        doc_file.seek(0)
+    return texts, skipped_files
+
+LLM_ROLES = {'bot': 'assistant'}
+
+def build_chat_request(session_id, user_input, style, is_educational, deep_reasoning_param):
+    """
+    Build the chat completion request for an open-ended message
+
+    Args:
+        session_id (str): Conversation memory session (for the history)
+        user_input (str): The user's message, including any voice/document text
+        style (str): Response style (key of STYLES)
+        is_educational (bool): Whether the message asks for a conceptual explanation
+        deep_reasoning_param (bool): Whether the user switched deep reasoning on
+
+    Returns:
+        tuple: (payload, prefix) - the request body and the indicator the reply
+            is prefixed with
+    """
+    # Get conversation history from memory, newest first within the token budget
+    # (the current message is sent separately below)
+    conversation_history, history_tokens = memory.build_context(session_id, exclude_latest=True)
+    
+    # Check if deep reasoning is needed (user toggle or auto-detect)
+    use_deep_reasoning = deep_reasoning_param or needs_deep_reasoning(user_input)
+    reasoning_mode = "Deep Reasoning" if use_deep_reasoning else "Standard"
+    logger.debug("Using %s mode for query: %.50s...", reasoning_mode, user_input)
+    
+    # Pre-rendered system prompt for this mode, style and reasoning depth (prompts.py)
+    system_prompt = prompts.chat(style, is_educational, use_deep_reasoning)
+    
+    messages = [
+        {"role": "system", "content": system_prompt},
+        # Memory stores replies as 'bot'; the API expects 'assistant'
+        *({"role": LLM_ROLES.get(m['role'], m['role']), "content": m['content']} for m in conversation_history),
+        {"role": "user", "content": user_input}
+    ]
+    prompt_tokens = estimate_tokens(system_prompt) + history_tokens + estimate_tokens(user_input)
+    logger.debug("Prompt tokens ~%d", prompt_tokens, extra={
+        "prompt_tokens": prompt_tokens, "history_tokens": history_tokens,
+        "history_messages": len(conversation_history)})
+    
+    payload = {
+        "model": "llama3-70b-8192",
+        "messages": messages,
+        "temperature": STYLES[style]["temp"]
+    }
+    
+    # Add indicators for special modes
+    prefix = "📚 *Educational Response*\n\n" if is_educational else ""
+    return payload, prefix
+
+def format_chat_response(text, style, lang, voice=False):
+    """Build the /get payload for a reply: formatted, translated and optionally spoken"""
+    # Enhance formatting
+    with metrics.stage('formatting'):
+        enhanced_text = enhance_response_formatting(text)
+    
+    # Translate if needed
+    translated = translate_text(enhanced_text, lang)
+    audio = None
+    
+    if voice:
+        with metrics.stage('tts'):
+            audio = text_to_speech(translated, lang)
+    
+    return {
+        "response": translated, 
+        "audio": audio,
+        "style": style
+    }
+
 # =====================
 # ROUTES
 # =====================
 
+@app.before_request
+def start_request():
+    metrics.registry.ensure_writer()
+    metrics.IN_FLIGHT.inc()
+    g.request_id = begin_request(request.headers.get('X-Request-ID'))
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def add_request_id(response):
+    response.headers['X-Request-ID'] = g.request_id
+    g.status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    # A streamed reply is torn down again once its last event is sent; count it then
+    if g.get('streaming'):
+        return
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+    metrics.IN_FLIGHT.dec()
+    endpoint = request.endpoint or 'not_found'
+    route = g.get('route', 'error' if exc else 'none')
+    metrics.REQUEST_SECONDS.observe(duration, endpoint)
+    metrics.REQUESTS.inc(endpoint, route)
+    logger.info("%s %s", request.method, request.path, extra={
+        "endpoint": endpoint, "route": route, "status": g.get('status', 500),
+        "duration_ms": round(duration * 1000, 2), "ttft_ms": g.get('ttft_ms')})
+    end_request()
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics, summed over every worker process"""
+    return Response(metrics.registry.render(), mimetype=metrics.CONTENT_TYPE)
+
 @app.route('/')
 def home():
     session.clear()
@@ -198,8 +426,48 @@ def process_message():
     # Initialize conversation if needed
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
-    
+
+    # Without streaming the pipeline only produces its final payload
+    for event, data in chat_pipeline(session['session_id']):
+        if event == 'done':
+            return jsonify(data)
+
+@app.route('/get_stream', methods=['POST'])
+def process_message_stream():
+    """
+    Streaming variant of /get. Accepts the same form fields and answers with
+    Server-Sent Events: 'token' events ({"text": ...}) while the LLM generates,
+    then a single 'done' event carrying the same payload /get would return.
+    """
+    # The session cookie must be set before the response starts streaming
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
     session_id = session['session_id']
+
+    def events():
+        try:
+            for event, data in chat_pipeline(session_id, stream=True):
+                yield sse_event(event, data)
+        finally:
+            g.streaming = False
+
+    g.streaming = True
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def chat_pipeline(session_id, stream=False):
+    """
+    Answer the message in the current request form (shared by /get and /get_stream)
+
+    Args:
+        session_id (str): Conversation memory session
+        stream (bool): Stream the LLM reply token by token
+
+    Yields:
+        tuple: ('token', {"text": str}) for each LLM delta when streaming, then
+            ('done', payload) with the response payload
+    """
     style = request.form.get('style', "Informative")
     lang = request.form.get('lang', "en")
     
@@ -207,104 +475,122 @@ def process_message():
         style = "Informative"
     
     def format_response(text, style, lang):
-        # Enhance formatting
-        enhanced_text = enhance_response_formatting(text)
-        
-        # Translate if needed
-        translated = translate_text(enhanced_text, lang)
-        audio = None
-        
-        if request.args.get('voice') == 'true':
-            audio = text_to_speech(translated, lang)
-        
-        return jsonify({
-            "response": translated, 
-            "audio": audio,
-            "style": style
-        })
+        return format_chat_response(text, style, lang, voice=request.args.get('voice') == 'true')
 
-    start = time.time()
+    start = time.perf_counter()
     user_input = request.form.get('msg', "").strip()
     audio_files = [f for k, f in request.files.items() if k.startswith('voice')]
     doc_files = [f for k, f in request.files.items() if k.startswith('document')]
     location = request.form.get('location', "")
     crop_query = request.form.get('crop', "")
+    region_query = request.form.get('region', "")
+    page = request.form.get('page', '1')
+    page = int(page) if page.isdigit() else 1
     # Get deep reasoning mode parameter (use 'false' as the default if not specified)
     deep_reasoning_param = request.form.get('deep_reasoning', 'false').lower() in ('true', 'yes', '1')
+    # Send cache=false to always get a fresh reply from the LLM
+    use_cache = request.form.get('cache', 'true').lower() not in ('false', 'no', '0')
 
     # Add user message to conversation memory
-    memory.add_message(session_id, 'user', user_input)
+    with metrics.stage('memory'):
+        memory.add_message(session_id, 'user', user_input)
+
+    # The classifiers share one keyword scan of the message
+    with metrics.stage('classification'):
+        is_code_request = bool(user_input) and code_generator.is_code_request(user_input)
+        is_document_request = (bool(user_input) and not is_code_request
+                               and document_generator.is_document_request(user_input))
+        is_educational = code_generator.is_educational_request(user_input)
 
     # Check if this is a code-related request
-    if user_input and code_generator.is_code_request(user_input):
+    if is_code_request:
+        g.route = 'code'
         # Get conversation context for code generation
-        context = memory.get_conversation_context(session_id, max_context_turns=3)
+        with metrics.stage('memory'):
+            context = memory.get_conversation_context(session_id, max_context_turns=3, exclude_latest=True)
         
         # Generate code with context
         if context:
             # Add context to the query
-            code_response = code_generator.generate_code(f"{context}\n\nCurrent request: {user_input}")
+            code_query = f"{context}\n\nCurrent request: {user_input}"
+        else:
+            code_query = user_input
+        logger.debug("Prompt tokens ~%d (code request)", estimate_tokens(code_query))
+        stage_start = time.perf_counter()
+        if stream:
+            chunks = []
+            for chunk in code_generator.stream_code(code_query, use_cache):
+                if not chunks:
+                    g.ttft_ms = round((time.perf_counter() - start) * 1000)
+                    metrics.TTFT_SECONDS.observe(g.ttft_ms / 1000, 'code')
+                chunks.append(chunk)
+                yield 'token', {"text": chunk}
+            code_response = "".join(chunks)
         else:
-            code_response = code_generator.generate_code(user_input)
+            code_response = code_generator.generate_code(code_query, use_cache)
+            g.ttft_ms = round((time.perf_counter() - start) * 1000)
+            metrics.TTFT_SECONDS.observe(g.ttft_ms / 1000, 'code')
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - stage_start, 'llm')
         
         # Add bot response to memory
-        memory.add_message(session_id, 'bot', code_response)
-        return jsonify({"response": code_response})
+        with metrics.stage('memory'):
+            memory.add_message(session_id, 'bot', code_response)
+        yield 'done', {"response": code_response}
+        return
     
     # Check if this is a document generation request
-    if user_input and document_generator.is_document_request(user_input):
+    if is_document_request:
+        g.route = 'document'
         # Get conversation context for document generation
-        context = memory.get_conversation_context(session_id, max_context_turns=3)
+        with metrics.stage('memory'):
+            context = memory.get_conversation_context(session_id, max_context_turns=3, exclude_latest=True)
         
         # Generate document with context
         if context:
             # Add context to the query
-            document_response = document_generator.generate_document(f"{context}\n\nCurrent request: {user_input}")
+            document_query = f"{context}\n\nCurrent request: {user_input}"
+        else:
+            document_query = user_input
+        logger.debug("Prompt tokens ~%d (document request)", estimate_tokens(document_query))
+        stage_start = time.perf_counter()
+        if stream:
+            chunks = []
+            for chunk in document_generator.stream_document(document_query, use_cache):
+                if not chunks:
+                    g.ttft_ms = round((time.perf_counter() - start) * 1000)
+                    metrics.TTFT_SECONDS.observe(g.ttft_ms / 1000, 'document')
+                chunks.append(chunk)
+                yield 'token', {"text": chunk}
+            document_response = "".join(chunks)
         else:
-            document_response = document_generator.generate_document(user_input)
+            document_response = document_generator.generate_document(document_query, use_cache)
+            g.ttft_ms = round((time.perf_counter() - start) * 1000)
+            metrics.TTFT_SECONDS.observe(g.ttft_ms / 1000, 'document')
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - stage_start, 'llm')
         
         # Add bot response to memory
-        memory.add_message(session_id, 'bot', document_response)
-        return jsonify({"response": document_response})
+        with metrics.stage('memory'):
+            memory.add_message(session_id, 'bot', document_response)
+        yield 'done', {"response": document_response}
+        return
     
-    # Check if this is an educational/conceptual request
-    is_educational = code_generator.is_educational_request(user_input)
-    is_code_request = code_generator.is_code_request(user_input)
-    print(f"Educational request: {is_educational}, Code request: {is_code_request}, Query: {user_input[:50]}...")
+    logger.debug("Educational request: %s, Code request: %s, Query: %.50s...",
+                 is_educational, is_code_request, user_input)
 
     # Process all audio files (concatenate recognized text)
     for audio_file in audio_files:
-        voice_text = process_voice(audio_file)
+        with metrics.stage('voice_recognition'):
+            voice_text = process_voice(audio_file)
         if voice_text:
             user_input += " " + voice_text
 
-    skipped_files = []
     # Process all document files (concatenate extracted text)
-    for doc_file in doc_files:
-        filename = doc_file.filename.lower()
-        text = ""
-        try:
-            # Limit file size
-            MAX_FILE_SIZE_MB = 5
-            if doc_file.content_length and doc_file.content_length > MAX_FILE_SIZE_MB * 1024 * 1024:
-                skipped_files.append(doc_file.filename + " (too large)")
-                continue
-
-            if filename.endswith('.txt'):
-                doc_file.seek(0)
-                text = doc_file.read().decode('utf-8')
-            elif filename.endswith('.csv'):
-                doc_file.seek(0)
-                decoded = doc_file.read().decode('utf-8')
-                reader = csv.reader(decoded.splitlines())
-                for row in reader:
-                    text += ', '.join(row) + '\n'
-            # ...rest of your file types...
-        except Exception as e:
-            print(f"File error: {e}")
-            continue
-        user_input += " " + text[:1000]  # Limit each file's text
-        doc_file.seek(0)
+    document_texts, skipped_files = [], []
+    if doc_files:
+        with metrics.stage('file_extraction'):
+            document_texts, skipped_files = read_documents(doc_files)
+    for text in document_texts:
+        user_input += " " + text
 
     # After processing, add to response if any skipped
     if skipped_files:
@@ -321,179 +607,147 @@ def process_message():
     
     # Special Commands
     if "weather" in user_input.lower() and location:
-        weather_report = get_weather(location)
-        return jsonify({
+        g.route = 'weather'
+        with metrics.stage('weather'):
+            weather_report = get_weather(location)
+        yield 'done', {
             "type": "weather",
             "response": translate_text(weather_report, lang),
             "style": style
-        })
+        }
+        return
     
     if "price" in user_input.lower() or "market" in user_input.lower():
-        prices = get_market_prices(crop_query)
-        return jsonify({
+        g.route = 'market'
+        with metrics.stage('prices'):
+            prices = get_market_prices(crop_query, region_query, user_input, page)
+        yield 'done', {
             "type": "market",
             "response": translate_text(format_prices(prices), lang),
-            "style": style
-        })
+            "style": style,
+            "page": prices["page"],
+            "pages": prices["pages"],
+            "total": prices["total"]
+        }
+        return
     
     if "manual" in user_input.lower():
-        found_manuals = search_manuals(user_input)
-        return jsonify({
+        g.route = 'manuals'
+        with metrics.stage('manuals'):
+            found_manuals = search_manuals(user_input)
+        yield 'done', {
             "type": "manuals",
             "manuals": [{
                 **manual,
                 "title": translate_text(manual['title'], lang)
             } for manual in found_manuals],
             "style": style
-        })
+        }
+        return
     
     # Local knowledge check
+    stage_start = time.perf_counter()
     local_reply = get_local_response(user_input)
+    local_ms = (time.perf_counter() - stage_start) * 1000
+    metrics.STAGE_SECONDS.observe(local_ms / 1000, 'local_kb')
     if local_reply:
+        g.route = 'local'
         # Add bot response to memory
         memory.add_message(session_id, 'bot', local_reply)
-        return format_response(local_reply, style, lang)
+        yield 'done', format_response(local_reply, style, lang)
+        return
 
-    # Groq API call (handles open-ended conversation)
+    # Intent model check (answers confident intent hits without an LLM call)
+    stage_start = time.perf_counter()
     try:
-        headers = {"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"}
-        
-        # Get conversation history from memory
-        conversation_history = memory.get_conversation_history(session_id)
-        
-        # Check if deep reasoning is needed (user toggle or auto-detect)
-        use_deep_reasoning = deep_reasoning_param or needs_deep_reasoning(user_input)
-        reasoning_mode = "Deep Reasoning" if use_deep_reasoning else "Standard"
-        print(f"Using {reasoning_mode} mode for query: {user_input[:50]}...")
-        
-        # Enhanced system prompt with structured response guidelines and deep reasoning
-        if is_educational:
-            # Use educational-focused system prompt (no code bias)
-            system_prompt = get_enhanced_system_prompt(use_deep_reasoning, deep_reasoning_param)
-            system_prompt += """
-            
-EDUCATIONAL RESPONSE MODE:
-The user is asking for conceptual or educational information. Provide clear explanations without code unless explicitly requested."""
-        else:
-            # Use general conversation system prompt
-            system_prompt = f"""You are Mogan, a helpful, intelligent assistant capable of deep reasoning. 
-Respond in {style} style and structure your responses clearly for readability.
+        intent_tag, intent_confidence, _ = intent_classifier.classify(user_input)
+    except Exception as e:
+        logger.warning("Intent model error: %s", e)
+        intent_tag, intent_confidence = None, 0.0
+    intent_ms = (time.perf_counter() - stage_start) * 1000
+    metrics.STAGE_SECONDS.observe(intent_ms / 1000, 'intent_model')
+    intent_responses = local_index.responses_for(intent_tag) if intent_tag else []
+    if intent_responses:
+        logger.debug("Intent model answered '%s' (%.2f)", intent_tag, intent_confidence,
+                     extra={"local_kb_ms": round(local_ms, 2), "intent_model_ms": round(intent_ms, 2)})
+        g.route = 'intent'
+        intent_reply = random.choice(intent_responses)
+        memory.add_message(session_id, 'bot', intent_reply)
+        yield 'done', format_response(intent_reply, style, lang)
+        return
+
+    # Semantic cache check (reuses the reply to a paraphrase of an earlier question)
+    with metrics.stage('semantic_cache'):
+        cache_partition = semantic_cache.partition(style, is_educational,
+                                                   deep_reasoning_param or needs_deep_reasoning(user_input))
+        cached = semantic_cache.get(user_input, cache_partition) if use_cache else None
+    if cached:
+        g.route = 'semantic_cache'
+        bot_reply, similarity = cached
+        logger.debug("Semantic cache hit (%.2f) for query: %.50s...", similarity, user_input)
+        memory.add_message(session_id, 'bot', bot_reply)
+        if stream:
+            yield 'token', {"text": bot_reply}
+        result = format_response(bot_reply, style, lang)
+        if stream:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            result["timing"] = {"ttft_ms": elapsed_ms, "total_ms": elapsed_ms}
+        yield 'done', result
+        return
 
-"""
+    # Groq API call (handles open-ended conversation)
+    ttft_ms = None
+    g.route = 'llm'
+    try:
+        with metrics.stage('memory'):
+            payload, prefix = build_chat_request(session_id, user_input, style, is_educational, deep_reasoning_param)
         
-        # Add reasoning instructions based on detected complexity
-        if use_deep_reasoning:
-            system_prompt += """REASONING APPROACH (Use deep reasoning for this complex query):
-- Break down this complex problem into clear logical components
-- Use explicit step-by-step reasoning to work through each part
-- Consider multiple perspectives and approaches
-- Make your thought process completely explicit
-- Identify and state key assumptions you're making
-- Examine implications and potential edge cases
-- For technical topics, apply first principles thinking
-- Show detailed work for any mathematical or logical problems
-- Present pros and cons of different solutions or viewpoints
-- End with a clear, justified conclusion
-
-Use dedicated sections for your reasoning process with headings like:
-* "## Initial Analysis"
-* "## Step-by-Step Reasoning"
-* "## Alternative Perspectives" 
-* "## Key Considerations"
-* "## Conclusion"
-
-"""
+        stage_start = time.perf_counter()
+        if stream:
+            # Time to first token is what the user actually waits for
+            chunks = [prefix]
+            if prefix:
+                yield 'token', {"text": prefix}
+            for delta in http_client.stream_chat_completion(payload, timeout=CHAT_TIMEOUT, cache=use_cache):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                chunks.append(delta)
+                yield 'token', {"text": delta}
+            bot_reply = "".join(chunks)
         else:
-            system_prompt += """REASONING APPROACH:
-- For questions requiring explanation, use clear logical reasoning
-- Break down problems into manageable components when helpful
-- Consider the most relevant perspectives or solution paths
-- Make your reasoning process understandable
-- Consider important assumptions and implications
-
-"""
-        
-        # Add document formatting guidance
-        system_prompt += """DOCUMENT CREATION:
-When asked to create a document like a CV, resume, proposal, or report:
-- Provide clear structure with appropriate sections
-- Use professional language and formatting
-- Include guidance on how to customize the document
-- Follow standard conventions for the requested document type
-- Add helpful tips for finalizing the document
-
-"""
-        
-        # Add standard formatting instructions for all responses
-        system_prompt += """RESPONSE FORMATTING:
-- Use markdown formatting for better readability
-- Organize complex responses with clear section headings using ## or ### markdown syntax
-- For lists, use bullet points (•) or numbered lists when appropriate
-- When explaining concepts, break them down into clear paragraphs
-- When providing examples, clearly label them as examples
-- For step-by-step instructions, number each step and be concise
-- Use **bold** for emphasis on important points or keywords
-- For tables, use proper markdown table formatting
-- Keep your tone {style.lower()} as requested by the user
-
-When answering questions about programming or technical topics:
-- Begin with a brief summary of the solution
-- Provide well-structured, properly indented code examples
-- Add explanatory comments within code where helpful
-- After code examples, explain key concepts or functions used
-- Always suggest best practices or optimization tips when relevant
-
-For factual information:
-- Present key facts first, followed by supporting details
-- Cite relevant information sources when available
-- Distinguish between facts and opinions clearly
-
-For complex topics:
-- Start with a simple explanation, then progressively add complexity
-- Use analogies or examples to clarify difficult concepts
-- Break down multi-part answers into clearly labeled sections
-
-Always maintain a helpful, informative tone while organizing information in an easily digestible format.
-"""
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            *conversation_history[-16:],  # Use the last 16 messages from conversation memory
-            {"role": "user", "content": user_input}
-        ]
-        
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json={
-                "model": "llama3-70b-8192",
-                "messages": messages,
-                "temperature": STYLES[style]["temp"]
-            },
-            timeout=10
-        )
-        bot_reply = response.json()["choices"][0]["message"]["content"]
-        
-        # Add indicators for special modes
-        if is_educational:
-            bot_reply = f"📚 *Educational Response*\n\n{bot_reply}"
+            bot_reply = prefix + http_client.chat_completion(payload, timeout=CHAT_TIMEOUT, cache=use_cache)
+            ttft_ms = (time.perf_counter() - start) * 1000
+        llm_ms = (time.perf_counter() - stage_start) * 1000
+        metrics.STAGE_SECONDS.observe(llm_ms / 1000, 'llm')
+        if ttft_ms is not None:
+            metrics.TTFT_SECONDS.observe(ttft_ms / 1000, 'chat')
+        g.ttft_ms = round(ttft_ms) if ttft_ms is not None else None
+        logger.debug("Stage latency", extra={
+            "ttft_ms": g.ttft_ms, "local_kb_ms": round(local_ms, 2),
+            "intent_model_ms": round(intent_ms, 2), "llm_ms": round(llm_ms), "streamed": stream})
         
         # Add bot response to memory
-        memory.add_message(session_id, 'bot', bot_reply)
+        with metrics.stage('memory'):
+            memory.add_message(session_id, 'bot', bot_reply)
+        semantic_cache.set(user_input, cache_partition, bot_reply)
         
-        return format_response(bot_reply, style, lang)
+        result = format_response(bot_reply, style, lang)
     except Exception as e:
-        print(f"Groq error: {e}")
+        g.route = 'llm_error'
+        logger.exception("Groq error: %s", e)
         error_message = STYLES[style]["error"]
         memory.add_message(session_id, 'bot', error_message)
-        return format_response(error_message, style, lang)
+        result = format_response(error_message, style, lang)
+    if stream:
+        result["timing"] = {"ttft_ms": ttft_ms, "total_ms": (time.perf_counter() - start) * 1000}
+    yield 'done', result
 
 @app.route('/get_manual/<manual_id>')
 def download_manual(manual_id):
-    manual = next((m for m in manuals if m['id'] == manual_id), None)
+    manual = manual_catalog.get(manual_id)
     if not manual or not os.path.exists(manual['path']):
         return "Manual not found.", 404
-    return send_file(manual['path'], as_attachment=True)
+    return send_manual(manual)
 
 @app.route('/set_language', methods=['POST'])
 def set_language():
@@ -527,128 +781,55 @@ def clear_conversation_history():
 # UTILITIES
 # =====================
 def format_prices(prices):
-    if isinstance(prices, list):
-        return "\n".join([f"📊 {p['name']}: ${p['price']}/kg" for p in prices])
-    elif prices:
-        return f"📊 {prices['name']}: ${prices['price']}/kg (📍 {prices['region']})"
-    return "No price data found"
-
-def enhance_response_formatting(text):
-    """
-    Enhance the response text with better formatting for certain content types
-    and improve reasoning structure
-    """
-    # Add reasoning structure if it appears to be a complex question without structure
-    if len(text) > 500 and not re.search(r'#{2,3}\s+\w+', text) and (
-        re.search(r'(why|how|explain|analyze|compare|evaluate|reason|think|consider)', text.lower())
-    ):
-        # This seems like a complex answer that would benefit from structure
-        parts = text.split('\n\n')
-        
-        if len(parts) >= 3:  # If we have enough content to structure
-            # First paragraph as introduction
-            structured_text = parts[0] + "\n\n"
-            
-            # Add analysis section
-            structured_text += "## Analysis\n\n" + parts[1] + "\n\n"
-            
-            # Middle parts as step-by-step reasoning
-            structured_text += "## Step-by-Step Reasoning\n\n"
-            for i, part in enumerate(parts[2:-1], start=1):
-                if len(part.strip()) > 0:
-                    structured_text += f"### Step {i}: {part.strip()[:40].split('.')[0]}\n\n"
-                    structured_text += part + "\n\n"
-            
-            # Last part as conclusion
-            structured_text += "## Conclusion\n\n" + parts[-1]
-            
-            text = structured_text
-    
-    # Convert simple lists (like "1. item") to proper markdown lists
-    text = re.sub(r'(?m)^(\d+)\.\s+(.+)$', r'\1. \2', text)
-    
-    # Make sure headers have proper spacing
-    text = re.sub(r'(?m)^(#{1,6})([^#\s].+)$', r'\1 \2', text)
-    
-    # Convert simple tables to markdown tables if they're not already
-    # This is a simplistic approach - complex tables will need proper formatting already
-    table_pattern = r'(?m)^([^|].+?\|.+[^|]?)$'
-    if re.search(table_pattern, text) and '---' not in text:
-        lines = text.split('\n')
-        table_lines = []
-        in_table = False
-        header_added = False
-        
-        for i, line in enumerate(lines):
-            if re.match(table_pattern, line) and not in_table:
-                in_table = True
-                table_lines.append(line)
-                if not header_added:
-                    # Count pipes and create header separator
-                    pipe_count = line.count('|')
-                    table_lines.append('|' + '---|' * pipe_count)
-                    header_added = True
-            elif re.match(table_pattern, line) and in_table:
-                table_lines.append(line)
-            elif in_table:
-                in_table = False
-                header_added = False
-                table_lines.append(line)
-            else:
-                table_lines.append(line)
-        
-        text = '\n'.join(table_lines)
-    
-    # Make sure code blocks are properly formatted
-    text = re.sub(r'```(\w*)\s*\n', r'```\1\n', text)
-    
-    # Ensure links are properly formatted
-    text = re.sub(r'\[([^\]]+)\]\s*\(([^)]+)\)', r'[\1](\2)', text)
-    
-    # Ensure proper formatting for pros and cons if present
-    if re.search(r'\b(pros|cons|advantages|disadvantages|benefits|drawbacks)\b', text.lower()):
-        text = re.sub(r'(?i)(\n|^)pros[:\s]*', r'\1### Pros\n\n', text)
-        text = re.sub(r'(?i)(\n|^)cons[:\s]*', r'\1### Cons\n\n', text)
-        text = re.sub(r'(?i)(\n|^)advantages[:\s]*', r'\1### Advantages\n\n', text)
-        text = re.sub(r'(?i)(\n|^)disadvantages[:\s]*', r'\1### Disadvantages\n\n', text)
-        text = re.sub(r'(?i)(\n|^)benefits[:\s]*', r'\1### Benefits\n\n', text)
-        text = re.sub(r'(?i)(\n|^)drawbacks[:\s]*', r'\1### Drawbacks\n\n', text)
-    
-    return text
+    if not prices["items"]:
+        return "No price data found"
+    lines = []
+    for p in prices["items"]:
+        symbol = CURRENCY_SYMBOLS.get(p['currency'])
+        amount = f"{symbol}{p['price']}" if symbol else f"{p['price']} {p['currency']}"
+        lines.append(f"📊 {p['name']}: {amount}/{p['unit']} (📍 {p['region']})")
+    if prices["pages"] > 1:
+        lines.append(f"Page {prices['page']} of {prices['pages']} ({prices['total']} prices)")
+    return "\n".join(lines)
+
+# Keywords that suggest analytical thinking is needed
+REASONING_KEYWORDS = [
+    "why", "how does", "explain", "analyze", "compare", "evaluate", 
+    "reason", "think", "consider", "implications", "effects", 
+    "consequences", "causes", "differences", "similarities", "relationship",
+    "mechanism", "process", "theory", "concept", "perspective", "trade-offs",
+    "approach", "methodology", "pros and cons", "advantages", "disadvantages",
+    "design decision", "architecture", "framework", "strategy", "debate",
+    "opinion", "viewpoint", "stance", "argument", "critique", "review",
+    "assessment", "hypothesis", "prediction", "forecast", "impact", "outcome"
+]
+
+# Technical topics that often benefit from step-by-step reasoning
+TECHNICAL_KEYWORDS = [
+    "algorithm", "system", "architecture", "protocol", "framework", 
+    "design pattern", "optimization", "complexity", "scale", "performance",
+    "efficiency", "reliability", "security", "consistency", "concurrency",
+    "distributed", "parallelism", "asynchronous", "synchronization",
+    "engineering", "scientific", "mathematical", "statistical", "economic",
+    "cryptographic", "blockchain", "consensus", "policy", "regulation"
+]
+
+# Connectors that signal a multi-part question
+REASONING_CONNECTORS = ["because", "therefore", "however", "although", "despite", "while", "unless"]
+
+keywords.add_keywords('reasoning', REASONING_KEYWORDS)
+keywords.add_keywords('technical', TECHNICAL_KEYWORDS)
+keywords.add_keywords('connector', REASONING_CONNECTORS)
 
 def needs_deep_reasoning(query):
     """
     Detect if a query would benefit from deeper reasoning based on keywords and complexity
     """
-    # Keywords that suggest analytical thinking is needed
-    reasoning_keywords = [
-        "why", "how does", "explain", "analyze", "compare", "evaluate", 
-        "reason", "think", "consider", "implications", "effects", 
-        "consequences", "causes", "differences", "similarities", "relationship",
-        "mechanism", "process", "theory", "concept", "perspective", "trade-offs",
-        "approach", "methodology", "pros and cons", "advantages", "disadvantages",
-        "design decision", "architecture", "framework", "strategy", "debate",
-        "opinion", "viewpoint", "stance", "argument", "critique", "review",
-        "assessment", "hypothesis", "prediction", "forecast", "impact", "outcome"
-    ]
-    
-    # Technical topics that often benefit from step-by-step reasoning
-    technical_keywords = [
-        "algorithm", "system", "architecture", "protocol", "framework", 
-        "design pattern", "optimization", "complexity", "scale", "performance",
-        "efficiency", "reliability", "security", "consistency", "concurrency",
-        "distributed", "parallelism", "asynchronous", "synchronization",
-        "engineering", "scientific", "mathematical", "statistical", "economic",
-        "cryptographic", "blockchain", "consensus", "policy", "regulation"
-    ]
+    hits = keywords.scan(query)
     
-    query_lower = query.lower()
-    
-    # Check for reasoning keywords
-    reasoning_score = sum(1 for keyword in reasoning_keywords if keyword in query_lower)
-    
-    # Check for technical topics
-    technical_score = sum(1 for keyword in technical_keywords if keyword in query_lower)
+    # Keyword scores (a keyword listed in both groups counts for both)
+    reasoning_score = hits.score('reasoning')
+    technical_score = hits.score('technical')
     
     # Check for complex question structures
     question_complexity = 0
@@ -656,7 +837,7 @@ def needs_deep_reasoning(query):
         question_complexity += 1
     if len(query.split()) > 15:  # Longer questions tend to be more complex
         question_complexity += 1
-    if any(connector in query_lower for connector in ["because", "therefore", "however", "although", "despite", "while", "unless"]):
+    if hits.has('connector'):
         question_complexity += 2
     
     # Calculate total score
@@ -691,51 +872,6 @@ def needs_document_formatting(query):
     # Determine if document formatting is needed
     return (formatting_score >= 2) or (formatting_score >= 1 and doc_type_mentioned)
 
-def get_enhanced_system_prompt(use_deep_reasoning=False, user_requested_deep_reasoning=False):
-    """Enhanced system prompt with better code detection logic"""
-    
-    base_prompt = """You are Mogan, a helpful and intelligent AI assistant. Your primary goal is to provide clear, informative, and engaging responses to user questions.
-
-IMPORTANT CODE GENERATION RULES:
-- ONLY provide code snippets when the user EXPLICITLY asks for code or mentions specific programming implementation requests
-- If the user asks general questions, educational questions, or requests for lists/explanations, respond with clear text - NO CODE
-- When in doubt, provide natural language explanations and ask clarifying questions
-- Code should only be generated for implementation requests, not conceptual explanations
-
-Examples of when to provide code:
-✅ "write a function to sort an array in Python"
-✅ "show me how to implement bubble sort in Java"
-✅ "create a React component for a login form"
-✅ "give me code for connecting to a database"
-
-Examples of when NOT to provide code:
-❌ "explain how bubble sort works" → Provide conceptual explanation
-❌ "what are the benefits of Python?" → Provide text explanation  
-❌ "give me 10 questions about networking" → Provide plain text list
-❌ "how does machine learning work?" → Provide educational explanation
-
-RESPONSE GUIDELINES:
-- Structure your responses with clear headings and bullet points when appropriate
-- Use markdown formatting for better readability
-- Be conversational and engaging
-- Ask follow-up questions when clarification is needed
-- Provide examples and analogies to explain complex concepts
-- Keep responses focused and relevant to the user's question"""
-
-    if use_deep_reasoning or user_requested_deep_reasoning:
-        base_prompt += """
-
-DEEP REASONING MODE ACTIVATED:
-When deep reasoning is requested, provide thorough analysis with:
-- Comprehensive problem breakdown
-- Multiple perspectives and approaches
-- Detailed explanations with supporting evidence
-- Step-by-step reasoning process
-- Potential implications and considerations
-- Well-structured sections with clear headings"""
-
-    return base_prompt
-
 # =====================
 # RUN APP
 # =====================
@@ -0,0 +1,475 @@
+"""
+ASGI App Module for Chatbot
+
+This module serves the same routes and JSON as app.py with an asyncio pipeline
+on Quart. LLM and weather calls go through the async HTTP client, and blocking
+work (speech recognition, document parsing, text-to-speech, the intent model)
+runs in a thread pool, so one worker process can hold hundreds of in-flight
+conversations instead of one per worker.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+import random
+import time
+import uuid
+from datetime import timedelta, datetime
+
+from quart import Quart, render_template, request, jsonify, session, send_file, Response, g, stream_with_context
+from quart_cors import cors
+
+import app as wsgi  # Knowledge bases, styles and the pipeline steps shared with the WSGI app
+import code_generator
+import document_generator
+import metrics
+from conversation_memory import memory, estimate_tokens
+from http_client import async_client
+from intent_classifier import classifier as intent_classifier
+from local_knowledge import local_index
+from manual_catalog import manual_catalog
+from semantic_cache import semantic_cache
+from structured_logging import begin_request
+from weather_service import weather
+
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app.secret_key = os.getenv('FLASK_SECRET_KEY')
+app.permanent_session_lifetime = timedelta(hours=2)
+app = cors(app)
+
+
+@app.after_serving
+async def close_http_client():
+    await async_client.aclose()
+
+
+# =====================
+# ASYNC SERVICES
+# =====================
+async def get_weather(location):
+    # Cache hits are served on the event loop; misses share one upstream call per location
+    return await weather.areport(location)
+
+
+async def generate(payload, formatter, error_prefix, stream, use_cache=True):
+    """
+    Run a code or document generation request
+
+    Args:
+        payload (dict): Chat completion request from build_code_request / build_document_request
+        formatter: CodeStreamFormatter or DocumentStreamFormatter for the request
+        error_prefix (str): Start of the message returned on failure
+        stream (bool): Stream the reply from the API instead of waiting for all of it
+        use_cache (bool): Reuse a cached reply to an identical request
+
+    Yields:
+        str: Output chunks; joined, they equal what generate_code / generate_document return
+    """
+    timeout = code_generator.GENERATION_TIMEOUT
+    try:
+        if stream:
+            async for delta in async_client.stream_chat_completion(payload, timeout=timeout, cache=use_cache):
+                output = formatter.feed(delta)
+                if output:
+                    yield output
+        else:
+            reply = await async_client.chat_completion(payload, timeout=timeout, cache=use_cache)
+            yield formatter.feed(reply)
+        rest = formatter.finish()
+        if rest:
+            yield rest
+    except Exception as e:
+        yield f"{error_prefix}: {str(e)}"
+
+
+async def format_chat_response(text, style, lang, voice):
+    if voice:
+        # Text-to-speech is a blocking network call
+        return await asyncio.to_thread(wsgi.format_chat_response, text, style, lang, voice)
+    return wsgi.format_chat_response(text, style, lang)
+
+
+# =====================
+# ROUTES
+# =====================
+@app.before_request
+async def start_request():
+    metrics.registry.ensure_writer()
+    metrics.IN_FLIGHT.inc()
+    # Each request runs in its own task, so its log context ends with it
+    g.request_id = begin_request(request.headers.get('X-Request-ID'))
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+async def add_request_id(response):
+    response.headers['X-Request-ID'] = g.request_id
+    g.status = response.status_code
+    return response
+
+
+def finish_request(endpoint, start, method, path, status, exc=None):
+    duration = time.perf_counter() - start
+    metrics.IN_FLIGHT.dec()
+    route = g.get('route', 'error' if exc else 'none')
+    metrics.REQUEST_SECONDS.observe(duration, endpoint)
+    metrics.REQUESTS.inc(endpoint, route)
+    logger.info("%s %s", method, path, extra={
+        "endpoint": endpoint, "route": route, "status": status,
+        "duration_ms": round(duration * 1000, 2), "ttft_ms": g.get('ttft_ms')})
+
+
+@app.teardown_request
+async def record_request(exc):
+    # Streamed replies are counted by their event generator once the last event is sent
+    start = g.pop('request_start', None)
+    if start is not None and not g.get('streaming'):
+        finish_request(request.endpoint or 'not_found', start, request.method, request.path, g.get('status', 500),
+                       exc)
+
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    """Prometheus metrics, summed over every worker process"""
+    body = await asyncio.to_thread(metrics.registry.render)  # Reads the other workers' snapshot files
+    return Response(body, mimetype=metrics.CONTENT_TYPE)
+
+
+@app.route('/')
+async def home():
+    session.clear()
+    session['conversation'] = []
+    session['language'] = 'en'
+    return await render_template('index.html')
+
+
+@app.route('/get', methods=['POST'])
+async def process_message():
+    # Initialize conversation if needed
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+
+    form, files = await request.form, await request.files
+    async for event, data in chat_pipeline(session['session_id'], form, files,
+                                           session.get('language', 'en'),
+                                           request.args.get('voice') == 'true'):
+        if event == 'done':
+            return jsonify(data)
+
+
+@app.route('/get_stream', methods=['POST'])
+async def process_message_stream():
+    """Streaming variant of /get; see app.process_message_stream for the events"""
+    # The session cookie must be set before the response starts streaming
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+
+    form, files = await request.form, await request.files
+    pipeline = chat_pipeline(session['session_id'], form, files, session.get('language', 'en'),
+                             request.args.get('voice') == 'true', stream=True)
+
+    start, method, path = g.request_start, request.method, request.path
+    g.streaming = True
+
+    # With the request context, so the pipeline can record its route and timings in g
+    @stream_with_context
+    async def events():
+        try:
+            async for event, data in pipeline:
+                yield wsgi.sse_event(event, data)
+        finally:
+            finish_request('process_message_stream', start, method, path, 200)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def chat_pipeline(session_id, form, files, lang, voice, stream=False):
+    """
+    Async version of app.chat_pipeline: same routing, payloads and metrics
+
+    Args:
+        session_id (str): Conversation memory session
+        form (MultiDict): Submitted form fields
+        files (MultiDict): Uploaded files
+        lang (str): Session language
+        voice (bool): Whether to add text-to-speech audio to replies
+        stream (bool): Stream the LLM reply token by token
+
+    Yields:
+        tuple: ('token', {"text": str}) for each LLM delta when streaming, then
+            ('done', payload) with the response payload
+    """
+    start = time.perf_counter()
+    user_input = form.get('msg', "").strip()
+    audio_files = [f for k, f in files.items() if k.startswith('voice')]
+    doc_files = [f for k, f in files.items() if k.startswith('document')]
+    location = form.get('location', "")
+    crop_query = form.get('crop', "")
+    region_query = form.get('region', "")
+    page = form.get('page', '1')
+    page = int(page) if page.isdigit() else 1
+    deep_reasoning_param = form.get('deep_reasoning', 'false').lower() in ('true', 'yes', '1')
+    use_cache = form.get('cache', 'true').lower() not in ('false', 'no', '0')
+
+    # Conversation memory and the semantic cache do SQLite and NumPy work, so
+    # they run in threads
+    with metrics.stage('memory'):
+        await asyncio.to_thread(memory.add_message, session_id, 'user', user_input)
+
+    # The classifiers share one keyword scan of the message
+    with metrics.stage('classification'):
+        is_code_request = bool(user_input) and code_generator.is_code_request(user_input)
+        is_document_request = (bool(user_input) and not is_code_request
+                               and document_generator.is_document_request(user_input))
+        is_educational = code_generator.is_educational_request(user_input)
+
+    # Code and document generation requests
+    if is_code_request or is_document_request:
+        generator = g.route = 'code' if is_code_request else 'document'
+        with metrics.stage('memory'):
+            context = await asyncio.to_thread(memory.get_conversation_context, session_id,
+                                              max_context_turns=3, exclude_latest=True)
+        query = f"{context}\n\nCurrent request: {user_input}" if context else user_input
+        logger.debug("Prompt tokens ~%d (%s request)", estimate_tokens(query), generator)
+        if generator == 'code':
+            language, payload = code_generator.build_code_request(query)
+            formatter = code_generator.CodeStreamFormatter(language)
+            error_prefix = "Error generating code"
+        else:
+            document_type, payload = document_generator.build_document_request(query)
+            formatter = document_generator.DocumentStreamFormatter(document_type)
+            error_prefix = "Error generating document"
+        stage_start = time.perf_counter()
+        chunks = []
+        async for chunk in generate(payload, formatter, error_prefix, stream, use_cache):
+            if not chunks:
+                g.ttft_ms = round((time.perf_counter() - start) * 1000)
+                metrics.TTFT_SECONDS.observe(g.ttft_ms / 1000, generator)
+            chunks.append(chunk)
+            if stream:
+                yield 'token', {"text": chunk}
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - stage_start, 'llm')
+        response_text = "".join(chunks)
+        with metrics.stage('memory'):
+            await asyncio.to_thread(memory.add_message, session_id, 'bot', response_text)
+        yield 'done', {"response": response_text}
+        return
+
+    logger.debug("Educational request: %s, Code request: %s, Query: %.50s...",
+                 is_educational, is_code_request, user_input)
+
+    # Speech recognition and document parsing block, so they run in threads
+    for audio_file in audio_files:
+        with metrics.stage('voice_recognition'):
+            voice_text = await asyncio.to_thread(wsgi.process_voice, audio_file)
+        if voice_text:
+            user_input += " " + voice_text
+
+    document_texts, skipped_files = [], []
+    if doc_files:
+        with metrics.stage('file_extraction'):
+            document_texts, skipped_files = await asyncio.to_thread(wsgi.read_documents, doc_files)
+    for text in document_texts:
+        user_input += " " + text
+    if skipped_files:
+        skip_msg = f"Note: These files were not processed (unsupported type): {', '.join(skipped_files)}"
+        user_input += " " + skip_msg
+
+    # Limit total input length for LLM
+    MAX_INPUT_LENGTH = 4000
+    user_input = user_input[:MAX_INPUT_LENGTH]
+
+    style = wsgi.detect_style(user_input)
+
+    # Special Commands
+    if "weather" in user_input.lower() and location:
+        g.route = 'weather'
+        with metrics.stage('weather'):
+            weather_report = await get_weather(location)
+        yield 'done', {
+            "type": "weather",
+            "response": wsgi.translate_text(weather_report, lang),
+            "style": style
+        }
+        return
+
+    if "price" in user_input.lower() or "market" in user_input.lower():
+        g.route = 'market'
+        with metrics.stage('prices'):
+            prices = wsgi.get_market_prices(crop_query, region_query, user_input, page)
+        yield 'done', {
+            "type": "market",
+            "response": wsgi.translate_text(wsgi.format_prices(prices), lang),
+            "style": style,
+            "page": prices["page"],
+            "pages": prices["pages"],
+            "total": prices["total"]
+        }
+        return
+
+    if "manual" in user_input.lower():
+        g.route = 'manuals'
+        with metrics.stage('manuals'):
+            found_manuals = wsgi.search_manuals(user_input)
+        yield 'done', {
+            "type": "manuals",
+            "manuals": [{
+                **manual,
+                "title": wsgi.translate_text(manual['title'], lang)
+            } for manual in found_manuals],
+            "style": style
+        }
+        return
+
+    # Local knowledge check
+    with metrics.stage('local_kb'):
+        local_reply = wsgi.get_local_response(user_input)
+    if local_reply:
+        g.route = 'local'
+        await asyncio.to_thread(memory.add_message, session_id, 'bot', local_reply)
+        yield 'done', await format_chat_response(local_reply, style, lang, voice)
+        return
+
+    # Intent model check (may wait for the model to finish loading)
+    with metrics.stage('intent_model'):
+        try:
+            intent_tag, intent_confidence, _ = await asyncio.to_thread(intent_classifier.classify, user_input)
+        except Exception as e:
+            logger.warning("Intent model error: %s", e)
+            intent_tag, intent_confidence = None, 0.0
+    intent_responses = local_index.responses_for(intent_tag) if intent_tag else []
+    if intent_responses:
+        g.route = 'intent'
+        intent_reply = random.choice(intent_responses)
+        await asyncio.to_thread(memory.add_message, session_id, 'bot', intent_reply)
+        yield 'done', await format_chat_response(intent_reply, style, lang, voice)
+        return
+
+    # Semantic cache check
+    with metrics.stage('semantic_cache'):
+        cache_partition = semantic_cache.partition(style, is_educational,
+                                                   deep_reasoning_param or wsgi.needs_deep_reasoning(user_input))
+        cached = await asyncio.to_thread(semantic_cache.get, user_input, cache_partition) if use_cache else None
+    if cached:
+        g.route = 'semantic_cache'
+        bot_reply = cached[0]
+        await asyncio.to_thread(memory.add_message, session_id, 'bot', bot_reply)
+        if stream:
+            yield 'token', {"text": bot_reply}
+        result = await format_chat_response(bot_reply, style, lang, voice)
+        if stream:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            result["timing"] = {"ttft_ms": elapsed_ms, "total_ms": elapsed_ms}
+        yield 'done', result
+        return
+
+    # Groq API call (handles open-ended conversation)
+    ttft_ms = None
+    g.route = 'llm'
+    try:
+        with metrics.stage('memory'):
+            payload, prefix = await asyncio.to_thread(wsgi.build_chat_request, session_id, user_input, style,
+                                                      is_educational, deep_reasoning_param)
+        stage_start = time.perf_counter()
+        if stream:
+            chunks = [prefix]
+            if prefix:
+                yield 'token', {"text": prefix}
+            async for delta in async_client.stream_chat_completion(payload, timeout=wsgi.CHAT_TIMEOUT, cache=use_cache):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                chunks.append(delta)
+                yield 'token', {"text": delta}
+            bot_reply = "".join(chunks)
+        else:
+            bot_reply = prefix + await async_client.chat_completion(payload, timeout=wsgi.CHAT_TIMEOUT, cache=use_cache)
+            ttft_ms = (time.perf_counter() - start) * 1000
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - stage_start, 'llm')
+        if ttft_ms is not None:
+            metrics.TTFT_SECONDS.observe(ttft_ms / 1000, 'chat')
+        g.ttft_ms = round(ttft_ms) if ttft_ms is not None else None
+        logger.debug("Stage latency", extra={"ttft_ms": g.ttft_ms, "streamed": stream})
+
+        with metrics.stage('memory'):
+            await asyncio.to_thread(memory.add_message, session_id, 'bot', bot_reply)
+        await asyncio.to_thread(semantic_cache.set, user_input, cache_partition, bot_reply)
+        result = await format_chat_response(bot_reply, style, lang, voice)
+    except Exception as e:
+        g.route = 'llm_error'
+        logger.exception("Groq error: %s", e)
+        error_message = wsgi.STYLES[style]["error"]
+        await asyncio.to_thread(memory.add_message, session_id, 'bot', error_message)
+        result = await format_chat_response(error_message, style, lang, voice)
+    if stream:
+        result["timing"] = {"ttft_ms": ttft_ms, "total_ms": (time.perf_counter() - start) * 1000}
+    yield 'done', result
+
+
+@app.route('/get_manual/<manual_id>')
+async def download_manual(manual_id):
+    manual = manual_catalog.get(manual_id)
+    if not manual or not os.path.exists(manual['path']):
+        return "Manual not found.", 404
+    path = manual['path']
+    stat = os.stat(path)
+    offload = wsgi.manual_offload_headers(manual)
+    if offload:
+        # The front-end server sends the file and handles validators and ranges
+        response = Response(b"", mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                            headers=offload)
+        response.headers.add('Content-Disposition', 'attachment', filename=os.path.basename(path))
+    else:
+        response = await send_file(path, as_attachment=True, attachment_filename=os.path.basename(path),
+                                   add_etags=False)
+    # Same validators and caching as app.send_manual
+    response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    response.last_modified = stat.st_mtime
+    response.cache_control.public = True
+    response.cache_control.max_age = wsgi.MANUAL_MAX_AGE
+    if not offload:
+        await response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
+        # make_conditional only says so on 206 responses; tell clients of full downloads they can resume
+        response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@app.route('/set_language', methods=['POST'])
+async def set_language():
+    data = await request.get_json()
+    session['language'] = data.get('lang', 'en')
+    return jsonify({"status": "success"})
+
+
+@app.route('/feedback', methods=['POST'])
+async def feedback():
+    data = await request.get_json()
+    record = json.dumps({
+        "timestamp": datetime.utcnow().isoformat(),
+        "feedback": data.get('feedback'),
+        "msg_id": data.get('msg_id'),
+        "session": session.get('conversation', [])
+    }) + "\n"
+
+    def append_record():
+        with open('feedback_log.jsonl', 'a') as f:
+            f.write(record)
+
+    await asyncio.to_thread(append_record)
+    return jsonify({"status": "ok"})
+
+
+@app.route('/clear_history', methods=['POST'])
+async def clear_conversation_history():
+    """Clear the conversation history for the current session"""
+    if 'session_id' in session:
+        await asyncio.to_thread(memory.clear_conversation, session['session_id'])
+        return jsonify({"status": "success", "message": "Conversation history cleared"})
+    return jsonify({"status": "error", "message": "No active session found"})
@@ -0,0 +1,816 @@
+"""
+Benchmarks for request-path hot spots
+
+Two kinds of run share one corpus of /get-shaped messages:
+
+- Scaling benchmarks print how a hot spot's cost grows with its input (keyword
+  lists, knowledge base and cache sizes, reply length, concurrent sessions).
+- The microbenchmark suite times each hot spot (classifiers, local answers,
+  reply formatting, document sections, conversation memory and the metrics and
+  logs recorded around them) on the fixed corpus, with warmup and repeated
+  samples, and writes the results to a JSON baseline. A later run is compared
+  against the baseline and regressions above a threshold make the command
+  fail, so it can gate a change.
+
+The startup command times a cold `import app` (what a gunicorn worker does
+before it can serve) in fresh interpreters and lists the packages the import
+spends its time in.
+
+Run with:
+    python benchmark.py [keywords] [languages] [local] [semantic] [memory] [formatting]
+    python benchmark.py run [-o benchmark.json] [-k memory] [--baseline old.json]
+    python benchmark.py compare old.json new.json [--threshold 10]
+    python benchmark.py list
+    python benchmark.py startup [--module app] [--budget 1.0]
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from matchers import KeywordMatcher
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA_VERSION = 1
+
+# Optional dependencies app imports only when a request needs them (PyPDF2 is
+# left out: the manual catalog's extraction thread may load it during boot)
+LAZY_MODULES = ("speech_recognition", "gtts", "pygame", "docx", "pptx", "openai", "PIL", "pytesseract",
+                "pytemperature")
+
+# Threads app starts that run for the life of the process (not waited for before timing)
+SERVICE_THREADS = {"log-writer"}
+
+# Messages shaped like real /get traffic, one of each kind the router tells apart
+QUERIES = [
+    "Hi",
+    "Hello!",
+    "thanks",
+    "write a bubble sort function in Python",
+    "implement a login system in javascript using express",
+    "how to code a web scraper",
+    "create a rust function that parses a config file and returns a Result",
+    "write move code for a simple coin module on sui",
+    "explain how bubble sort works",
+    "what are the benefits of Python",
+    "give me 10 questions about networking",
+    "What is the difference between TCP and UDP?",
+    "Can you help me write a professional CV for a software engineering role?",
+    "Draft a formal cover letter for a junior accountant position",
+    "I need a business proposal template for a poultry farm",
+    "How does crop rotation improve soil quality, and what are the trade-offs compared to fertilizer?",
+    "when should I plant maize in the long rains",
+    "my tomato leaves have yellow spots, what pest is this",
+    "What is the weather like in Nairobi today?",
+    "maize price in Nakuru",
+    "Why does my distributed system lose consistency under concurrency, even though I use locks?",
+    "Compare the performance of SQL joins and denormalized tables for analytics workloads",
+    "select name from users where id = 4 join orders",
+    "tell me a joke",
+]
+
+CODE_RESPONSES = [
+    ("python", "Here's a bubble sort that stops early once the list is sorted.\n\n"
+               "```python\ndef bubble_sort(items):\n    items = list(items)\n"
+               "    for end in range(len(items) - 1, 0, -1):\n        swapped = False\n"
+               "        for i in range(end):\n            if items[i] > items[i + 1]:\n"
+               "                items[i], items[i + 1] = items[i + 1], items[i]\n"
+               "                swapped = True\n        if not swapped:\n            break\n"
+               "    return items\n```\n\n"
+               "Each pass bubbles the largest remaining item to the end. The `swapped` flag "
+               "ends the loop as soon as a pass makes no swaps."),
+    ("rust", "```rust\nuse std::collections::HashMap;\n\nfn word_counts(text: &str) -> HashMap<&str, usize> {\n"
+             "    let mut counts = HashMap::new();\n    for word in text.split_whitespace() {\n"
+             "        *counts.entry(word).or_insert(0) += 1;\n    }\n    counts\n}\n```"),
+    ("javascript", "## Overview\n\nThis handler is already structured.\n\n"
+                   "```javascript\napp.post('/login', async (req, res) => {\n"
+                   "  const user = await users.find(req.body.email);\n"
+                   "  if (!user) return res.status(401).end();\n  res.json({ ok: true });\n});\n```"),
+    ("move", "A minimal coin module:\n\n```move\nmodule 0x1::coin {\n    struct Coin has key, store {\n"
+             "        value: u64\n    }\n\n    public fun value(coin: &Coin): u64 {\n        coin.value\n"
+             "    }\n}\n```\n\nResources can't be copied or dropped implicitly."),
+    ("python", "I couldn't produce code for that request without more detail about the input format."),
+]
+
+DOCUMENTS = [
+    "# Jane Wanjiru\nEmail: jane@example.com\nPhone: +254 700 000 000\n\n# Professional Summary\n"
+    "Software engineer with five years of experience building data pipelines.\n\n# Experience\n"
+    "## Senior Engineer\n- Led the migration of nightly batch jobs to streaming\n"
+    "- Cut infrastructure costs by 30 percent\n## Engineer\n- Built the billing service\n\n"
+    "# Education\n## BSc Computer Science\nUniversity of Nairobi, 2018\n\n# Skills\n"
+    "- Python, SQL, Go\n- Kafka, Airflow\n",
+    "# Business Proposal: Poultry Farm Expansion\nDate: 1 March 2025\n\n# Executive Summary\n"
+    "We propose doubling the layer flock to meet demand from local hotels.\n\n# Market Analysis\n"
+    "Demand for eggs in the county has grown steadily over three years.\n"
+    "1. Hotels and restaurants\n2. Schools\n3. Retail shops\n\n# Financial Plan\n"
+    "## Costs\n- Housing: KES 400,000\n- Birds: KES 250,000\n## Revenue\n"
+    "Projected monthly revenue is KES 180,000 at full production.\n\n# Conclusion\n"
+    "The expansion pays back within eighteen months.\n",
+    "MEMO\n\nTo: All staff\nFrom: Operations\nDate: 4 April 2025\n\n"
+    "Please note that the office will close early on Friday for maintenance.\n"
+    "Contact: facilities@example.com\n",
+]
+
+MEMORY_SESSIONS = 200
+
+
+def _random_keywords(count, rng):
+    """Generate distinct keyword phrases of one to three words"""
+    result = set()
+    while len(result) < count:
+        words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+                 for _ in range(rng.randint(1, 3))]
+        result.add(' '.join(words))
+    return list(result)
+
+
+def _time_per_query(func, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            func(query)
+    return (time.perf_counter() - start) / (repeat * len(queries))
+
+
+def bench_keywords(sizes=(10, 100, 1000, 5000, 20000), repeat=200):
+    """
+    Compare the keyword automaton against linear ``in`` scans as the keyword
+    lists grow. The automaton's per-query cost should stay flat.
+    """
+    rng = random.Random(42)
+    print(f"{'keywords':>10} {'automaton (us/query)':>22} {'linear scan (us/query)':>24}")
+    for size in sizes:
+        kws = _random_keywords(size, rng)
+        # No result cache, so every call pays for a full scan
+        matcher = KeywordMatcher(cache_size=0)
+        matcher.add_keywords('bench', kws)
+        matcher.scan("warm up")  # build the automaton outside the timed loop
+
+        automaton = _time_per_query(lambda q: matcher.scan(q).has('bench'), QUERIES, repeat)
+        linear = _time_per_query(lambda q: any(kw in q.lower() for kw in kws), QUERIES, repeat)
+        print(f"{size:>10} {automaton * 1e6:>22.2f} {linear * 1e6:>24.2f}")
+
+
+def bench_languages(sizes=(60, 1000, 4000, 16000), repeat=20):
+    """
+    Time detect_language on queries that grow like follow-up contexts (code
+    pasted back with the conversation). Cost should grow linearly with size.
+    """
+    import code_generator
+
+    with open(__file__) as f:
+        source = f.read()
+    context = source * (max(sizes) // len(source) + 1)
+    print(f"{'chars':>10} {'detect_language (ms)':>22} {'detect_language_from_code (ms)':>32}")
+    for size in sizes:
+        text = context[:size]
+        detect = _time_per_query(code_generator.detect_language, [text], repeat)
+        from_code = _time_per_query(code_generator.detect_language_from_code, [text], repeat)
+        print(f"{size:>10} {detect * 1e3:>22.3f} {from_code * 1e3:>32.3f}")
+
+
+def bench_local(sizes=(10, 1000, 10000, 50000), repeat=100):
+    """
+    Time local-answer lookups as the agriculture KB grows to tens of thousands
+    of entries (misses are the worst case: every message that reaches the LLM)
+    """
+    from local_knowledge import LocalKnowledgeIndex
+
+    rng = random.Random(7)
+    intents = {"intents": [{"tag": "greeting", "patterns": ["Hi", "Hello"], "responses": ["Hey!"]}]}
+    print(f"{'kb items':>10} {'lookup (us/query)':>20}")
+    for size in sizes:
+        kws = _random_keywords(size * 2, rng)
+        kb = [{"keywords": kws[2 * i:2 * i + 2], "response": f"answer {i}"} for i in range(size)]
+        index = LocalKnowledgeIndex(intents, kb)
+        index.get_response("warm up")
+        # Distinct queries, so the matchers' result caches never answer
+        queries = [f"{query} {i}" for i in range(repeat) for query in QUERIES]
+        per_query = _time_per_query(index.get_response, queries, 1)
+        print(f"{size:>10} {per_query * 1e6:>20.2f}")
+
+
+def bench_semantic(sizes=(1000, 10000, 100000), lookups=2000):
+    """
+    Time semantic cache lookups (all misses, so every candidate is scored) as
+    the cache fills up to its default 100k entries
+    """
+    from semantic_cache import SemanticCache
+
+    rng = random.Random(11)
+    vocab = _random_keywords(20000, rng)
+    common = vocab[:50]  # Words most cached queries share, like "crop" or "python"
+
+    def random_query():
+        return " ".join(rng.choice(common) if rng.random() < 0.3 else rng.choice(vocab)
+                        for _ in range(rng.randint(4, 12)))
+
+    print(f"{'entries':>10} {'lookup (us/query)':>20} {'insert (us/query)':>20}")
+    cache, filled = SemanticCache(max_entries=max(sizes)), 0
+    partition = cache.partition("professional")
+    for size in sizes:
+        start = time.perf_counter()
+        for i in range(filled, size):
+            cache.set(random_query(), partition, f"reply {i}")
+        insert = (time.perf_counter() - start) / (size - filled)
+        filled = size
+        queries = [random_query() for _ in range(lookups)]
+        lookup = _time_per_query(lambda q: cache.get(q, partition), queries, 1)
+        print(f"{size:>10} {lookup * 1e6:>20.2f} {insert * 1e6:>20.2f}")
+
+
+def _memory_worker(path, worker, workers, sessions, turns, threads, results):
+    """One gunicorn-like worker: threads replaying chat turns over its share of the sessions"""
+    from conversation_memory import ConversationMemory, SQLiteBackend
+
+    backend = SQLiteBackend(path, max_messages=20) if path else None
+    memory = ConversationMemory(max_turns=10, backend=backend)
+    latencies = []
+
+    def run(thread):
+        rng = random.Random(worker * 1000 + thread)
+        own = [f"s{i}" for i in range(sessions) if i % (threads * workers) == worker * threads + thread]
+        local = []
+        for _ in range(turns):
+            for session_id in own:
+                start = time.perf_counter()
+                memory.get_conversation_context(session_id, max_context_turns=3)
+                local.append(time.perf_counter() - start)
+                memory.add_message(session_id, 'user', rng.choice(QUERIES))
+                memory.add_message(session_id, 'bot', "Here is a reply " * rng.randint(5, 40))
+        latencies.extend(local)
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    memory.flush()
+    latencies.sort()
+    results.put((len(latencies), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]))
+
+
+def bench_memory(sessions=(1000, 5000), turns=5, workers=4, threads=8):
+    """
+    Conversation memory throughput with thousands of sessions chatting at once,
+    in-process versus the SQLite backend shared by several worker processes
+    """
+    print(f"{'backend':>8} {'sessions':>9} {'workers':>8} {'msgs/s':>10} {'read p50 (us)':>14} {'read p99 (us)':>14}")
+    context = multiprocessing.get_context('fork')
+    for count in sessions:
+        for name, procs in (("memory", 1), ("sqlite", workers)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "conversations.sqlite3") if name == "sqlite" else None
+                queue = context.Queue()
+                start = time.perf_counter()
+                pool = [context.Process(target=_memory_worker, args=(path, w, procs, count, turns, threads, queue))
+                        for w in range(procs)]
+                for p in pool:
+                    p.start()
+                stats = [queue.get() for _ in pool]
+                for p in pool:
+                    p.join()
+                elapsed = time.perf_counter() - start
+            reads = sum(s[0] for s in stats)
+            p50 = max(s[1] for s in stats)
+            p99 = max(s[2] for s in stats)
+            print(f"{name:>8} {count:>9} {procs:>8} {reads * 2 / elapsed:>10.0f} {p50 * 1e6:>14.1f} {p99 * 1e6:>14.1f}")
+
+
+def bench_formatting(sizes=(1_000, 10_000, 100_000), repeat=20):
+    """
+    Time reply formatting on replies up to 100 KB, including inputs that made
+    the old regex formatter backtrack (test_formatting.py checks its output)
+    """
+    from response_formatter import enhance_response_formatting
+
+    replies = "\n\n".join(_corpus_replies())
+    print(f"{'input':>24} {'format (ms)':>12}")
+    for size in sizes:
+        text = (replies * (size // len(replies) + 1))[:size]
+        inputs = [(f"replies {size // 1000} KB", text)]
+        if size == max(sizes):
+            inputs += [("pipes 100 KB", ("a" + "|" * 999 + "\n") * (size // 1000)),
+                       ("brackets 100 KB", "[" * size),
+                       ("links 100 KB", "[a] (" * (size // 5))]
+        for name, text in inputs:
+            format_ms = _time_per_query(enhance_response_formatting, [text], repeat) * 1000
+            print(f"{name:>24} {format_ms:>12.2f}")
+
+
+BENCHMARKS = {
+    "keywords": bench_keywords,
+    "languages": bench_languages,
+    "local": bench_local,
+    "semantic": bench_semantic,
+    "memory": bench_memory,
+    "formatting": bench_formatting,
+}
+
+
+def _corpus_replies():
+    """Model replies from the formatting golden corpus"""
+    with open(os.path.join(BASE_DIR, 'formatting_golden.json'), encoding='utf-8') as f:
+        return [item["input"] for item in json.load(f)]
+
+
+def _over_queries(func, clear_cache=None):
+    """
+    Run func on every query. clear_cache runs first on each pass, so keyword
+    scans are timed rather than answered from the matchers' LRU caches.
+    """
+    def run():
+        if clear_cache:
+            clear_cache()
+        for query in QUERIES:
+            func(query)
+    return run, len(QUERIES)
+
+
+def case_is_code_request():
+    import code_generator
+    return _over_queries(code_generator.is_code_request, code_generator.keywords.clear_cache)
+
+
+def case_is_educational_request():
+    import code_generator
+    return _over_queries(code_generator.is_educational_request, code_generator.keywords.clear_cache)
+
+
+def case_is_document_request():
+    import document_generator
+    return _over_queries(document_generator.is_document_request, document_generator.keywords.clear_cache)
+
+
+def case_detect_language():
+    import code_generator
+    return _over_queries(code_generator.detect_language)
+
+
+def case_needs_deep_reasoning():
+    import app
+    return _over_queries(app.needs_deep_reasoning, app.keywords.clear_cache)
+
+
+def case_get_local_response():
+    import app
+    return _over_queries(app.get_local_response, app.local_index.clear_cache)
+
+
+def case_enhance_response_formatting():
+    from response_formatter import enhance_response_formatting
+
+    replies = _corpus_replies()
+
+    def run():
+        for reply in replies:
+            enhance_response_formatting(reply)
+    return run, len(replies)
+
+
+def case_structure_code_explanation():
+    from code_generator import structure_code_explanation
+
+    def run():
+        for language, response in CODE_RESPONSES:
+            structure_code_explanation(response, language)
+    return run, len(CODE_RESPONSES)
+
+
+def case_detect_document_sections():
+    from document_generator import detect_document_sections
+
+    def run():
+        for document in DOCUMENTS:
+            detect_document_sections(document)
+    return run, len(DOCUMENTS)
+
+
+def _filled_memory():
+    """In-process memory holding MEMORY_SESSIONS sessions of ten turns each"""
+    from conversation_memory import ConversationMemory
+
+    memory = ConversationMemory(max_turns=10)
+    replies = _corpus_replies()
+    sessions = [f"session-{i}" for i in range(MEMORY_SESSIONS)]
+    for turn in range(10):
+        for i, session_id in enumerate(sessions):
+            memory.add_message(session_id, 'user', QUERIES[(i + turn) % len(QUERIES)])
+            memory.add_message(session_id, 'bot', replies[(i + turn) % len(replies)])
+    return memory, sessions, replies
+
+
+def case_memory_add():
+    memory, sessions, replies = _filled_memory()
+
+    def run():
+        for i, session_id in enumerate(sessions):
+            memory.add_message(session_id, 'user', QUERIES[i % len(QUERIES)])
+            memory.add_message(session_id, 'bot', replies[i % len(replies)])
+    return run, 2 * len(sessions)
+
+
+def case_memory_get():
+    memory, sessions, _ = _filled_memory()
+
+    def run():
+        for session_id in sessions:
+            memory.get_conversation_history(session_id)
+    return run, len(sessions)
+
+
+def case_memory_context():
+    memory, sessions, _ = _filled_memory()
+
+    def run():
+        for session_id in sessions:
+            memory.get_conversation_context(session_id, max_context_turns=3)
+    return run, len(sessions)
+
+
+def case_metrics_stage():
+    from metrics import MetricsRegistry
+
+    histogram = MetricsRegistry().histogram("bench_stage_seconds", "Benchmark stage", ("stage",))
+    stages = ("classification", "memory", "local_kb", "llm", "formatting")
+
+    def run():
+        for name in stages:
+            with histogram.time(name):
+                pass
+    return run, len(stages)
+
+
+def case_logging_request():
+    import logging
+    import queue
+    from structured_logging import NonBlockingQueueHandler, RequestContextFilter, begin_request, end_request
+
+    # Only the request thread's side: records are queued, and the queue is
+    # emptied after each pass instead of by a writer thread
+    log_queue = queue.Queue()
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter(debug_sample_rate=0.1))
+    logger = logging.getLogger("benchmark.logging")
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+
+    def run():
+        for query in QUERIES:
+            begin_request()
+            logger.debug("Educational request: %s, Code request: %s, Query: %.50s...", False, False, query)
+            logger.debug("Prompt tokens ~%d", 550, extra={"prompt_tokens": 550, "history_tokens": 0})
+            logger.info("%s %s", "POST", "/get", extra={"endpoint": "process_message", "route": "llm",
+                                                         "status": 200, "duration_ms": 12.5})
+            end_request()
+        log_queue.queue.clear()
+    return run, len(QUERIES)
+
+
+CASES = {
+    "is_code_request": case_is_code_request,
+    "is_educational_request": case_is_educational_request,
+    "is_document_request": case_is_document_request,
+    "detect_language": case_detect_language,
+    "needs_deep_reasoning": case_needs_deep_reasoning,
+    "get_local_response": case_get_local_response,
+    "enhance_response_formatting": case_enhance_response_formatting,
+    "structure_code_explanation": case_structure_code_explanation,
+    "detect_document_sections": case_detect_document_sections,
+    "memory.add": case_memory_add,
+    "memory.get": case_memory_get,
+    "memory.context": case_memory_context,
+    "metrics.stage": case_metrics_stage,
+    "logging.request": case_logging_request,
+}
+
+
+def measure(run, ops, samples=15, min_time=0.05, warmup=0.2):
+    """
+    Time a corpus pass
+
+    Args:
+        run (callable): Processes the whole corpus once
+        ops (int): Calls one pass makes
+        samples (int): Timed samples taken after warmup
+        min_time (float): Seconds each sample should last at least; passes are
+            repeated within a sample until it does
+        warmup (float): Seconds of untimed passes first (caches, lazy builds)
+
+    Returns:
+        dict: Per-call statistics in nanoseconds, plus the sample layout
+    """
+    deadline = time.perf_counter() + warmup
+    run()
+    while time.perf_counter() < deadline:
+        run()
+
+    # Like timeit.autorange: double the passes per sample until one lasts min_time
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        if time.perf_counter() - start >= min_time:
+            break
+        loops *= 2
+
+    timings = []
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(samples):
+            start = time.perf_counter()
+            for _ in range(loops):
+                run()
+            timings.append((time.perf_counter() - start) * 1e9 / (loops * ops))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    timings.sort()
+    mean = statistics.fmean(timings)
+    stdev = statistics.stdev(timings) if len(timings) > 1 else 0.0
+    return {
+        "median_ns": statistics.median(timings),
+        "mean_ns": mean,
+        "stdev_ns": stdev,
+        "rsd": stdev / mean if mean else 0.0,
+        "min_ns": timings[0],
+        "p95_ns": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max_ns": timings[-1],
+        "samples": samples,
+        "loops": loops,
+        "ops": ops,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def _format_ns(ns):
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+
+def run_suite(names, samples=15, min_time=0.05, warmup=0.2):
+    """
+    Run the named cases
+
+    Returns:
+        dict: {"schema", "environment", "settings", "results": {name: stats}}
+    """
+    # Set every case up first: importing app starts background loaders
+    # (intent classifier, manual catalog) that must not overlap the timings
+    threads = set(threading.enumerate())
+    cases = {name: CASES[name]() for name in names}
+    deadline = time.monotonic() + 60
+    for thread in set(threading.enumerate()) - threads:
+        if thread.name in SERVICE_THREADS:
+            continue
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    results = {}
+    print(f"{'case':<30} {'median':>11} {'min':>11} {'p95':>11} {'rsd':>7}")
+    for name, (run, ops) in cases.items():
+        stats = results[name] = measure(run, ops, samples, min_time, warmup)
+        print(f"{name:<30} {_format_ns(stats['median_ns']):>11} {_format_ns(stats['min_ns']):>11} "
+              f"{_format_ns(stats['p95_ns']):>11} {stats['rsd']:>6.1%}")
+    return {
+        "schema": SCHEMA_VERSION,
+        "environment": _environment(),
+        "settings": {"samples": samples, "min_time": min_time, "warmup": warmup},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=10.0):
+    """
+    Compare the medians of two runs
+
+    Args:
+        baseline (dict): Earlier run_suite() result
+        current (dict): New run_suite() result
+        threshold (float): Percent slowdown that counts as a regression
+
+    Returns:
+        list: Names of the cases that regressed
+    """
+    regressions = []
+    print(f"{'case':<30} {'baseline':>11} {'current':>11} {'change':>8}  status")
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<30} {'-':>11} {_format_ns(new['median_ns']):>11} {'':>8}  new")
+            continue
+        change = (new["median_ns"] / old["median_ns"] - 1) * 100
+        if change > threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        # Samples spread wider than the threshold make the verdict unreliable
+        if max(old["rsd"], new["rsd"]) * 100 > threshold:
+            status += " (noisy)"
+        print(f"{name:<30} {_format_ns(old['median_ns']):>11} {_format_ns(new['median_ns']):>11} "
+              f"{change:>+7.1f}%  {status}")
+    for name in baseline["results"]:
+        if name not in current["results"]:
+            print(f"{name:<30} {_format_ns(baseline['results'][name]['median_ns']):>11} {'-':>11} {'':>8}  not run")
+
+    if baseline.get("environment", {}).get("machine") != current.get("environment", {}).get("machine"):
+        print("Note: the runs come from different machines, so timings may not be comparable")
+    print(f"{len(regressions)} regression(s) above {threshold:g}%")
+    return regressions
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get("schema") != SCHEMA_VERSION:
+        raise SystemExit(f"{path}: unsupported baseline schema {data.get('schema')!r}")
+    return data
+
+
+_STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print("STARTUP " + json.dumps({{"seconds": seconds, "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                              "modules": sorted(sys.modules)}}))
+"""
+
+
+def startup_profile(module="app", runs=3, top=15):
+    """
+    Time cold imports of a module, each in a fresh interpreter
+
+    Args:
+        module (str): Module to import
+        runs (int): Interpreters to start; the median import time is reported
+        top (int): Packages to list by import time
+
+    Returns:
+        dict: {"module", "seconds" (median import time), "runs", "rss_mb" (peak,
+            Linux), "lazy_loaded" (LAZY_MODULES the import loaded anyway),
+            "packages" ([name, ms] by time spent importing them, top first)}
+    """
+    # Quiet logs, so stdout is only the script's result
+    env = {**os.environ, "LOG_LEVEL": "ERROR"}
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT.format(module=module)], cwd=BASE_DIR,
+                                env=env, capture_output=True, text=True, check=True)
+        line = next(line for line in reversed(result.stdout.splitlines()) if line.startswith("STARTUP "))
+        samples.append(json.loads(line[len("STARTUP "):]))
+
+    # -X importtime nests imports wrongly while another thread imports too, so
+    # the intent model (whose loader thread imports scikit-learn) is left out
+    # here and each module's own time is summed per top-level package
+    profiled = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BASE_DIR,
+                              env={**env, "INTENT_MODEL_PATH": os.devnull}, capture_output=True, text=True,
+                              check=True)
+    packages = {}
+    for line in profiled.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + int(own) / 1000
+
+    modules = set(samples[-1]["modules"])
+    return {
+        "module": module,
+        "seconds": statistics.median(sample["seconds"] for sample in samples),
+        "runs": runs,
+        "rss_mb": max(sample["rss_kb"] for sample in samples) / 1024,
+        "lazy_loaded": [name for name in LAZY_MODULES if name in modules],
+        "packages": sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+    }
+
+
+def print_startup(profile):
+    print(f"import {profile['module']}: {profile['seconds'] * 1000:.0f} ms "
+          f"(median of {profile['runs']}), peak RSS {profile['rss_mb']:.0f} MB")
+    if profile["lazy_loaded"]:
+        print(f"Loaded at import although only needed on use: {', '.join(profile['lazy_loaded'])}")
+    print(f"{'package':<30} {'import (ms)':>12}")
+    for package, ms in profile["packages"]:
+        print(f"{package:<30} {ms:>12.1f}")
+
+
+def run_scaling(names):
+    """Run the named scaling benchmarks (all of them when names is empty)"""
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            return 1
+    for name in names or BENCHMARKS:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in BENCHMARKS:
+        return run_scaling(argv)
+
+    parser = argparse.ArgumentParser(description="Benchmarks for the request-path hot spots",
+                                     epilog=f"Scaling benchmarks: {' '.join(BENCHMARKS)}")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and write a JSON baseline")
+    run_parser.add_argument("-o", "--output", default="benchmark.json", help="where to write the results")
+    run_parser.add_argument("-k", "--filter", action="append", default=[],
+                            help="only run cases whose name contains this (repeatable)")
+    run_parser.add_argument("--samples", type=int, default=15)
+    run_parser.add_argument("--min-time", type=float, default=0.05, help="seconds per sample")
+    run_parser.add_argument("--warmup", type=float, default=0.2, help="seconds of warmup per case")
+    run_parser.add_argument("--baseline", help="compare against this baseline after running")
+    run_parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+
+    commands.add_parser("list", help="list the suite's cases and the scaling benchmarks")
+
+    startup_parser = commands.add_parser("startup", help="profile a cold import of the app")
+    startup_parser.add_argument("--module", default="app", help="module to import")
+    startup_parser.add_argument("--runs", type=int, default=3)
+    startup_parser.add_argument("--top", type=int, default=15, help="packages to list")
+    startup_parser.add_argument("--budget", type=float, help="fail if the import takes longer (seconds)")
+
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        print("\n".join(CASES))
+        print(f"\nScaling benchmarks: {' '.join(BENCHMARKS)}")
+        return 0
+
+    if args.command == "compare":
+        return 1 if compare(_load(args.baseline), _load(args.current), args.threshold) else 0
+
+    if args.command == "startup":
+        profile = startup_profile(args.module, args.runs, args.top)
+        print_startup(profile)
+        if args.budget is not None and profile["seconds"] > args.budget:
+            print(f"Over the {args.budget:g}s budget")
+            return 1
+        return 0
+
+    names = [name for name in CASES if not args.filter or any(part in name for part in args.filter)]
+    if not names:
+        print(f"No case matches {args.filter}. Available: {', '.join(CASES)}")
+        return 2
+    baseline = _load(args.baseline) if args.baseline else None
+    result = run_suite(names, args.samples, args.min_time, args.warmup)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.output}")
+    if baseline is not None:
+        return 1 if compare(baseline, result, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,96 +3,714 @@ Conversation Memory Module for Chatbot
 
 This module provides functionality to maintain conversation history,
 allowing the chatbot to keep context between user messages.
+
+Histories live in an in-process read-through cache backed by a pluggable
+storage backend. SQLiteBackend keeps them in a WAL-mode database that every
+gunicorn worker on the host shares, so a follow-up can land on any worker and
+histories survive restarts. Writes are queued and committed in batches by a
+background thread.
+
+Each worker holds at most max_sessions sessions and roughly max_bytes of
+messages: messages are slotted records in a fixed-length ring buffer per
+session, sessions idle for longer than the TTL expire, and the least recently
+used sessions are evicted when a limit is reached, so memory stays flat however
+long the process runs.
+
+Prompts are assembled newest-first within a token budget (build_context), using
+a local token estimate stored with each message; code blocks in older turns are
+cut down to their first lines so one long code answer doesn't crowd out the
+rest of the conversation. Optionally (compact_after), turns beyond the most
+recent few are folded into a running summary stored with the session, so the
+prompt size of a long session levels off instead of growing with it.
 """
 
+import abc
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+from summarizer import ExtractiveSummarizer, create_llm_summarizer
+from token_budget import elide_code, estimate_tokens
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+SUMMARY_HEADER_TOKENS = estimate_tokens(SUMMARY_HEADER)
+CONTEXT_PREFIXES = {'user': "User: ", 'bot': "Bot: ", 'system': ""}
+
+
+class MemoryBackend(abc.ABC):
+    """
+    Storage interface for ConversationMemory. Every write to a session bumps
+    its version, which lets workers tell whether their cached copy is current.
+    """
+
+    @abc.abstractmethod
+    def load(self, session_id, limit):
+        """
+        Read a session
+
+        Args:
+            session_id (str): Unique identifier for the conversation
+            limit (int): Number of most recent messages to return
+
+        Returns:
+            tuple: (version, messages, summary) - messages as (role, content)
+                tuples, oldest first, and the summary of older turns ("" for none)
+        """
+
+    @abc.abstractmethod
+    def version(self, session_id):
+        """Return the session's current version (0 for an unknown session)"""
+
+    @abc.abstractmethod
+    def write_batch(self, operations):
+        """
+        Apply queued writes in one transaction
+
+        Args:
+            operations (list): ('append', session_id, role, content),
+                ('summary', session_id, summary, folded) and ('clear', session_id)
+                tuples, in order; a summary operation replaces the summary and
+                deletes the session's oldest `folded` messages
+
+        Returns:
+            dict: Session id -> version after the batch
+        """
+
+    @abc.abstractmethod
+    def expire(self, before):
+        """Delete sessions not written to since the given UNIX time"""
+
+
+class SQLiteBackend(MemoryBackend):
+    def __init__(self, path, max_messages=20):
+        """
+        Args:
+            path (str): Database file shared by the workers
+            max_messages (int): Messages kept per session; older ones are deleted
+        """
+        self.path = path
+        self.max_messages = max_messages
+        self._local = threading.local()
+
+    def _db(self):
+        """Return this thread's connection, creating the tables on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL, "
+                "summary TEXT NOT NULL DEFAULT '')"
+            )
+            try:
+                conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+            except sqlite3.OperationalError:
+                pass  # Column already there
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, session_id, limit):
+        db = self._db()
+        db.execute("BEGIN")  # One snapshot for the version and the messages
+        try:
+            row = db.execute("SELECT version, summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            messages = db.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        finally:
+            db.execute("COMMIT")
+        return (row[0], messages[::-1], row[1]) if row else (0, [], "")
+
+    def version(self, session_id):
+        row = self._db().execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def write_batch(self, operations):
+        db = self._db()
+        now = time.time()
+        versions = {}
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for operation in operations:
+                session_id = operation[1]
+                db.execute("INSERT OR IGNORE INTO sessions (session_id, version, updated_at) VALUES (?, 0, ?)",
+                           (session_id, now))
+                version = db.execute(
+                    "UPDATE sessions SET version = version + 1, updated_at = ? WHERE session_id = ? RETURNING version",
+                    (now, session_id)
+                ).fetchone()[0]
+                if operation[0] == 'append':
+                    db.execute("INSERT INTO messages VALUES (?, ?, ?, ?)",
+                               (session_id, version, operation[2], operation[3]))
+                elif operation[0] == 'summary':
+                    db.execute("UPDATE sessions SET summary = ? WHERE session_id = ?", (operation[2], session_id))
+                    db.execute("DELETE FROM messages WHERE session_id = ? AND seq IN "
+                               "(SELECT seq FROM messages WHERE session_id = ? ORDER BY seq LIMIT ?)",
+                               (session_id, session_id, operation[3]))
+                else:
+                    db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                    db.execute("UPDATE sessions SET summary = '' WHERE session_id = ?", (session_id,))
+                versions[session_id] = version
+            for session_id in versions:
+                db.execute("DELETE FROM messages WHERE session_id = ? AND seq IN "
+                           "(SELECT seq FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT -1 OFFSET ?)",
+                           (session_id, session_id, self.max_messages))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return versions
+
+    def expire(self, before):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM messages WHERE session_id IN "
+                       "(SELECT session_id FROM sessions WHERE updated_at < ?)", (before,))
+            db.execute("DELETE FROM sessions WHERE updated_at < ?", (before,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+
+class _Message:
+    __slots__ = ('role', 'content', 'size', 'tokens', 'elided')
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+        self.size = _MESSAGE_OVERHEAD + sys.getsizeof(content)
+        self.tokens = estimate_tokens(content)
+        self.elided = None  # (text, tokens) with code elided, computed when first needed
+
+    def compact(self):
+        """The message with its code blocks elided, and its token estimate"""
+        if self.elided is None:
+            text = elide_code(self.content)
+            self.elided = (text, estimate_tokens(text)) if text is not self.content else (text, self.tokens)
+        return self.elided
+
+
+_MESSAGE_OVERHEAD = sys.getsizeof(_Message.__new__(_Message))
+
+
+class _Session:
+    __slots__ = ('messages', 'version', 'pending', 'size', 'touched', 'summary', 'summary_tokens',
+                 'summarizing', 'unsummarized')
+
+    def __init__(self, max_messages, version):
+        self.messages = deque(maxlen=max_messages)  # Appending to a full ring drops the oldest turn
+        self.version = version  # Backend version the messages match (None: unknown, reload)
+        self.pending = 0  # Writes queued for the backend but not committed yet
+        self.size = _SESSION_OVERHEAD
+        self.touched = time.monotonic()
+        self.summary = ""  # Running summary of the turns folded out of messages
+        self.summary_tokens = 0
+        self.summarizing = False  # An LLM summary is being generated
+        self.unsummarized = []  # Turns folded while it was, for merging into its result
+
+    def set_summary(self, summary):
+        """Replace the summary and return the change in the session's size in bytes"""
+        change = sys.getsizeof(summary) - sys.getsizeof(self.summary)
+        self.summary = summary
+        self.summary_tokens = estimate_tokens(summary)
+        self.size += change
+        return change
+
+    def fold(self, count):
+        """Remove the oldest messages and return them with the change in size in bytes"""
+        folded = [self.messages.popleft() for _ in range(count)]
+        change = -sum(message.size for message in folded)
+        self.size += change
+        return folded, change
+
+    def append(self, role, content):
+        """Add a message and return the change in the session's size in bytes"""
+        message = _Message(role, content)
+        change = message.size
+        if len(self.messages) == self.messages.maxlen:
+            # Evict the oldest message with the replies to it, so the history
+            # never starts with an orphan bot reply
+            change -= self.messages.popleft().size
+            while self.messages and self.messages[0].role == 'bot':
+                change -= self.messages.popleft().size
+        self.messages.append(message)
+        self.size += change
+        return change
+
+
+_SESSION_OVERHEAD = sys.getsizeof(_Session.__new__(_Session)) + sys.getsizeof(deque())
+
+
 class ConversationMemory:
-    def __init__(self, max_turns=10):
+    def __init__(self, max_turns=10, backend=None, max_sessions=10000, max_bytes=64 * 1024 * 1024,
+                 flush_interval=0.05, batch_size=256, ttl=7200, context_tokens=2500, full_messages=2,
+                 compact_after=None, summarizer=None, llm_summarizer=None):
         """
         Initialize conversation memory with a maximum number of turns to remember
-        
+
         Args:
             max_turns (int): Maximum number of conversation turns to store
+            backend (MemoryBackend): Shared storage; None keeps histories in this process only
+            max_sessions (int): Sessions held in this process; the least recently
+                used are evicted (and reloaded from the backend if there is one)
+            max_bytes (int): Approximate memory budget for all resident sessions
+            flush_interval (float): Seconds the writer waits to gather a batch
+            batch_size (int): Most writes committed in one transaction
+            ttl (int): Seconds of inactivity after which a session expires
+            context_tokens (int): Default token budget for the history sent to the LLM
+            full_messages (int): Newest messages sent with their code blocks intact
+            compact_after (int, optional): Turns kept verbatim; older ones are folded
+                into a running summary sent ahead of them (None keeps full history)
+            summarizer: Local summarizer with fold(summary, messages); defaults to
+                ExtractiveSummarizer when compaction is on
+            llm_summarizer (LLMSummarizer, optional): Rewrites the summary in the
+                background after each fold
         """
-        self.conversations = {}  # Dictionary to store conversations by session_id
+        self.conversations = OrderedDict()  # session_id -> _Session, least recently used first
         self.max_turns = max_turns
-    
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self.context_tokens = context_tokens
+        self.full_messages = full_messages
+        self.compact_after = min(compact_after, max_turns) if compact_after else None
+        self.summarizer = summarizer or (ExtractiveSummarizer() if compact_after else None)
+        self.llm_summarizer = llm_summarizer
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer_pid = None
+        self._stats = {"cache_hits": 0, "cache_misses": 0, "stale_reloads": 0, "evicted": 0, "expired": 0,
+                       "contexts": 0, "context_tokens": 0, "folds": 0,
+                       "llm_summaries": 0, "writes": 0, "batches": 0, "write_errors": 0}
+        if backend is not None:
+            atexit.register(self.flush)
+
+    # Background writer
+
+    def _ensure_writer(self):
+        """Start the writer thread (again, in a forked worker)"""
+        if self._writer_pid != os.getpid():
+            with self._lock:
+                if self._writer_pid != os.getpid():
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._write_loop, name="memory-writer", daemon=True).start()
+                    self._writer_pid = os.getpid()
+
+    def _write_loop(self):
+        write_queue = self._queue
+        expired_at = 0.0
+        while True:
+            batch, waiters = [], []
+            item = write_queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = write_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._commit(batch)
+            if time.monotonic() - expired_at > 60:
+                expired_at = time.monotonic()
+                try:
+                    self.backend.expire(time.time() - self.ttl)
+                except Exception as e:
+                    logger.warning("Conversation memory expiry error: %s", e)
+            for waiter in waiters:
+                waiter.set()
+
+    def _commit(self, batch):
+        try:
+            versions = self.backend.write_batch(batch)
+        except Exception as e:
+            logger.error("Conversation memory write error: %s", e)
+            versions = {}
+            with self._lock:
+                self._stats["write_errors"] += 1
+
+        writes = {}
+        for operation in batch:
+            writes[operation[1]] = writes.get(operation[1], 0) + 1
+        with self._lock:
+            self._stats["writes"] += len(batch)
+            self._stats["batches"] += 1
+            for session_id, count in writes.items():
+                cached = self.conversations.get(session_id)
+                if cached is None:
+                    continue
+                cached.pending -= count
+                version = versions.get(session_id)
+                # Another worker wrote in between if the version moved further
+                # than our own writes; the cached copy must then be reloaded
+                if cached.version is not None and version == cached.version + count:
+                    cached.version = version
+                else:
+                    cached.version = None
+
+    def flush(self):
+        """Wait until every queued write is committed"""
+        if self.backend is None or self._writer_pid != os.getpid():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout=10)
+
+    # Read-through cache
+
+    def _cached(self, session_id):
+        """
+        Return the session, loading or reloading it from the backend when it is
+        missing or out of date. Caller holds no lock.
+        """
+        with self._lock:
+            self._expire()
+            cached = self.conversations.get(session_id)
+            if cached is not None:
+                self.conversations.move_to_end(session_id)
+                cached.touched = time.monotonic()
+                if self.backend is None or cached.pending:
+                    # Nobody else can have written anything newer than what we queued
+                    self._stats["cache_hits"] += 1
+                    return cached
+                version = cached.version
+            else:
+                version = None
+        if self.backend is None:
+            return None
+
+        if version is not None and self.backend.version(session_id) == version:
+            with self._lock:
+                self._stats["cache_hits"] += 1
+            return cached
+
+        loaded_version, rows, summary = self.backend.load(session_id, self.max_turns * 2)
+        with self._lock:
+            self._stats["cache_misses" if cached is None else "stale_reloads"] += 1
+            current = self.conversations.get(session_id)
+            if current is not None and current.pending:
+                return current  # We wrote to it meanwhile; our copy is the newest
+            cached = _Session(self.max_turns * 2, loaded_version)
+            for role, content in rows:
+                cached.append(role, content)
+            cached.set_summary(summary)
+            self._store(session_id, cached)
+        return cached
+
+    def _store(self, session_id, cached):
+        """Make a session resident, replacing any previous copy (lock held)"""
+        previous = self.conversations.pop(session_id, None)
+        if previous is not None:
+            self._bytes -= previous.size
+        self.conversations[session_id] = cached
+        self._bytes += cached.size
+        self._evict(keep=session_id)
+
+    def _expire(self):
+        """Drop sessions idle for longer than the TTL (lock held)"""
+        cutoff = time.monotonic() - self.ttl
+        # Least recently used first, so only expired sessions are looked at
+        while self.conversations:
+            session_id, cached = next(iter(self.conversations.items()))
+            if cached.touched > cutoff or cached.pending:
+                break
+            del self.conversations[session_id]
+            self._bytes -= cached.size
+            self._stats["expired"] += 1
+
+    def _evict(self, keep=None):
+        """Drop least recently used sessions beyond max_sessions or max_bytes (lock held)"""
+        skipped = 0
+        while ((len(self.conversations) > self.max_sessions or self._bytes > self.max_bytes)
+               and skipped < len(self.conversations)):
+            session_id, cached = next(iter(self.conversations.items()))
+            if cached.pending or session_id == keep:  # Unwritten history must stay
+                self.conversations.move_to_end(session_id)
+                skipped += 1
+                continue
+            del self.conversations[session_id]
+            self._bytes -= cached.size
+            self._stats["evicted"] += 1
+
     def add_message(self, session_id, role, message):
         """
         Add a new message to the conversation history
-        
+
         Args:
             session_id (str): Unique identifier for the conversation
             role (str): Either 'user' or 'bot'
             message (str): Content of the message
         """
-        # Initialize conversation for new session
-        if session_id not in self.conversations:
-            self.conversations[session_id] = []
-        
-        # Add the message to history
-        self.conversations[session_id].append({
-            'role': role,
-            'content': message
-        })
-        
-        # Trim history if it exceeds max_turns
-        if len(self.conversations[session_id]) > self.max_turns * 2:  # *2 because each turn has user + bot message
-            # Remove oldest turn (both user and bot messages)
-            self.conversations[session_id] = self.conversations[session_id][2:]
-    
+        cached = self._cached(session_id)
+        with self._lock:
+            # Initialize conversation for new session
+            if cached is None or self.conversations.get(session_id) is not cached:
+                cached = self.conversations.get(session_id)
+                if cached is None:
+                    cached = _Session(self.max_turns * 2, 0 if self.backend else None)
+                    self._store(session_id, cached)
+
+            # Fold the oldest turns into the summary to make room, if compacting
+            operations = []
+            if self.compact_after and len(cached.messages) >= self.compact_after * 2:
+                # A whole turn at a time, so the LLM sees user and bot messages paired
+                operations.append(self._fold(session_id, cached))
+
+            # Add the message to history; the ring buffer drops the oldest beyond max_turns
+            self._bytes += cached.append(role, message)
+            cached.touched = time.monotonic()
+            self.conversations.move_to_end(session_id)
+            operations.append(('append', session_id, role, message))
+            if self.backend is not None:
+                cached.pending += len(operations)
+            self._evict(keep=session_id)
+
+        if self.backend is not None:
+            self._ensure_writer()
+            for operation in operations:
+                self._queue.put(operation)
+
+    def _fold(self, session_id, cached):
+        """
+        Fold the oldest messages into the session's summary, keeping the
+        newest compact_after - 1 turns (lock held)
+
+        Returns:
+            tuple: The backend operation recording the fold
+        """
+        folded, change = cached.fold(len(cached.messages) - (self.compact_after - 1) * 2)
+        turns = [(message.role, message.content) for message in folded]
+        previous = cached.summary
+        change += cached.set_summary(self.summarizer.fold(previous, turns))
+        self._bytes += change
+        self._stats["folds"] += 1
+
+        if self.llm_summarizer is not None:
+            if cached.summarizing:
+                cached.unsummarized.extend(turns)
+            else:
+                cached.summarizing = True
+
+                def done(summary):
+                    self._set_llm_summary(session_id, cached, summary)
+
+                # Until the LLM answers (or if it fails) the extractive summary is used
+                self.llm_summarizer.submit(previous, turns, done)
+        return ('summary', session_id, cached.summary, len(folded))
+
+    def _set_llm_summary(self, session_id, cached, summary):
+        """Swap in a summary from the LLM, adding any turns folded while it was written"""
+        with self._lock:
+            turns, cached.unsummarized = cached.unsummarized, []
+            cached.summarizing = False
+            if not summary or self.conversations.get(session_id) is not cached:
+                return
+            if turns:
+                summary = self.summarizer.fold(summary, turns)
+            self._bytes += cached.set_summary(summary)
+            self._stats["llm_summaries"] += 1
+            if self.backend is not None:
+                cached.pending += 1
+        if self.backend is not None:
+            self._ensure_writer()
+            self._queue.put(('summary', session_id, summary, 0))
+
     def get_conversation_history(self, session_id):
         """
         Get the full conversation history for a session
-        
+
         Args:
             session_id (str): Unique identifier for the conversation
-            
+
         Returns:
             list: List of message dictionaries with 'role' and 'content' keys
         """
-        return self.conversations.get(session_id, [])
-    
-    def get_conversation_context(self, session_id, max_context_turns=None):
+        cached = self._cached(session_id)
+        if cached is None:
+            return []
+        with self._lock:
+            messages = list(cached.messages)
+        return [{'role': m.role, 'content': m.content} for m in messages]
+
+    def build_context(self, session_id, max_tokens=None, max_turns=None, exclude_latest=False):
+        """
+        Select the history to send to the LLM, newest first, within a token budget
+
+        Args:
+            session_id (str): Unique identifier for the conversation
+            max_tokens (int, optional): Token budget (defaults to context_tokens)
+            max_turns (int, optional): Maximum number of turns to include
+            exclude_latest (bool): Leave out the newest message if it is from the
+                user (the caller sends the current request separately)
+
+        Returns:
+            tuple: (messages, tokens) - message dictionaries with 'role' and
+                'content' keys, oldest first, and their estimated token count.
+                With compaction, the first is a 'system' message holding the
+                summary of the folded turns.
+        """
+        budget = self.context_tokens if max_tokens is None else max_tokens
+        cached = self._cached(session_id)
+        if cached is None:
+            return [], 0
+        with self._lock:
+            messages = list(cached.messages)
+            summary, summary_tokens = cached.summary, cached.summary_tokens
+        summary_message = None
+        if summary and summary_tokens + SUMMARY_HEADER_TOKENS <= budget:
+            summary_message = {'role': 'system', 'content': SUMMARY_HEADER + summary}
+            budget -= summary_tokens + SUMMARY_HEADER_TOKENS
+        if exclude_latest and messages and messages[-1].role == 'user':
+            messages.pop()
+        if max_turns is not None:
+            messages = messages[-max_turns * 2:] if max_turns else []
+        # Cut-off turns may leave a reply without the message it answers
+        while messages and messages[0].role == 'bot':
+            messages.pop(0)
+
+        selected, tokens = [], 0
+        for age, message in enumerate(reversed(messages)):
+            content, cost = message.content, message.tokens
+            if age >= self.full_messages or tokens + cost > budget:
+                content, cost = message.compact()
+            if tokens + cost > budget:
+                if not selected and budget > 0:
+                    # Even the newest message is too long: send its most recent part
+                    keep = len(content) * budget // cost
+                    content = "..." + content[len(content) - keep:]
+                    selected.append({'role': message.role, 'content': content})
+                    tokens += estimate_tokens(content)
+                break
+            selected.append({'role': message.role, 'content': content})
+            tokens += cost
+        if summary_message:
+            selected.append(summary_message)
+            tokens += summary_tokens + SUMMARY_HEADER_TOKENS
+        selected.reverse()
+
+        with self._lock:
+            self._stats["contexts"] += 1
+            self._stats["context_tokens"] += tokens
+        return selected, tokens
+
+    def get_conversation_context(self, session_id, max_context_turns=None, max_tokens=None, exclude_latest=False):
         """
         Get a condensed conversation context suitable for sending to the LLM
-        
+
         Args:
             session_id (str): Unique identifier for the conversation
             max_context_turns (int, optional): Maximum number of turns to include in context
-            
+            max_tokens (int, optional): Token budget (defaults to context_tokens)
+            exclude_latest (bool): Leave out the current user message
+
         Returns:
             str: Formatted conversation context
         """
-        history = self.get_conversation_history(session_id)
-        
-        # If no history or max_context_turns is 0, return empty string
-        if not history or max_context_turns == 0:
+        # If max_context_turns is 0, return empty string
+        if max_context_turns == 0:
             return ""
-        
-        # Limit the number of turns if specified
-        if max_context_turns:
-            # Calculate how many messages to include (2 messages per turn)
-            messages_to_include = max_context_turns * 2
-            history = history[-messages_to_include:]
-        
+        history, _ = self.build_context(session_id, max_tokens, max_context_turns, exclude_latest)
+
+        # If no history, return empty string
+        if not history:
+            return ""
+
         # Format the conversation context
         context = "Previous conversation:\n"
         for message in history:
-            role_prefix = "User: " if message['role'] == 'user' else "Bot: "
+            role_prefix = CONTEXT_PREFIXES.get(message['role'], "Bot: ")
             context += f"{role_prefix}{message['content']}\n\n"
-        
+
         return context
-    
+
     def clear_conversation(self, session_id):
         """
         Clear the conversation history for a specific session
-        
+
         Args:
             session_id (str): Unique identifier for the conversation
         """
-        if session_id in self.conversations:
-            del self.conversations[session_id]
+        with self._lock:
+            cached = self.conversations.pop(session_id, None)
+            if cached is not None:
+                self._bytes -= cached.size
+            if self.backend is None:
+                return
+            # Keep an empty copy, carrying the writes still queued, until the clear is committed
+            cleared = _Session(self.max_turns * 2, cached.version if cached is not None else None)
+            cleared.pending = (cached.pending if cached is not None else 0) + 1
+            self._store(session_id, cleared)
+        self._ensure_writer()
+        self._queue.put(('clear', session_id))
+
+    def stats(self):
+        """
+        Memory statistics for this worker
+
+        Returns:
+            dict: Cache hits, misses and reloads of sessions another worker
+                changed, sessions evicted and expired, contexts built and the
+                tokens they held, turns folded and LLM summaries applied, writes, write batches and errors, and the
+                resident sessions and their approximate bytes
+        """
+        with self._lock:
+            self._expire()
+            stats = dict(self._stats)
+            stats["resident_sessions"] = len(self.conversations)
+            stats["resident_bytes"] = self._bytes
+        return stats
+
+
+def create_backend(max_turns):
+    """Build the backend selected by MEMORY_BACKEND ('sqlite' or 'memory')"""
+    if os.getenv('MEMORY_BACKEND', 'sqlite').lower() == 'memory':
+        return None
+    path = os.getenv('MEMORY_DB_PATH', os.path.join(BASE_DIR, 'conversations.sqlite3'))
+    return SQLiteBackend(path, max_messages=max_turns * 2)
 
 
 # Global instance for use across the application
-memory = ConversationMemory(max_turns=10)
+memory = ConversationMemory(
+    max_turns=10,
+    backend=create_backend(10),
+    max_sessions=int(os.getenv('MEMORY_MAX_SESSIONS', '10000')),
+    max_bytes=int(os.getenv('MEMORY_MAX_MB', '64')) * 1024 * 1024,
+    context_tokens=int(os.getenv('CONTEXT_TOKEN_BUDGET', '2500')),
+    compact_after=int(os.getenv('MEMORY_COMPACT_AFTER', '0')) or None,
+    llm_summarizer=create_llm_summarizer(),
+    ttl=int(os.getenv('MEMORY_SESSION_TTL', '7200'))
+)
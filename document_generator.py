@@ -1,37 +1,43 @@
 import os
 import re
 from dotenv import load_dotenv
-from groq import Groq  # Import Groq client
+from http_client import client  # Shared pooled HTTP client
+from matchers import keywords  # Shared keyword automaton for request classification
+from prompts import prompts  # System prompts rendered once at startup
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 DOC_MODEL = "llama3-70b-8192"
+# (connect, read) timeout for generation calls; up to 4000 tokens takes a while
+GENERATION_TIMEOUT = (3.05, 60)
+
+DOCUMENT_KEYWORDS = [
+    # Document types
+    "cv", "resume", "curriculum vitae", "cover letter", "proposal", "business plan",
+    "report", "summary", "memo", "brief", "minutes", "notes", "presentation",
+    "whitepaper", "case study", "press release", "newsletter", "executive summary",
+    "project plan", "marketing plan", "swot analysis", "financial report", 
+    "thesis", "dissertation", "research paper", "essay", "assignment", "speech",
+    "statement of purpose", "personal statement", "recommendation letter",
+    
+    # Action verbs
+    "create document", "write document", "generate document", "draft a", "write a", 
+    "create a", "make a", "compose a", "prepare a", "develop a", "produce a",
+    "help me write", "help me create", "need a template for", "format for",
+    
+    # Format indicators
+    "format", "template", "layout", "structure", "professional", "formal", 
+    "official", "document", "paperwork", "documentation", "letterhead"
+]
+
+keywords.add_keywords('document_request', DOCUMENT_KEYWORDS)
 
 def is_document_request(query: str) -> bool:
     """
     Detect if the user is requesting a document to be generated
     """
-    document_keywords = [
-        # Document types
-        "cv", "resume", "curriculum vitae", "cover letter", "proposal", "business plan",
-        "report", "summary", "memo", "brief", "minutes", "notes", "presentation",
-        "whitepaper", "case study", "press release", "newsletter", "executive summary",
-        "project plan", "marketing plan", "swot analysis", "financial report", 
-        "thesis", "dissertation", "research paper", "essay", "assignment", "speech",
-        "statement of purpose", "personal statement", "recommendation letter",
-        
-        # Action verbs
-        "create document", "write document", "generate document", "draft a", "write a", 
-        "create a", "make a", "compose a", "prepare a", "develop a", "produce a",
-        "help me write", "help me create", "need a template for", "format for",
-        
-        # Format indicators
-        "format", "template", "layout", "structure", "professional", "formal", 
-        "official", "document", "paperwork", "documentation", "letterhead"
-    ]
-    return any(kw.lower() in query.lower() for kw in document_keywords)
+    return keywords.scan(query).has('document_request')
 
 def detect_document_type(query: str) -> str:
     """
@@ -60,8 +66,8 @@ def detect_document_type(query: str) -> str:
     
     query_lower = query.lower()
     
-    for doc_type, keywords in document_types.items():
-        if any(keyword in query_lower for keyword in keywords):
+    for doc_type, terms in document_types.items():
+        if any(term in query_lower for term in terms):
             return doc_type
     
     # Default to generic document if no specific type is found
@@ -118,9 +124,15 @@ def needs_deep_formatting(query):
     
     return formatting_score >= 2  # Need at least two indicators for deep formatting
 
-def generate_document(query: str) -> str:
+def build_document_request(query: str):
     """
-    Generate a professional document based on the user query
+    Build the chat completion request for a document generation request
+
+    Args:
+        query (str): The user's request (optionally prefixed with conversation context)
+
+    Returns:
+        tuple: (document_type, payload) - the detected document type and the request body
     """
     # Detect the document type
     document_type = detect_document_type(query)
@@ -134,274 +146,106 @@ def generate_document(query: str) -> str:
     
     # Determine if query needs deep formatting
     needs_formatting = needs_deep_formatting(query)
-    formatting_level = "enhanced" if needs_formatting else "standard"
     
-    # Common document generation instructions
-    document_structure = ""
+    # Pre-rendered system prompt for this document type, formatting level and
+    # follow-up (prompts.py); the user message names the document type
+    system_prompt = prompts.document(document_type, needs_formatting, is_follow_up)
+
+    # Create the user message with the query and document type
+    user_message = f"Create a professional {document_type.replace('_', ' ')} based on this request: {query}"
     
-    # Document type-specific instructions
-    document_type_instructions = {
-        "cv": """
-# CV/Resume Writing Guide
-When creating a professional CV/Resume:
-
-## Structure and Content
-- Begin with clear contact information (name, phone, email, LinkedIn)
-- Include a professional summary or objective statement (3-4 lines max)
-- List work experience in reverse chronological order
-- For each position, include company, title, dates, and 3-5 bullet points of achievements
-- Include education section with degrees, institutions, and graduation dates
-- Add relevant skills section with categorized technical and soft skills
-- Optional sections: certifications, projects, publications, languages, volunteer work
-
-## Formatting Guidelines
-- Use clean, professional fonts (Arial, Calibri, Helvetica)
-- Maintain consistent spacing and alignment throughout
-- Use bullet points for readability
-- Keep to 1-2 pages maximum
-- Ensure consistent date formats
-- Use bold/italics sparingly for emphasis
-- Include quantifiable achievements where possible (%, $, metrics)
-
-## Best Practices
-- Tailor the resume to the specific job description
-- Focus on achievements rather than responsibilities
-- Use action verbs to begin bullet points
-- Avoid first-person pronouns
-- Ensure perfect grammar and spelling
-- Use industry-specific keywords
-- Save and send as PDF to maintain formatting
-""",
-        
-        "cover_letter": """
-# Cover Letter Writing Guide
-When creating a professional cover letter:
-
-## Structure and Format
-- Include your contact information at the top
-- Add date and recipient's contact information
-- Use formal greeting (Dear Mr./Ms./Dr. LastName)
-- Maintain 3-4 concise paragraphs with clear purpose
-- Use professional closing (Sincerely, Best Regards)
-- Add signature (if printed) or typed name
-
-## Content Guidelines
-- Opening paragraph: State position applying for and how you found it
-- Middle paragraph(s): Highlight relevant skills/experience matching job requirements
-- Final paragraph: Request interview and provide contact information
-- Overall: Connect your experience directly to company needs
-
-## Tone and Style
-- Formal but conversational language
-- Confident but not arrogant tone
-- Avoid clichés and generic statements
-- Address specific company values or recent news
-- Show enthusiasm for the role and organization
-- Keep to one page maximum
-- Address to specific person when possible
-
-## Professional Formatting
-- Use standard business letter format
-- Consistent margins (1 inch recommended)
-- Professional font (same as resume)
-- Left-aligned or justified paragraphs
-- Single spacing with double space between paragraphs
-""",
-        
-        "proposal": """
-# Business/Project Proposal Writing Guide
-When creating a professional proposal:
-
-## Essential Sections
-1. Executive Summary
-   - Brief overview of entire proposal
-   - Key points and value proposition
-   - Limited to 1-2 paragraphs
-
-2. Problem Statement
-   - Clear identification of issue/opportunity
-   - Impact of problem on client/stakeholder
-   - Urgency and importance
-
-3. Proposed Solution
-   - Detailed description of solution
-   - How it addresses the problem
-   - Unique advantages of approach
-
-4. Methodology
-   - Step-by-step implementation plan
-   - Timeline with milestones
-   - Resources required
-
-5. Qualifications
-   - Relevant experience and expertise
-   - Past success stories/case studies
-   - Team capabilities
-
-6. Budget/Costs
-   - Detailed breakdown of expenses
-   - Payment terms and schedule
-   - Return on investment analysis
-
-7. Conclusion with Call to Action
-   - Reinforce value proposition
-   - Clear next steps
-   - Contact information
-
-## Formatting Best Practices
-- Professional letterhead and branding
-- Consistent font and styling
-- Strategic use of visuals (charts, graphs)
-- Numbered sections with clear headings
-- Page numbers for longer proposals
-- Table of contents for proposals > 5 pages
-
-## Persuasive Elements
-- Client-centered language
-- Evidence-based arguments
-- Quantifiable benefits
-- Anticipation of potential objections
-- Testimonials or social proof
-""",
-        
-        "notes": """
-# Professional Notes Writing Guide
-When creating effective professional notes:
-
-## Structure and Organization
-- Begin with date, time, meeting/event title
-- List attendees/participants
-- Outline clear agenda items or topics
-- Use hierarchical organization (main topics, subtopics)
-- Include action items, owners, and deadlines
-- End with next steps or follow-up plan
-
-## Content Best Practices
-- Focus on key points, not verbatim transcription
-- Use abbreviations and symbols consistently
-- Capture decisions made and rationale
-- Note dissenting opinions or concerns
-- Record questions raised and answers provided
-- Highlight important deadlines or milestones
-
-## Formatting for Readability
-- Use bullet points or numbered lists
-- Implement indentation for subtopics
-- Apply bold/italic for emphasis on key points
-- Use headings and subheadings
-- Include white space for readability
-- Consider color-coding for different topics/priorities
-
-## Professional Touches
-- Clean, consistent formatting
-- Proofread for clarity and errors
-- Summarize key takeaways at beginning or end
-- Include relevant reference documents or links
-- Share notes promptly after meetings
-- Use a consistent template for all notes
-"""
+    payload = {
+        "model": "llama3-70b-8192",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ],
+        "temperature": 0.2,  # Lower temperature for more predictable document formatting
+        "max_tokens": 4000
     }
-    
-    # Get document-specific instructions or use generic
-    document_instructions = document_type_instructions.get(document_type, """
-# Professional Document Writing Guide
-When creating any professional document:
-
-## General Structure
-- Begin with a clear title/heading
-- Include introduction stating purpose and scope
-- Organize content logically with headings and subheadings
-- Use appropriate section breaks and transitions
-- End with conclusion, next steps, or call to action
-- Include relevant contact information
-
-## Formatting Standards
-- Consistent fonts and sizes throughout
-- Professional spacing and margins
-- Proper alignment and indentation
-- Strategic use of bold, italic, and underline
-- Headers and footers when appropriate
-- Page numbers for multi-page documents
-
-## Content Best Practices
-- Clear, concise language
-- Active voice when possible
-- Appropriate tone for audience
-- Error-free grammar and spelling
-- Industry-specific terminology when relevant
-- Data visualization when applicable
-
-## Professional Elements
-- Company branding when appropriate
-- Proper citations for sources
-- Appendices for supporting materials
-- Consistent date formats
-- Appropriate salutations and closings
-- Digital signature when needed
-""")
-    
-    # Set system prompt for document generation
-    if formatting_level == "enhanced":
-        system_prompt = f"""You are an expert professional document creator with extensive experience in business writing, formatting, and document design. You understand the nuances of different document types and their specific formatting requirements.
-
-When creating a {document_type.replace('_', ' ')}:
-- Begin with a properly formatted document title/header
-- Use professional-level organization and structure
-- Include all standard sections expected in this document type
-- Apply proper spacing, margins, and formatting
-- Use appropriate business language and tone
-- Provide complete, ready-to-use content
-- Format dates, numbers, and contact information consistently
-- Include proper headers/footers where appropriate
-
-{document_instructions}
-
-Your output should be complete, properly formatted in Markdown, and ready for professional use with minimal editing needed.
-"""
-    else:
-        system_prompt = f"""You are a professional document creator who helps users create well-structured documents with appropriate formatting.
+    return document_type, payload
+
+_SECTION_HEADING = re.compile(r'#{2,3}\s+\w+')
 
-For this {document_type.replace('_', ' ')}:
-- Use clear, appropriate structure
-- Include standard sections for this document type
-- Use professional language and tone
-- Provide organized, well-formatted content
+class DocumentStreamFormatter:
+    """
+    Incremental version of structure_document_output for streamed responses
 
-{document_instructions}
+    Chunks are held back until a section heading has been seen (the document
+    guide is only added to documents without one) and passed straight through
+    from then on.
+    """
 
-Format your response clearly using Markdown for structure.
-"""
+    def __init__(self, document_type):
+        self.document_type = document_type
+        self._text = ""
+        self._heading_scan = 0    # where an unfinished heading match could still start
+        self._emitted = False
+
+    def feed(self, chunk):
+        """
+        Add the next response delta
+
+        Returns:
+            str: Output that is now final (possibly empty)
+        """
+        self._text += chunk
+        if self._emitted:
+            return chunk
+        text = self._text
+        if _SECTION_HEADING.search(text, self._heading_scan):
+            self._emitted = True
+            return text
+        # Only a trailing run of '#' (plus whitespace) can begin a heading later
+        stripped = text.rstrip()
+        self._heading_scan = len(stripped.rstrip('#')) if stripped.endswith('#') else len(text)
+        return ""
+
+    def finish(self):
+        """
+        Signal the end of the response
+
+        Returns:
+            str: The rest of the output; everything returned by feed() and
+                finish(), joined, equals structure_document_output(full text, document_type)
+        """
+        if self._emitted:
+            return ""
+        return structure_document_output(self._text, self.document_type)
+
+def format_document_stream(chunks, document_type):
+    """
+    Format a streamed response incrementally (see DocumentStreamFormatter)
 
-    # Add context awareness to system prompt if follow-up request
-    if is_follow_up:
-        system_prompt += """
-When modifying an existing document or answering follow-up questions:
-- Maintain consistent formatting with previous content
-- Ensure seamless integration of new content
-- Preserve the existing tone and style
-- Clearly explain what was changed and why
-- Keep the document's original purpose in focus
-"""
+    Args:
+        chunks (iterable): Response text deltas, in order
+        document_type (str): Detected document type
 
-    # Create the user message with the query and document type
-    user_message = f"Create a professional {document_type.replace('_', ' ')} based on this request: {query}"
-    
-    # Initialize the Groq client
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    Yields:
+        str: Output chunks; joined, they equal structure_document_output(full text, document_type)
+    """
+    formatter = DocumentStreamFormatter(document_type)
+    for chunk in chunks:
+        output = formatter.feed(chunk)
+        if output:
+            yield output
+    rest = formatter.finish()
+    if rest:
+        yield rest
+
+def generate_document(query: str, use_cache: bool = True) -> str:
+    """
+    Generate a professional document based on the user query
+
+    Args:
+        query (str): The user's request (optionally prefixed with conversation context)
+        use_cache (bool): Reuse a cached reply to an identical request
+    """
+    document_type, payload = build_document_request(query)
     
     try:
         # Generate document using the language model
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.2,  # Lower temperature for more predictable document formatting
-            max_tokens=4000
-        )
-        
-        document_response = response.choices[0].message.content
+        document_response = client.chat_completion(payload, timeout=GENERATION_TIMEOUT, cache=use_cache)
         
         # Process the response to ensure document is properly formatted
         structured_document = structure_document_output(document_response, document_type)
@@ -410,6 +254,22 @@ When modifying an existing document or answering follow-up questions:
     except Exception as e:
         return f"Error generating document: {str(e)}"
 
+def stream_document(query: str, use_cache: bool = True):
+    """
+    Streaming version of generate_document
+
+    Yields:
+        str: Chunks of the formatted document as the model generates it; joined,
+            they equal what generate_document returns for the same completion
+    """
+    document_type, payload = build_document_request(query)
+    
+    try:
+        deltas = client.stream_chat_completion(payload, timeout=GENERATION_TIMEOUT, cache=use_cache)
+        yield from format_document_stream(deltas, document_type)
+    except Exception as e:
+        yield f"Error generating document: {str(e)}"
+
 def detect_document_sections(document_text):
     """
     Analyze a document text to identify its main sections
@@ -0,0 +1,390 @@
+"""
+Fake Upstream Module for Chatbot
+
+This module serves local stand-ins for the two APIs the app calls, so /get can
+be load tested without spending Groq quota: an OpenAI-compatible
+/openai/v1/chat/completions (plain and streamed) and OpenWeatherMap's
+/data/2.5/weather. Time to first token, reply length, token rate, errors, 429s
+and a concurrency limit are configurable, and GET /_stats reports what the
+server saw. Point the app at it with
+
+    GROQ_API_BASE=http://127.0.0.1:8900/openai/v1
+    WEATHER_API_URL=http://127.0.0.1:8900/data/2.5/weather
+
+Run with:
+    python fake_upstream.py [--port 8900] [--ttft lognormal:300,0.5] [--token-rate 250]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CHAT_PATHS = ("/openai/v1/chat/completions", "/v1/chat/completions")
+WEATHER_PATH = "/data/2.5/weather"
+
+WORDS = ("soil", "crop", "yield", "water", "season", "market", "price", "rain", "seed", "farm",
+         "system", "request", "data", "model", "value", "result", "process", "step", "example",
+         "the", "a", "of", "to", "and", "in", "is", "for", "with", "that", "this", "can", "will")
+CODE_WORDS = ("code", "function", "implement", "script", "class", "program")
+CONDITIONS = ("clear sky", "few clouds", "scattered clouds", "light rain", "moderate rain", "overcast clouds")
+
+# Tokens sent per streamed chunk at most; keeps sleeps above the timer resolution
+MAX_TOKENS_PER_CHUNK = 8
+
+
+class Distribution:
+    """
+    A random quantity given as "kind:args", in the unit of the setting:
+    fixed:V, uniform:LOW,HIGH, normal:MEAN,STDEV, lognormal:MEDIAN,SIGMA or exp:MEAN
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+
+    def __init__(self, spec):
+        kind, _, args = spec.partition(":")
+        if kind not in self.KINDS:
+            # A bare number means a fixed value
+            kind, args = "fixed", spec
+        try:
+            self.args = [float(arg) for arg in args.split(",")]
+        except ValueError:
+            raise ValueError(f"Invalid distribution '{spec}'")
+        if len(self.args) != self.KINDS[kind]:
+            raise ValueError(f"'{kind}' takes {self.KINDS[kind]} argument(s): '{spec}'")
+        self.kind = kind
+        self.spec = spec
+
+    def sample(self, rng):
+        """Draw a value (never negative)"""
+        a = self.args
+        if self.kind == "fixed":
+            value = a[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(a[0], a[1])
+        elif self.kind == "normal":
+            value = rng.gauss(a[0], a[1])
+        elif self.kind == "lognormal":
+            value = a[0] * math.exp(rng.gauss(0, a[1]))
+        else:
+            value = rng.expovariate(1 / a[0]) if a[0] > 0 else 0.0
+        return max(0.0, value)
+
+    def __repr__(self):
+        return self.spec
+
+
+class FakeUpstream:
+    def __init__(self, ttft="lognormal:300,0.5", reply_tokens="lognormal:250,0.6", token_rate=250.0,
+                 error_rate=0.0, rate_limit_rate=0.0, max_concurrency=0, retry_after=1,
+                 weather_latency="lognormal:80,0.4", weather_error_rate=0.0, seed=None):
+        """
+        Initialize the behaviour of the fake APIs
+
+        Args:
+            ttft (str): Distribution of the time to first token, in milliseconds
+            reply_tokens (str): Distribution of the reply length, in tokens
+            token_rate (float): Tokens generated per second after the first
+            error_rate (float): Share of chat calls answered with a 500
+            rate_limit_rate (float): Share of chat calls answered with a 429
+            max_concurrency (int): Chat calls served at once; more get a 429
+                straight away, like a provider's concurrency limit (0: no limit)
+            retry_after (int): Retry-After seconds sent with 429s
+            weather_latency (str): Distribution of weather call latency, in milliseconds
+            weather_error_rate (float): Share of weather calls answered with a 500
+            seed (int, optional): Seed for repeatable runs
+        """
+        self.ttft = Distribution(ttft)
+        self.reply_tokens = Distribution(reply_tokens)
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.weather_latency = Distribution(weather_latency)
+        self.weather_error_rate = weather_error_rate
+        self._seed = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zero the statistics"""
+        with self._lock:
+            self._in_flight = 0
+            self._stats = {"chat": 0, "streamed": 0, "weather": 0, "errors": 0, "rate_limited": 0,
+                           "answered": 0, "in_flight": 0, "peak_in_flight": 0, "tokens": 0, "chat_seconds": 0.0,
+                           "weather_seconds": 0.0, "started": time.time()}
+
+    def rng(self):
+        """A generator of its own for one request"""
+        with self._lock:
+            return random.Random(self._seed.getrandbits(64))
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def enter(self):
+        """Admit a chat call, unless max_concurrency calls are already running"""
+        with self._lock:
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                return False
+            self._in_flight += 1
+            self._stats["in_flight"] = self._in_flight
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+            return True
+
+    def leave(self, seconds=None):
+        """Finish a chat call; seconds is its duration if it was answered"""
+        with self._lock:
+            self._in_flight -= 1
+            self._stats["in_flight"] = self._in_flight
+            if seconds is not None:
+                self._stats["chat_seconds"] += seconds
+                self._stats["answered"] += 1
+
+    def stats(self):
+        """
+        What the server has seen since the last reset
+
+        Returns:
+            dict: Call counts, errors, 429s, current and peak concurrent chat
+                calls, tokens sent and average chat / weather call duration
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats.pop("chat_seconds")
+        stats["avg_chat_ms"] = seconds / stats["answered"] * 1000 if stats["answered"] else 0.0
+        weather = stats.pop("weather_seconds")
+        stats["avg_weather_ms"] = weather / stats["weather"] * 1000 if stats["weather"] else 0.0
+        stats["uptime"] = time.time() - stats.pop("started")
+        stats["settings"] = {"ttft_ms": repr(self.ttft), "reply_tokens": repr(self.reply_tokens),
+                             "token_rate": self.token_rate, "error_rate": self.error_rate,
+                             "rate_limit_rate": self.rate_limit_rate, "max_concurrency": self.max_concurrency}
+        return stats
+
+
+def _reply_tokens(prompt, count, rng):
+    """A plausible reply of about count tokens, with a code block if code was asked for"""
+    words = [rng.choice(WORDS) for _ in range(count)]
+    tokens = [(" " if i else "") + word for i, word in enumerate(words)]
+    if any(word in prompt for word in CODE_WORDS):
+        middle = len(tokens) // 2
+        tokens[middle:middle] = ["\n\n```python\n", "def solve(items):\n", "    return sorted(items)\n",
+                                 "```\n\n"]
+    for i in range(12, len(tokens), 60):
+        tokens[i] += ".\n\n"  # Paragraphs
+    return tokens
+
+
+def _weather(location):
+    """A stable fake report for a location"""
+    digest = hashlib.sha256(location.lower().encode()).digest()
+    return {
+        "name": location.title(),
+        "weather": [{"main": "Clouds", "description": CONDITIONS[digest[0] % len(CONDITIONS)]}],
+        "main": {"temp": round(10 + digest[1] / 12, 1), "feels_like": round(9 + digest[2] / 12, 1),
+                 "humidity": 30 + digest[3] % 60},
+        "wind": {"speed": round(digest[4] / 40, 1)},
+        "cod": 200,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+    upstream = None  # FakeUpstream, set by serve()
+
+    def log_message(self, format, *args):
+        pass  # One line per request would dominate a load test
+
+    def _send_json(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == WEATHER_PATH:
+            self._weather(parse_qs(url.query).get("q", [""])[0])
+        elif url.path == "/_stats":
+            self._send_json(200, self.upstream.stats())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {url.path}"}})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path in CHAT_PATHS:
+            self._chat()
+        elif path == "/_reset":
+            self.upstream.reset()
+            self._send_json(200, {"reset": True})
+        else:
+            self._read_json()
+            self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+
+    def _weather(self, location):
+        upstream = self.upstream
+        rng = upstream.rng()
+        start = time.perf_counter()
+        time.sleep(upstream.weather_latency.sample(rng) / 1000)
+        upstream.count("weather")
+        if rng.random() < upstream.weather_error_rate:
+            upstream.count("errors")
+            self._send_json(500, {"cod": 500, "message": "Internal error"})
+        elif not location.strip() or location.lower().startswith("nowhere"):
+            self._send_json(404, {"cod": "404", "message": "city not found"})
+        else:
+            self._send_json(200, _weather(location.strip()))
+        upstream.count("weather_seconds", time.perf_counter() - start)
+
+    def _chat(self):
+        upstream = self.upstream
+        payload = self._read_json()
+        upstream.count("chat")
+        if not payload or not payload.get("messages"):
+            upstream.count("errors")
+            self._send_json(400, {"error": {"message": "'messages' is required", "type": "invalid_request_error"}})
+            return
+        rng = upstream.rng()
+        if rng.random() < upstream.rate_limit_rate or not upstream.enter():
+            upstream.count("rate_limited")
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                            headers=[("Retry-After", str(upstream.retry_after))])
+            return
+
+        start = time.perf_counter()
+        answered = False
+        try:
+            time.sleep(upstream.ttft.sample(rng) / 1000)
+            if rng.random() < upstream.error_rate:
+                upstream.count("errors")
+                self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+                return
+            prompt = " ".join(str(m.get("content", "")) for m in payload["messages"]).lower()
+            count = max(1, int(upstream.reply_tokens.sample(rng)))
+            tokens = _reply_tokens(prompt, count, rng)
+            upstream.count("tokens", len(tokens))
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(tokens),
+                     "total_tokens": len(prompt) // 4 + len(tokens)}
+            reply_id = f"chatcmpl-{rng.getrandbits(48):012x}"
+            model = payload.get("model", "fake")
+            if payload.get("stream"):
+                upstream.count("streamed")
+                self._stream(tokens, reply_id, model)
+            else:
+                time.sleep(len(tokens) / upstream.token_rate if upstream.token_rate > 0 else 0)
+                self._send_json(200, {
+                    "id": reply_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+            answered = True
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up (timeout)
+        finally:
+            upstream.leave(time.perf_counter() - start if answered else None)
+
+    def _stream(self, tokens, reply_id, model):
+        """Send the reply as OpenAI-style SSE chunks, paced at the token rate"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        rate = self.upstream.token_rate
+        # Batch tokens so chunks go out at most every ~20 ms
+        per_chunk = min(MAX_TOKENS_PER_CHUNK, max(1, int(rate * 0.02))) if rate > 0 else len(tokens)
+        created = int(time.time())
+        started = time.perf_counter()
+        for i in range(0, len(tokens), per_chunk):
+            if rate > 0:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            chunk = {"id": reply_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": "".join(tokens[i:i + per_chunk])},
+                                  "finish_reason": None}]}
+            write(f"data: {json.dumps(chunk)}\n\n".encode())
+        final = {"id": reply_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        write(b"")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Load tests open many connections at once
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (a stopped app) aren't errors
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def serve(upstream, host="127.0.0.1", port=8900):
+    """
+    Create the server (call serve_forever() on it, or run it in a thread)
+
+    Returns:
+        ThreadingHTTPServer: Bound to (host, port); port 0 picks a free one
+    """
+    handler = type("FakeUpstreamHandler", (Handler,), {"upstream": upstream})
+    return _Server((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Groq and OpenWeatherMap APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft", default="lognormal:300,0.5", help="time to first token in ms, e.g. fixed:200")
+    parser.add_argument("--reply-tokens", default="lognormal:250,0.6", help="reply length in tokens")
+    parser.add_argument("--token-rate", type=float, default=250.0, help="tokens per second (0: instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of chat calls that get a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of chat calls that get a 429")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="chat calls at once before 429s (0: no limit)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429s")
+    parser.add_argument("--weather-latency", default="lognormal:80,0.4", help="weather call latency in ms")
+    parser.add_argument("--weather-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    upstream = FakeUpstream(args.ttft, args.reply_tokens, args.token_rate, args.error_rate, args.rate_limit_rate,
+                            args.max_concurrency, args.retry_after, args.weather_latency,
+                            args.weather_error_rate, args.seed)
+    server = serve(upstream, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Fake upstream on http://{host}:{port} (chat: /openai/v1/chat/completions, weather: {WEATHER_PATH})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+HTTP Client Module for Chatbot
+
+This module provides one pooled, keep-alive HTTP client per worker process for
+every outbound call (Groq chat completions, OpenWeatherMap), so requests reuse
+warm TCP/TLS connections. Calls are retried with jittered exponential backoff
+on connection errors, 429 and 5xx responses, and every call has a timeout.
+AsyncHTTPClient offers the same interface on httpx for the ASGI app.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import UPSTREAM_REQUESTS, UPSTREAM_RETRIES, UPSTREAM_SECONDS
+from response_cache import response_cache
+
+load_dotenv()
+
+# Base URL of the OpenAI-compatible chat API; point it at a local stand-in for testing
+GROQ_API_BASE = os.getenv('GROQ_API_BASE', 'https://api.groq.com/openai/v1').rstrip('/')
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _upstream(url):
+    """Metrics label for the API a URL belongs to (its host)"""
+    return urlsplit(url).netloc
+
+
+def _record_upstream(url, status, retries, seconds):
+    """Count an upstream call: status is the HTTP status, or None if no response came"""
+    upstream = _upstream(url)
+    UPSTREAM_REQUESTS.inc(upstream, "error" if status is None else "429" if status == 429 else f"{status // 100}xx")
+    if retries:
+        UPSTREAM_RETRIES.inc(upstream, amount=retries)
+    UPSTREAM_SECONDS.observe(seconds, upstream)
+
+
+class JitteredRetry(Retry):
+    """Retry policy whose exponential backoff is spread with full jitter"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+class HTTPClient:
+    def __init__(self, pool_connections=4, pool_maxsize=16, max_retries=3,
+                 backoff_factor=0.5, timeout=(3.05, 30)):
+        """
+        Initialize the client and its connection pools
+
+        Args:
+            pool_connections (int): Number of hosts to keep a pool for
+            pool_maxsize (int): Connections kept per host; callers beyond this wait
+                for a free connection instead of opening throwaway ones
+            max_retries (int): Retries on connection errors, 429 and 5xx responses
+            backoff_factor (float): Base of the exponential backoff between retries
+            timeout (float or tuple): Default (connect, read) timeout in seconds
+        """
+        self.timeout = timeout
+        retry = JitteredRetry(
+            total=max_retries,
+            read=0,  # never resend a request the server may already be processing
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,  # chat completions are POSTs; retry them too
+            backoff_factor=backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "errors": 0, "seconds": 0.0}
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """
+        Send a request through the shared pool
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL
+            timeout (float or tuple): Overrides the default (connect, read) timeout
+            **kwargs: Passed on to requests (headers, params, json, stream, ...)
+
+        Returns:
+            requests.Response: The response (after any retries)
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        except Exception:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["errors"] += 1
+                self._stats["seconds"] += seconds
+            _record_upstream(url, None, 0, seconds)
+            raise
+
+        retries = getattr(response.raw, 'retries', None)
+        retries = len(retries.history) if retries else 0
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["retries"] += retries
+            self._stats["errors"] += 1 if response.status_code >= 400 else 0
+            self._stats["seconds"] += seconds
+        _record_upstream(url, response.status_code, retries, seconds)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def chat_completion(self, payload, timeout=None, cache=True):
+        """
+        Call the chat completions API and return the reply text
+
+        Args:
+            payload (dict): Request body (model, messages, temperature, ...)
+            timeout (float or tuple): Overrides the default timeout
+            cache (bool): Answer from / store in the response cache
+
+        Returns:
+            str: Content of the first choice
+
+        Raises:
+            requests.HTTPError: If the API still fails after retries
+        """
+        if cache:
+            cached = response_cache.get(payload)
+            if cached is not None:
+                return cached
+        response = self.post(f"{GROQ_API_BASE}/chat/completions", headers=_groq_headers(),
+                             json=payload, timeout=timeout)
+        response.raise_for_status()
+        reply = response.json()["choices"][0]["message"]["content"]
+        if cache:
+            response_cache.set(payload, reply)
+        return reply
+
+    def stream_chat_completion(self, payload, timeout=None, cache=True):
+        """
+        Call the chat completions API with stream=True and yield the reply as it
+        is generated. The read timeout applies per chunk, not to the whole reply.
+        A cached reply is yielded as a single chunk.
+
+        Yields:
+            str: Content deltas, in order
+        """
+        if cache:
+            cached = response_cache.get(payload)
+            if cached is not None:
+                yield cached
+                return
+        deltas, complete = [], False
+        with self.post(f"{GROQ_API_BASE}/chat/completions", headers=_groq_headers(),
+                       json={**payload, "stream": True}, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            # OpenAI-style SSE: "data: {json}" lines, ending with "data: [DONE]"
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    complete = True
+                    break
+                choice = json.loads(data)["choices"][0]
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    deltas.append(delta)
+                    yield delta
+                if choice.get("finish_reason"):
+                    complete = True
+        # Only complete replies are cached, not streams that ended early
+        if cache and complete:
+            response_cache.set(payload, "".join(deltas))
+
+    def stats(self):
+        """
+        Request and connection pool statistics for this worker
+
+        Returns:
+            dict: Totals (requests, retries, errors, avg_latency_ms) and, per
+                host pool, connections opened, requests served and idle connections
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats.pop("seconds")
+        stats["avg_latency_ms"] = (seconds / stats["requests"] * 1000) if stats["requests"] else 0.0
+
+        pools = {}
+        manager = self._adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                # The pool's queue holds None for slots without an open connection
+                "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0,
+                "maxsize": self._adapter._pool_maxsize
+            }
+        stats["pools"] = pools
+        return stats
+
+
+class AsyncHTTPClient:
+    def __init__(self, pool_maxsize=100, max_retries=3, backoff_factor=0.5,
+                 timeout=(3.05, 30)):
+        """
+        Initialize the client. The underlying httpx.AsyncClient is created on
+        first use, inside the event loop that serves requests.
+
+        Args:
+            pool_maxsize (int): Maximum open connections; requests beyond this wait
+                for a free connection
+            max_retries (int): Retries on connection errors, 429 and 5xx responses
+            backoff_factor (float): Base of the exponential backoff between retries
+            timeout (float or tuple): Default (connect, read) timeout in seconds
+        """
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._client = None
+        self._stats = {"requests": 0, "retries": 0, "errors": 0, "seconds": 0.0}
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_maxsize,
+                                    max_keepalive_connections=self.pool_maxsize)
+            )
+        return self._client
+
+    def _timeout(self, timeout):
+        timeout = timeout or self.timeout
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect, pool=None)
+        return httpx.Timeout(timeout, pool=None)
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before retry number ``attempt`` (Retry-After wins if given)"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, self.backoff_factor * (2 ** attempt))
+
+    async def _send(self, method, url, timeout=None, stream=False, **kwargs):
+        client = self._get_client()
+        request = client.build_request(method, url, timeout=self._timeout(timeout), **kwargs)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await client.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt >= self.max_retries:
+                    self._record(url, start, attempt, None)
+                    raise
+            except Exception:
+                self._record(url, start, attempt, None)
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self._record(url, start, attempt, response.status_code)
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    def _record(self, url, start, retries, status):
+        # Only called from the event loop thread, so no lock is needed
+        seconds = time.perf_counter() - start
+        self._stats["requests"] += 1
+        self._stats["retries"] += retries
+        self._stats["errors"] += 1 if status is None or status >= 400 else 0
+        self._stats["seconds"] += seconds
+        _record_upstream(url, status, retries, seconds)
+
+    async def request(self, method, url, timeout=None, **kwargs):
+        """
+        Send a request through the shared pool
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL
+            timeout (float or tuple): Overrides the default (connect, read) timeout
+            **kwargs: Passed on to httpx (headers, params, json, ...)
+
+        Returns:
+            httpx.Response: The response (after any retries)
+        """
+        return await self._send(method, url, timeout=timeout, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def chat_completion(self, payload, timeout=None, cache=True):
+        """
+        Call the chat completions API and return the reply text (see
+        HTTPClient.chat_completion)
+
+        Raises:
+            httpx.HTTPStatusError: If the API still fails after retries
+        """
+        if cache:
+            cached = await response_cache.aget(payload)
+            if cached is not None:
+                return cached
+        response = await self.post(f"{GROQ_API_BASE}/chat/completions", headers=_groq_headers(),
+                                   json=payload, timeout=timeout)
+        response.raise_for_status()
+        reply = response.json()["choices"][0]["message"]["content"]
+        if cache:
+            await response_cache.aset(payload, reply)
+        return reply
+
+    async def stream_chat_completion(self, payload, timeout=None, cache=True):
+        """
+        Call the chat completions API with stream=True and yield the reply as it
+        is generated. A cached reply is yielded as a single chunk.
+
+        Yields:
+            str: Content deltas, in order
+        """
+        if cache:
+            cached = await response_cache.aget(payload)
+            if cached is not None:
+                yield cached
+                return
+        deltas, complete = [], False
+        response = await self._send('POST', f"{GROQ_API_BASE}/chat/completions",
+                                    headers=_groq_headers(), json={**payload, "stream": True},
+                                    timeout=timeout, stream=True)
+        try:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    complete = True
+                    break
+                choice = json.loads(data)["choices"][0]
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    deltas.append(delta)
+                    yield delta
+                if choice.get("finish_reason"):
+                    complete = True
+        finally:
+            await response.aclose()
+        # Only complete replies are cached, not streams that ended early
+        if cache and complete:
+            await response_cache.aset(payload, "".join(deltas))
+
+    async def aclose(self):
+        """Close all pooled connections (call on server shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        """
+        Request and connection pool statistics for this worker
+
+        Returns:
+            dict: Totals (requests, retries, errors, avg_latency_ms) and open connections
+        """
+        stats = dict(self._stats)
+        seconds = stats.pop("seconds")
+        stats["avg_latency_ms"] = (seconds / stats["requests"] * 1000) if stats["requests"] else 0.0
+        pool = getattr(getattr(self._client, '_transport', None), '_pool', None)
+        stats["open_connections"] = len(pool.connections) if pool is not None else 0
+        stats["maxsize"] = self.pool_maxsize
+        return stats
+
+
+def _groq_headers():
+    return {"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"}
+
+
+# Global instances shared by app.py, code_generator.py, document_generator.py and asgi_app.py
+client = HTTPClient(
+    pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', '16')),
+    max_retries=int(os.getenv('HTTP_MAX_RETRIES', '3'))
+)
+async_client = AsyncHTTPClient(
+    pool_maxsize=int(os.getenv('ASYNC_HTTP_POOL_MAXSIZE', '100')),
+    max_retries=int(os.getenv('HTTP_MAX_RETRIES', '3'))
+)
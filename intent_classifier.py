@@ -0,0 +1,139 @@
+"""
+Intent Classifier Module for Chatbot
+
+This module serves the Naive Bayes intent model trained by train_bot.py
+(chatbot_model.pkl) as a fast routing tier: messages it classifies with enough
+confidence are answered from intents.json instead of calling the LLM. A model
+pickled by another scikit-learn version is retrained from intents.json on load,
+since scikit-learn doesn't guarantee such a model's results.
+"""
+
+import logging
+import os
+import pickle
+import threading
+import time
+import warnings
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.getenv('INTENT_MODEL_PATH', os.path.join(BASE_DIR, 'chatbot_model.pkl'))
+
+
+class IntentClassifier:
+    def __init__(self, model_path=MODEL_PATH, threshold=0.4, min_coverage=0.75):
+        """
+        Initialize the classifier. The pickled pipeline is loaded on first use,
+        once per worker process.
+
+        Args:
+            model_path (str): Path to the pickled CountVectorizer + MultinomialNB pipeline
+            threshold (float): Minimum predicted probability to accept an intent
+            min_coverage (float): Minimum share of the message's tokens the model
+                has seen in training; the model is blind to everything else, so
+                out-of-vocabulary messages would otherwise get their class priors
+        """
+        self.model_path = model_path
+        self.threshold = threshold
+        self.min_coverage = min_coverage
+        self._model = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "confident": 0, "seconds": 0.0}
+
+    def _get_model(self):
+        if self._model is None and not self._load_failed:
+            with self._lock:
+                if self._model is None and not self._load_failed:
+                    try:
+                        self._model = self._load()
+                    except Exception as e:
+                        logger.warning("Intent model unavailable (%s): %s", self.model_path, e)
+                        self._load_failed = True
+        return self._model
+
+    def _load(self):
+        from sklearn.exceptions import InconsistentVersionWarning
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', InconsistentVersionWarning)
+            try:
+                with open(self.model_path, 'rb') as f:
+                    return pickle.load(f)
+            except InconsistentVersionWarning as e:
+                logger.warning("Intent model %s was saved by scikit-learn %s (installed: %s); retraining it",
+                               self.model_path, e.original_sklearn_version, e.current_sklearn_version)
+        from train_bot import build_model
+        return build_model()
+
+    def preload(self):
+        """Load the model in a background thread so the first request doesn't pay for it"""
+        threading.Thread(target=self._get_model, name="intent-model-loader", daemon=True).start()
+
+    def classify_batch(self, queries):
+        """
+        Classify many messages with a single vectorize + predict_proba call
+
+        Args:
+            queries (list): Messages to classify
+
+        Returns:
+            list: (tag, probability, coverage) per message; tag is None when the
+                message is not confidently one of the trained intents
+        """
+        model = self._get_model()
+        if model is None or not queries:
+            return [(None, 0.0, 0.0) for _ in queries]
+
+        start = time.perf_counter()
+        vectorizer, estimator = model[:-1], model[-1]
+        analyzer = model[0].build_analyzer()
+        counts = vectorizer.transform(queries)
+        probabilities = estimator.predict_proba(counts)
+        known_tokens = counts.sum(axis=1)
+
+        results = []
+        for row, query in enumerate(queries):
+            total_tokens = len(analyzer(query))
+            coverage = float(known_tokens[row, 0]) / total_tokens if total_tokens else 0.0
+            best = probabilities[row].argmax()
+            probability = float(probabilities[row][best])
+            confident = probability >= self.threshold and coverage >= self.min_coverage
+            results.append((str(estimator.classes_[best]) if confident else None, probability, coverage))
+
+        with self._lock:
+            self._stats["queries"] += len(queries)
+            self._stats["confident"] += sum(1 for tag, _, _ in results if tag)
+            self._stats["seconds"] += time.perf_counter() - start
+        return results
+
+    def classify(self, query):
+        """
+        Classify a single message
+
+        Returns:
+            tuple: (tag or None, probability, coverage)
+        """
+        return self.classify_batch([query])[0]
+
+    def stats(self):
+        """
+        Routing statistics for this worker
+
+        Returns:
+            dict: Messages classified, confident hits (LLM calls avoided when the
+                tag has responses) and mean classification latency in ms
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats.pop("seconds")
+        stats["avg_latency_ms"] = (seconds / stats["queries"] * 1000) if stats["queries"] else 0.0
+        return stats
+
+
+# Global instance for use across the application
+classifier = IntentClassifier(
+    threshold=float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.4')),
+    min_coverage=float(os.getenv('INTENT_MIN_COVERAGE', '0.75'))
+)
@@ -0,0 +1,381 @@
+"""
+Load Test Module for Chatbot
+
+This module replays mixed /get traffic (chat, code, document, weather, price and
+manual messages, some over /get_stream) against the gunicorn app and reports
+throughput, p50/p95/p99 latency and how busy the workers were, at rising
+numbers of concurrent users. By default it starts fake_upstream.py and a
+gunicorn pointed at it, with throwaway cache and memory files, so no Groq
+quota is used. The step where throughput stops growing while latency climbs
+is where the workers saturate.
+
+Run with:
+    python load_test.py [--workers 2] [--threads 8] [--users 1,4,16,32] [--duration 15]
+    python load_test.py --url http://127.0.0.1:8000 --fake-url http://127.0.0.1:8900
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from fake_upstream import FakeUpstream, serve
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (kind, weight, form fields). Chat-like kinds send cache=false so that every
+# one of them reaches the (fake) LLM instead of the response caches.
+TRAFFIC = [
+    ("chat", 40, [
+        {"msg": "How does crop rotation improve soil quality compared to fertilizer?"},
+        {"msg": "Why do my tomato seedlings wilt in the afternoon even though I water them?"},
+        {"msg": "What should I consider before switching from maize to sorghum?"},
+        {"msg": "Explain the trade-offs between drip and furrow irrigation"},
+    ]),
+    ("code", 15, [
+        {"msg": "write a python function that parses a CSV of crop yields"},
+        {"msg": "implement a binary search in javascript"},
+    ]),
+    ("document", 10, [
+        {"msg": "Can you help me write a professional CV for a farm manager role?"},
+        {"msg": "Draft a business proposal template for a poultry farm"},
+    ]),
+    ("weather", 15, [
+        {"msg": "What's the weather like?", "location": "Nairobi"},
+        {"msg": "weather today", "location": "Kisumu"},
+        {"msg": "weather forecast", "location": "Eldoret"},
+    ]),
+    ("price", 12, [
+        {"msg": "maize price in Nakuru"},
+        {"msg": "market prices for beans"},
+    ]),
+    ("manual", 8, [
+        {"msg": "Do you have a manual on soil testing?"},
+        {"msg": "pest control manual"},
+    ]),
+]
+LLM_KINDS = ("chat", "code", "document")
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, timeout=60, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+class Result:
+    __slots__ = ('kind', 'streamed', 'status', 'seconds', 'ttft', 'finished')
+
+    def __init__(self, kind, streamed, status, seconds, ttft, finished):
+        self.kind = kind
+        self.streamed = streamed
+        self.status = status  # HTTP status, or 0 if the request failed
+        self.seconds = seconds
+        self.ttft = ttft  # Seconds to the first 'token' event (streamed LLM replies only)
+        self.finished = finished  # perf_counter() when the response was complete
+
+
+class LoadDriver:
+    def __init__(self, url, stream_share=0.3, think_time=0.0, timeout=60, cache=False, seed=None):
+        """
+        Initialize the driver
+
+        Args:
+            url (str): Base URL of the app
+            stream_share (float): Share of messages sent to /get_stream
+            think_time (float): Mean seconds a user waits between messages
+            timeout (float): Per-request timeout
+            cache (bool): Let chat-like messages be answered from the caches
+            seed (int, optional): Seed for a repeatable message sequence
+        """
+        self.url = url.rstrip('/')
+        self.stream_share = stream_share
+        self.think_time = think_time
+        self.timeout = timeout
+        self.cache = cache
+        self._rng = random.Random(seed)
+        self._kinds = [kind for kind, _, _ in TRAFFIC]
+        self._weights = [weight for _, weight, _ in TRAFFIC]
+        self._forms = {kind: forms for kind, _, forms in TRAFFIC}
+
+    def _send(self, session, rng):
+        kind = rng.choices(self._kinds, self._weights)[0]
+        form = dict(rng.choice(self._forms[kind]))
+        if not self.cache:
+            form["cache"] = "false"
+        streamed = kind in LLM_KINDS and rng.random() < self.stream_share
+        ttft = None
+        start = time.perf_counter()
+        try:
+            if streamed:
+                with session.post(f"{self.url}/get_stream", data=form, stream=True, timeout=self.timeout) as response:
+                    status = response.status_code
+                    for line in response.iter_lines():
+                        if ttft is None and line.startswith(b"event: token"):
+                            ttft = time.perf_counter() - start
+            else:
+                response = session.post(f"{self.url}/get", data=form, timeout=self.timeout)
+                status = response.status_code
+                response.content
+        except requests.RequestException:
+            status = 0
+        finished = time.perf_counter()
+        return Result(kind, streamed, status, finished - start, ttft, finished)
+
+    def run(self, users, duration, warmup=2.0):
+        """
+        Run users closed-loop (each sends its next message when the last one is
+        answered) for warmup + duration seconds
+
+        Returns:
+            tuple: (results finished within the measured window, its length in seconds)
+        """
+        results = []
+        lock = threading.Lock()
+        started = time.perf_counter()
+        measure_from = started + warmup
+        stop_at = measure_from + duration
+
+        def user(seed):
+            rng = random.Random(seed)
+            with requests.Session() as session:  # Its own cookie, so its own conversation
+                while time.perf_counter() < stop_at:
+                    result = self._send(session, rng)
+                    if result.finished - result.seconds >= measure_from and result.finished <= stop_at:
+                        with lock:
+                            results.append(result)
+                    if self.think_time:
+                        time.sleep(rng.expovariate(1 / self.think_time))
+
+        threads = [threading.Thread(target=user, args=(self._rng.getrandbits(32),), daemon=True)
+                   for _ in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, duration
+
+
+def summarize(results, seconds, users, slots=None, upstream=None):
+    """
+    Statistics of one load step
+
+    Args:
+        results (list): Result objects from LoadDriver.run
+        seconds (float): Length of the measured window
+        users (int): Concurrent users
+        slots (int, optional): Requests the app can serve at once (workers x threads)
+        upstream (dict, optional): Fake upstream /_stats for the step
+
+    Returns:
+        dict: Throughput, error counts, latency percentiles overall and per
+            kind, TTFT of streamed replies, and saturation indicators
+    """
+    ok = [r for r in results if r.status == 200]
+    latencies = sorted(r.seconds for r in ok)
+    summary = {
+        "users": users,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "throughput": len(ok) / seconds if seconds else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "kinds": {},
+    }
+    for kind, _, _ in TRAFFIC:
+        kind_latencies = sorted(r.seconds for r in ok if r.kind == kind)
+        if kind_latencies:
+            summary["kinds"][kind] = {"requests": len(kind_latencies),
+                                      "p50_ms": _percentile(kind_latencies, 0.50) * 1000,
+                                      "p95_ms": _percentile(kind_latencies, 0.95) * 1000}
+    ttfts = sorted(r.ttft for r in ok if r.ttft is not None)
+    summary["ttft_p50_ms"] = _percentile(ttfts, 0.50) * 1000
+    summary["ttft_p95_ms"] = _percentile(ttfts, 0.95) * 1000
+
+    # Little's law: requests in the app on average = arrival rate x time in the app.
+    # Beyond the worker threads available, requests wait in gunicorn's backlog.
+    busy = sum(r.seconds for r in results) / seconds if seconds else 0.0
+    summary["in_app"] = busy
+    summary["utilization"] = min(1.0, busy / slots) if slots else None
+    summary["queued"] = max(0.0, busy - slots) if slots else None
+    if upstream:
+        summary["upstream_peak_in_flight"] = upstream.get("peak_in_flight")
+        summary["upstream_avg_chat_ms"] = upstream.get("avg_chat_ms")
+        # The app retries 429s and 5xx and answers failed calls with an apology,
+        # so injected failures show up here rather than as request errors
+        summary["upstream_errors"] = upstream.get("errors")
+        summary["upstream_rate_limited"] = upstream.get("rate_limited")
+        # Time LLM requests spent in the app beyond the upstream call itself:
+        # mostly waiting for a free worker thread once the app is saturated
+        llm = [r.seconds for r in ok if r.kind in LLM_KINDS and not r.streamed]
+        if llm and upstream.get("avg_chat_ms"):
+            summary["queueing_ms"] = max(0.0, sum(llm) / len(llm) * 1000 - upstream["avg_chat_ms"])
+    return summary
+
+
+def _print_step(summary):
+    utilization = f"{summary['utilization']:.0%}" if summary["utilization"] is not None else "-"
+    queued = f"{summary['queued']:.1f}" if summary["queued"] is not None else "-"
+    queueing = f"{summary['queueing_ms']:.0f}" if "queueing_ms" in summary else "-"
+    print(f"{summary['users']:>6} {summary['throughput']:>9.1f} {summary['p50_ms']:>8.0f} {summary['p95_ms']:>8.0f} "
+          f"{summary['p99_ms']:>8.0f} {summary['ttft_p50_ms']:>10.0f} {summary['errors']:>7} "
+          f"{summary['in_app']:>7.1f} {utilization:>6} {queued:>7} {summary.get('upstream_peak_in_flight', '-'):>9} "
+          f"{queueing:>8} {summary.get('upstream_rate_limited', '-'):>8} {summary.get('upstream_errors', '-'):>8}")
+
+
+def find_saturation(steps, gain=0.10):
+    """
+    The first step at which the workers were saturated: every worker thread
+    busy with requests queueing (when the thread count is known), or else the
+    step after which more users raised throughput by less than gain while p95
+    latency went up. None if throughput kept scaling.
+    """
+    for step in steps:
+        if step["queued"] is not None and step["queued"] > 0.5:
+            return step
+    for previous, step in zip(steps, steps[1:]):
+        if step["throughput"] < previous["throughput"] * (1 + gain) and step["p95_ms"] > previous["p95_ms"]:
+            return previous
+    return None
+
+
+def run_load_test(url, users_steps, duration, driver, slots=None, fake_url=None):
+    """
+    Run the steps one after another and print a row per step
+
+    Returns:
+        list: summarize() result per step
+    """
+    print(f"{'users':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>10} {'errors':>7} "
+          f"{'in app':>7} {'util':>6} {'queued':>7} {'llm peak':>9} {'queue ms':>8} {'llm 429':>8} {'llm 5xx':>8}")
+    steps = []
+    for users in users_steps:
+        if fake_url:
+            requests.post(f"{fake_url}/_reset", timeout=5)
+        results, seconds = driver.run(users, duration)
+        upstream = requests.get(f"{fake_url}/_stats", timeout=5).json() if fake_url else None
+        summary = summarize(results, seconds, users, slots, upstream)
+        _print_step(summary)
+        steps.append(summary)
+
+    saturated = find_saturation(steps)
+    if saturated:
+        print(f"Workers saturate at {saturated['users']} users (~{saturated['throughput']:.1f} req/s); "
+              f"beyond that requests wait for a free thread")
+    else:
+        print("Throughput was still growing at the last step; add users to find the saturation point")
+    return steps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mixed-traffic load test for the chatbot")
+    parser.add_argument("--url", help="app to test; default: start gunicorn against a fake upstream")
+    parser.add_argument("--fake-url", help="fake upstream of an app given with --url, for its /_stats")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gunicorn worker")
+    parser.add_argument("--users", default="1,4,16,32", help="concurrent users per step")
+    parser.add_argument("--duration", type=float, default=15, help="measured seconds per step")
+    parser.add_argument("--stream-share", type=float, default=0.3, help="share of LLM messages sent to /get_stream")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a user's messages")
+    parser.add_argument("--cache", action="store_true", help="let chat messages hit the response caches")
+    parser.add_argument("--ttft", default="lognormal:300,0.5", help="fake time to first token in ms")
+    parser.add_argument("--reply-tokens", default="lognormal:250,0.6", help="fake reply length in tokens")
+    parser.add_argument("--token-rate", type=float, default=250.0, help="fake tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake chat calls that fail")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of fake chat calls that get a 429")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="fake provider concurrency limit")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("-o", "--output", help="write the step results to this JSON file")
+    args = parser.parse_args(argv)
+    users_steps = [int(users) for users in args.users.split(",")]
+
+    driver_kwargs = dict(stream_share=args.stream_share, think_time=args.think_time,
+                         cache=args.cache, seed=args.seed)
+    if args.url:
+        steps = run_load_test(args.url, users_steps, args.duration, LoadDriver(args.url, **driver_kwargs),
+                              fake_url=args.fake_url)
+    else:
+        upstream = FakeUpstream(args.ttft, args.reply_tokens, args.token_rate, args.error_rate,
+                                args.rate_limit_rate, args.max_concurrency, seed=args.seed)
+        server = serve(upstream, port=0)
+        threading.Thread(target=server.serve_forever, name="fake-upstream", daemon=True).start()
+        fake_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        with tempfile.TemporaryDirectory(prefix="chatbot-load-") as tmp:
+            port = _free_port()
+            env = {
+                **os.environ,
+                "GROQ_API_BASE": f"{fake_url}/openai/v1",
+                "GROQ_API_KEY": os.getenv("GROQ_API_KEY") or "fake",
+                "WEATHER_API_URL": f"{fake_url}/data/2.5/weather",
+                "WEATHER_API_KEY": os.getenv("WEATHER_API_KEY") or "fake",
+                "FLASK_SECRET_KEY": os.getenv("FLASK_SECRET_KEY") or "load-test",
+                # Fresh caches and memory, so earlier runs don't answer for the fake
+                "MEMORY_DB_PATH": os.path.join(tmp, "conversations.sqlite3"),
+                "RESPONSE_CACHE_PATH": os.path.join(tmp, "response_cache.sqlite3"),
+                "MANUAL_CACHE_PATH": os.path.join(tmp, "manual_cache.sqlite3"),
+            }
+            log_path = os.path.join(tmp, "gunicorn.log")
+            with open(log_path, "w") as log:
+                app = subprocess.Popen(
+                    [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "--threads", str(args.threads),
+                     "-b", f"127.0.0.1:{port}", "--timeout", "120", "app:app"],
+                    cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+            try:
+                url = f"http://127.0.0.1:{port}"
+                _wait_ready(url, process=app)
+                print(f"gunicorn: {args.workers} worker(s) x {args.threads} thread(s); fake upstream: "
+                      f"ttft {args.ttft} ms, {args.reply_tokens} tokens at {args.token_rate:g}/s")
+                steps = run_load_test(url, users_steps, args.duration, LoadDriver(url, **driver_kwargs),
+                                      slots=args.workers * args.threads, fake_url=fake_url)
+            except RuntimeError as e:
+                with open(log_path) as log:
+                    print(log.read()[-4000:])
+                print(f"Load test failed: {e}")
+                return 1
+            finally:
+                app.terminate()
+                try:
+                    app.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    app.kill()
+                server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(steps, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
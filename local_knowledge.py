@@ -0,0 +1,137 @@
+"""
+Local Knowledge Module for Chatbot
+
+This module answers simple messages without an LLM round trip. Intent patterns
+are kept in a hash map for exact lookups and agriculture knowledge base keywords
+are compiled into a keyword automaton, so lookups stay fast as the KB grows.
+Intents marked "placeholder" (a canned reply standing in for a real answer,
+like the math intent's) are left out, so those messages go to the LLM.
+"""
+
+import json
+import os
+import random
+import re
+
+from matchers import KeywordMatcher
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Light normalization used for local matching: lowercase, punctuation
+    replaced by spaces and runs of whitespace collapsed
+
+    Args:
+        text (str): Text to normalize
+
+    Returns:
+        str: Normalized text, e.g. "What's  up?!" -> "what s up"
+    """
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class LocalKnowledgeIndex:
+    def __init__(self, intents, agri_knowledge, normalize=True):
+        """
+        Build the lookup structures for intents and the agriculture KB
+
+        Args:
+            intents (dict): Parsed intents.json ({"intents": [...]})
+            agri_knowledge (list): Parsed agriculture_kb.json
+            normalize (bool): Also match after light normalization of punctuation
+                and whitespace, so e.g. "Hi!" finds the "Hi" intent
+        """
+        self.intents = [intent for intent in intents.get('intents', []) if not intent.get('placeholder')]
+        self.agri_knowledge = agri_knowledge
+        self.normalize = normalize
+
+        # Exact intent patterns; the first intent listing a pattern wins, as it
+        # did with the old in-order loop
+        self._exact = {}
+        self._exact_normalized = {}
+        self._by_tag = {}
+        for intent in self.intents:
+            self._by_tag.setdefault(intent.get('tag'), intent)
+            for pattern in intent['patterns']:
+                self._exact.setdefault(pattern.lower(), intent)
+                if normalize:
+                    self._exact_normalized.setdefault(normalize_text(pattern), intent)
+
+        # KB keywords are registered under their item's position, so the item
+        # listed first wins when several match
+        self._kb = KeywordMatcher()
+        self._kb_normalized = KeywordMatcher()
+        for position, item in enumerate(agri_knowledge):
+            self._kb.add_keywords(position, item['keywords'])
+            if normalize:
+                self._kb_normalized.add_keywords(
+                    position, [normalize_text(kw) for kw in item['keywords']]
+                )
+
+    def match_intent(self, query):
+        """Return the intent whose pattern equals the query (case-insensitive), or None"""
+        intent = self._exact.get(query.lower())
+        if intent is None and self.normalize:
+            intent = self._exact_normalized.get(normalize_text(query))
+        return intent
+
+    def match_knowledge(self, query):
+        """Return the first KB item with a keyword contained in the query, or None"""
+        positions = self._kb.scan(query).categories()
+        if self.normalize:
+            positions |= self._kb_normalized.scan(normalize_text(query)).categories()
+        return self.agri_knowledge[min(positions)] if positions else None
+
+    def responses_for(self, tag):
+        """Return the responses of the intent with the given tag (empty if unknown or a placeholder)"""
+        intent = self._by_tag.get(tag)
+        return intent['responses'] if intent else []
+
+    def clear_cache(self):
+        """Forget the KB matchers' recent scan results"""
+        self._kb.clear_cache()
+        self._kb_normalized.clear_cache()
+
+    def get_response(self, query):
+        """
+        Answer the query from local knowledge
+
+        Args:
+            query (str): The user's message
+
+        Returns:
+            str: A response, or None if nothing local matches
+        """
+        # Check basic intents
+        intent = self.match_intent(query)
+        if intent:
+            return random.choice(intent['responses'])
+
+        # Check agriculture KB
+        item = self.match_knowledge(query)
+        if item:
+            return item['response']
+        return None
+
+
+def _load_json(filename, default):
+    try:
+        with open(os.path.join(BASE_DIR, filename)) as f:
+            data = json.load(f)
+            return data if data else default
+    except Exception:
+        return default
+
+
+# Global index shared by app.py and core.py
+local_index = LocalKnowledgeIndex(
+    _load_json('intents.json', {"intents": []}),
+    _load_json('agriculture_kb.json', []),
+    normalize=os.getenv('LOCAL_MATCH_NORMALIZE', 'true').lower() in ('true', 'yes', '1')
+)
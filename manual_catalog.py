@@ -0,0 +1,271 @@
+"""
+Manual Catalog Module for Chatbot
+
+This module indexes the farming manuals listed in farming_manuals.json. Preview
+and page text are extracted from each PDF once, in a background thread, and
+stored in a SQLite sidecar keyed by path, modification time and size, so
+restarts and new gunicorn workers reuse them and only changed files are parsed
+again. Searches never open a PDF.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from matchers import KeywordMatcher
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers may extract the same file twice
+    fcntl = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PREVIEW_CHARS = 150
+
+
+def extract_pages(path):
+    """
+    Text of every page of a PDF
+
+    Args:
+        path (str): PDF file
+
+    Returns:
+        list: One string per page
+    """
+    import PyPDF2  # Only the extraction thread needs it
+
+    with open(path, 'rb') as f:
+        pdf = PyPDF2.PdfReader(f)
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+class ManualCatalog:
+    def __init__(self, catalog_path, cache_path=None, check_interval=60):
+        """
+        Initialize the catalog. Nothing is read until load() or preload().
+
+        Args:
+            catalog_path (str): JSON list of manuals (id, title, keywords, path)
+            cache_path (str): SQLite sidecar for extracted text (None keeps it in
+                memory, so every process extracts for itself)
+            check_interval (int): Seconds between background checks of the
+                catalog and the PDFs for changes
+        """
+        self.catalog_path = catalog_path
+        self.cache_path = cache_path
+        self.check_interval = check_interval
+        self.manuals = []
+        self.by_id = {}
+        self._matcher = KeywordMatcher()
+        self._previews = {}  # manual id -> preview text
+        self._loaded = False
+        self._memory_db = None
+        self._checked_at = 0.0
+        self._missing = set()  # paths found missing, so each is only logged when it goes or comes back
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stats = {"searches": 0, "extracted": 0, "reused": 0, "errors": 0}
+
+    def _db(self):
+        """Open the sidecar (or return the shared in-memory database)"""
+        if self.cache_path:
+            conn = sqlite3.connect(self.cache_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+        elif self._memory_db is None:
+            conn = self._memory_db = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        else:
+            return self._memory_db
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS manual_text ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "preview TEXT NOT NULL, pages TEXT NOT NULL)"
+        )
+        return conn
+
+    def _close(self, conn):
+        if conn is not self._memory_db:
+            conn.close()
+
+    def _resolve(self, path):
+        return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+    def load(self):
+        """Read the catalog and build the id and keyword indexes"""
+        try:
+            with open(self.catalog_path) as f:
+                manuals = json.load(f) or []
+        except Exception as e:
+            logger.warning("Manual catalog unavailable (%s): %s", self.catalog_path, e)
+            manuals = []
+
+        matcher = KeywordMatcher()
+        for position, manual in enumerate(manuals):
+            manual['path'] = self._resolve(manual['path'])
+            matcher.add_keywords(position, manual.get('keywords', []))
+        with self._lock:
+            self.manuals = manuals
+            self.by_id = {manual['id']: manual for manual in manuals}
+            self._matcher = matcher
+            self._loaded = True
+
+    def refresh(self):
+        """
+        Make sure every manual's text is extracted, re-parsing only PDFs whose
+        modification time or size changed since they were cached
+        """
+        with self._refresh_lock:
+            self.load()
+            self._checked_at = time.monotonic()
+            conn = self._db()
+            lock_file = None
+            try:
+                if fcntl and self.cache_path:
+                    # One worker extracts; the others wait and then read its results
+                    lock_file = open(self.cache_path + '.lock', 'w')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                previews = {}
+                for manual in self.manuals:
+                    preview = self._refresh_manual(conn, manual['path'])
+                    if preview is not None:
+                        previews[manual['id']] = preview
+                with self._lock:
+                    self._previews = previews
+            finally:
+                if lock_file:
+                    lock_file.close()
+                self._close(conn)
+
+    def _refresh_manual(self, conn, path):
+        """Return the preview of one PDF, extracting it if the cached copy is stale"""
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            # Refreshes run one at a time (_refresh_lock), so _missing needs no lock
+            if path in self._missing:
+                logger.debug("Manual still missing: %s", e)
+            else:
+                self._missing.add(path)
+                logger.warning("Manual missing: %s", e)
+            return None
+        if path in self._missing:
+            self._missing.discard(path)
+            logger.info("Manual found again: %s", path)
+
+        row = conn.execute("SELECT mtime_ns, size, preview FROM manual_text WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            with self._lock:
+                self._stats["reused"] += 1
+            return row[2]
+
+        start = time.perf_counter()
+        try:
+            pages = extract_pages(path)
+        except Exception as e:
+            logger.warning("Manual extraction error (%s): %s", path, e)
+            with self._lock:
+                self._stats["errors"] += 1
+            return None
+        preview = (pages[0] if pages else "")[:PREVIEW_CHARS] + "..."
+        conn.execute("INSERT OR REPLACE INTO manual_text VALUES (?, ?, ?, ?, ?)",
+                     (path, stat.st_mtime_ns, stat.st_size, preview, json.dumps(pages)))
+        logger.info("Extracted %d pages from %s in %.0fms", len(pages), path, (time.perf_counter() - start) * 1000)
+        with self._lock:
+            self._stats["extracted"] += 1
+        return preview
+
+    def preload(self):
+        """Read the catalog now and extract or load manual text in a background thread"""
+        if not self._loaded:
+            self.load()
+        threading.Thread(target=self._refresh_quietly, name="manual-catalog", daemon=True).start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.exception("Manual catalog refresh error: %s", e)
+
+    def _maybe_refresh(self):
+        """Start a background check for changed files once check_interval has passed"""
+        if not self._loaded:
+            self.load()
+        if time.monotonic() - self._checked_at >= self.check_interval and not self._refresh_lock.locked():
+            self._checked_at = time.monotonic()
+            self.preload()
+
+    def get(self, manual_id):
+        """Return the manual with the given id, or None"""
+        if not self._loaded:
+            self.load()
+        return self.by_id.get(manual_id)
+
+    def search(self, query):
+        """
+        Manuals whose keywords occur in a message
+
+        Args:
+            query (str): User message
+
+        Returns:
+            list: {"id", "title", "preview"} per match, in catalog order; the
+                preview is empty until the manual's text has been extracted
+        """
+        self._maybe_refresh()
+        with self._lock:
+            manuals, matcher, previews = self.manuals, self._matcher, self._previews
+            self._stats["searches"] += 1
+        positions = sorted(matcher.scan(query).categories())
+        return [{
+            "id": manuals[position]['id'],
+            "title": manuals[position]['title'],
+            "preview": previews.get(manuals[position]['id'], "")
+        } for position in positions]
+
+    def pages(self, manual_id):
+        """
+        Extracted page text of a manual
+
+        Returns:
+            list: One string per page (empty if the manual isn't extracted yet)
+        """
+        manual = self.get(manual_id)
+        if manual is None:
+            return []
+        conn = self._db()
+        try:
+            row = conn.execute("SELECT pages FROM manual_text WHERE path = ?", (manual['path'],)).fetchone()
+        finally:
+            self._close(conn)
+        return json.loads(row[0]) if row else []
+
+    def stats(self):
+        """
+        Catalog statistics for this worker
+
+        Returns:
+            dict: Searches, PDFs extracted, PDFs reused from the sidecar,
+                extraction errors and the number of manuals with a preview
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["manuals"] = len(self.manuals)
+            stats["previews"] = len(self._previews)
+        return stats
+
+
+# Global catalog shared by app.py and asgi_app.py
+manual_catalog = ManualCatalog(
+    os.getenv('MANUALS_PATH', os.path.join(BASE_DIR, 'farming_manuals.json')),
+    cache_path=os.getenv('MANUAL_CACHE_PATH', os.path.join(BASE_DIR, 'manual_cache.sqlite3')) or None,
+    check_interval=int(os.getenv('MANUAL_CHECK_INTERVAL', '60'))
+)
@@ -0,0 +1,293 @@
+"""
+Text Matching Module for Chatbot
+
+This module provides a compiled multi-pattern keyword matcher (an Aho-Corasick
+automaton) so that every request classifier can be answered from a single scan
+of the user's query instead of one substring scan per keyword, and a compiled
+regex set that only runs the patterns whose required literals occur in a text.
+"""
+
+import re
+from collections import deque
+from functools import lru_cache
+
+try:  # Python 3.11+
+    from re import _parser as _regex_parser
+except ImportError:  # older interpreters
+    import sre_parse as _regex_parser
+
+
+class KeywordHits:
+    """
+    Result of scanning a text: the keywords found, grouped by category
+    """
+
+    __slots__ = ('_hits',)
+
+    def __init__(self, hits):
+        self._hits = hits
+
+    def has(self, category):
+        """Return True if at least one keyword of the category was found"""
+        return category in self._hits
+
+    def score(self, category):
+        """Return the number of distinct keywords of the category that were found"""
+        return len(self._hits.get(category, ()))
+
+    def keywords(self, category):
+        """Return the set of keywords of the category that were found"""
+        return self._hits.get(category, frozenset())
+
+    def categories(self):
+        """Return every category with at least one hit"""
+        return set(self._hits)
+
+
+class KeywordMatcher:
+    def __init__(self, cache_size=256):
+        """
+        Initialize an empty matcher. Keywords are registered per category and the
+        automaton is (re)built lazily on the first scan after a registration.
+
+        Args:
+            cache_size (int): Number of recent scan results to keep, so that several
+                classifiers looking at the same query only pay for one scan
+        """
+        self._categories = {}  # keyword -> set of categories it belongs to
+        self._goto = None
+        self._fail = None
+        self._output = None
+        self._alphabet = None
+        self._scan_cached = lru_cache(maxsize=cache_size)(self._scan)
+
+    def add_keywords(self, category, keywords):
+        """
+        Register keywords under a category. Matching is case-insensitive substring
+        matching, exactly like ``keyword in text.lower()``.
+
+        Args:
+            category (hashable): Name of the category (e.g. 'code_request')
+            keywords (iterable): Keywords belonging to the category
+        """
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if keyword:
+                self._categories.setdefault(keyword, set()).add(category)
+        self._goto = None
+        self._scan_cached.cache_clear()
+
+    def _build(self):
+        """Build the trie, failure links and merged outputs for all keywords"""
+        goto = [{}]
+        output = [()]
+        for keyword in self._categories:
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    output.append(())
+                state = nxt
+            output[state] = (keyword,)
+
+        # Breadth-first pass to compute failure links; each state's output also
+        # includes the output of its failure state so the scan never walks chains
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                output[nxt] = output[nxt] + output[fail[nxt]]
+
+        self._alphabet = frozenset(ch for keyword in self._categories for ch in keyword)
+        self._fail = fail
+        self._output = output
+        self._goto = goto
+
+    def _scan(self, text):
+        if self._goto is None:
+            self._build()
+        goto, fail, output, alphabet = self._goto, self._fail, self._output, self._alphabet
+
+        found = set()
+        state = 0
+        for ch in text.lower():
+            if ch not in alphabet:
+                # No keyword contains this character, so every partial match ends here
+                state = 0
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+
+        hits = {}
+        for keyword in found:
+            for category in self._categories[keyword]:
+                hits.setdefault(category, set()).add(keyword)
+        return KeywordHits({category: frozenset(kws) for category, kws in hits.items()})
+
+    def scan(self, text):
+        """
+        Scan the text once and return every category hit
+
+        Args:
+            text (str): Text to scan (matched case-insensitively)
+
+        Returns:
+            KeywordHits: The keywords found, grouped by category
+        """
+        return self._scan_cached(text)
+
+    def clear_cache(self):
+        """Forget recent scan results, so the next scans run the automaton"""
+        self._scan_cached.cache_clear()
+
+
+# Non-ASCII characters that match an ASCII letter under re.IGNORECASE ('İ' is
+# also the only character whose str.lower() changes the length of a string)
+_ASCII_CASE_FOLDS_CHARS = '\u0130\u0131\u017f\u212a'
+_ASCII_CASE_FOLDS = str.maketrans(_ASCII_CASE_FOLDS_CHARS, 'iisk')
+
+# Literals sitting further than this into a match are located with a plain search
+_MAX_ANCHORED_OFFSET = 32
+
+
+def _required_literal(pattern, flags):
+    """
+    Find the longest run of literal characters that every match of the pattern
+    must contain, together with the (min, max) width of what precedes it.
+
+    Returns:
+        tuple: (literal, min_offset, max_offset), or ('', 0, None) when no literal
+            can be determined or the offset is unbounded (max_offset is None)
+    """
+    try:
+        parsed = _regex_parser.parse(pattern, flags)
+    except Exception:
+        return '', 0, None
+    best = ('', 0)  # (literal, index of its first item)
+    run, run_start = '', 0
+    for index, (op, av) in enumerate(parsed):
+        if str(op) == 'LITERAL':
+            if not run:
+                run_start = index
+            run += chr(av)
+            continue
+        if len(run) > len(best[0]):
+            best = (run, run_start)
+        run = ''
+    if len(run) > len(best[0]):
+        best = (run, run_start)
+
+    literal, literal_start = best
+    if not literal:
+        return '', 0, None
+    try:
+        min_offset, max_offset = _regex_parser.SubPattern(
+            parsed.state, parsed.data[:literal_start]
+        ).getwidth()
+    except Exception:
+        return literal, 0, None
+    return literal, min_offset, (max_offset if max_offset <= _MAX_ANCHORED_OFFSET else None)
+
+
+class PatternSet:
+    def __init__(self, patterns, flags=0):
+        """
+        Compile a list of labelled regex patterns once and index each one by a
+        literal it requires, so a scan only runs the patterns that can match and
+        only around the places where that literal occurs.
+
+        Args:
+            patterns (list): (label, pattern) pairs, in priority order
+            flags (int): re flags applied to every pattern
+        """
+        self.labels = [label for label, _ in patterns]
+        self._patterns = [re.compile(pattern, flags) for _, pattern in patterns]
+        self._ignorecase = bool(flags & re.IGNORECASE)
+        self._literals = []
+        for _, pattern in patterns:
+            literal, min_offset, max_offset = _required_literal(pattern, flags)
+            if self._ignorecase:
+                # Case-insensitive lookups are only exact for ASCII literals
+                literal = literal.lower() if literal.isascii() else ''
+            self._literals.append((literal, min_offset, max_offset))
+
+    def _haystack(self, text):
+        """Return the text the literals are looked up in"""
+        if not self._ignorecase:
+            return text
+        if not text.isascii() and any(ch in text for ch in _ASCII_CASE_FOLDS_CHARS):
+            # Map the few non-ASCII characters the regex engine treats as equal
+            # to an ASCII letter, keeping the haystack aligned with the text
+            text = text.translate(_ASCII_CASE_FOLDS)
+        return text.lower()
+
+    def _matches(self, index, text, haystack):
+        """Return True if pattern ``index`` matches anywhere in the text"""
+        pattern = self._patterns[index]
+        literal, min_offset, max_offset = self._literals[index]
+        if not literal:
+            return pattern.search(text) is not None
+
+        pos = haystack.find(literal)
+        if pos == -1:
+            return False
+        if max_offset is None:
+            return pattern.search(text) is not None
+        # Bounded prefix: try the few start positions before each occurrence
+        while pos != -1:
+            for start in range(max(0, pos - max_offset), pos - min_offset + 1):
+                if pattern.match(text, start):
+                    return True
+            pos = haystack.find(literal, pos + 1)
+        return False
+
+    def find(self, text):
+        """
+        Find which patterns occur anywhere in the text. The result is exactly the
+        set of patterns for which ``re.search(pattern, text)`` would succeed.
+
+        Args:
+            text (str): Text to scan
+
+        Returns:
+            set: Indices (into ``labels``) of the patterns that matched
+        """
+        haystack = self._haystack(text)
+        return {index for index in range(len(self._patterns)) if self._matches(index, text, haystack)}
+
+    def count_by_label(self, text):
+        """
+        Count matching patterns per label
+
+        Returns:
+            dict: label -> number of its patterns found in the text
+        """
+        counts = {}
+        for index in self.find(text):
+            label = self.labels[index]
+            counts[label] = counts.get(label, 0) + 1
+        return counts
+
+    def first_label(self, text):
+        """Return the label of the highest-priority pattern found, or None"""
+        haystack = self._haystack(text)
+        for index in range(len(self._patterns)):
+            if self._matches(index, text, haystack):
+                return self.labels[index]
+        return None
+
+
+# Global instance shared by all request classifiers
+keywords = KeywordMatcher()
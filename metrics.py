@@ -0,0 +1,463 @@
+"""
+Metrics Module for Chatbot
+
+This module collects request, stage and upstream metrics and renders them in
+the Prometheus text format for /metrics. Recording is an in-memory update under
+one lock (a few microseconds per timed stage, see `python benchmark.py run -k
+metrics`), so it stays on in production. Every worker process writes a snapshot
+of its metrics to a shared directory once a second, and /metrics sums the
+snapshots of all workers under the same gunicorn master, so a scrape sees the
+whole server whichever worker answers it. Counters of workers that exited are
+kept; their gauges are dropped.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent scrapes may fold an exited worker twice
+    fcntl = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers sub-millisecond classifiers up to slow LLM replies
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        self._lock = registry._lock
+
+    def _samples(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        """Add amount to the series with the given label values"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """A current value; the per-worker values of live workers are summed"""
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        """Record a value (seconds, for latencies)"""
+        index = bisect_left(self.buckets, value)  # Buckets are inclusive upper bounds
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Counts per bucket (the last one is +Inf), then the sum
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager that observes the seconds spent in its block"""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            return [[list(labels), list(series)] for labels, series in self._values.items()]
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if isinstance(value, float):
+        if value == int(value) and abs(value) < 1e15:
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None, interval=1.0, stale_after=30.0):
+        """
+        Initialize the registry. Nothing is written until ensure_writer() (run
+        for every request) or a scrape starts the snapshot thread.
+
+        Args:
+            directory (str): Where workers share snapshots (None: this process only)
+            interval (float): Seconds between snapshots
+            stale_after (float): Seconds without a snapshot after which a worker
+                counts as exited
+        """
+        self.directory = directory
+        self.interval = interval
+        self.stale_after = stale_after
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._writer_pid = None
+        self._written = None
+
+    # Registration
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(self, name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """
+        Add a function read at snapshot time instead of on every event (for
+        components that already count in their own stats())
+
+        Args:
+            collect (callable): Returns (name, kind, help, labels dict, value)
+                tuples, kind being 'counter' or 'gauge'
+        """
+        self._collectors.append(collect)
+
+    # Snapshots
+
+    def snapshot(self):
+        """
+        This process's metrics
+
+        Returns:
+            dict: {name: {"type", "help", "labelnames", "buckets", "samples"}}
+        """
+        snapshot = {}
+        for metric in list(self._metrics.values()):
+            samples = metric._samples()
+            if samples:
+                snapshot[metric.name] = {"type": metric.kind, "help": metric.help,
+                                         "labelnames": list(metric.labelnames),
+                                         "buckets": list(getattr(metric, 'buckets', ())), "samples": samples}
+        for collect in self._collectors:
+            try:
+                collected = list(collect())
+            except Exception as e:
+                logger.warning("Metrics collector error: %s", e)
+                continue
+            for name, kind, help, labels, value in collected:
+                entry = snapshot.setdefault(name, {"type": kind, "help": help, "labelnames": list(labels),
+                                                   "buckets": [], "samples": []})
+                entry["samples"].append([[str(labels[label]) for label in entry["labelnames"]], value])
+        return snapshot
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{os.getppid()}-{pid}.json")
+
+    def ensure_writer(self):
+        """Start the snapshot thread in this process (again after a fork); cheap to call per request"""
+        if self.directory is None or self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        threading.Thread(target=self._write_loop, name="metrics", daemon=True).start()
+        atexit.register(self.write)
+
+    def _write_loop(self):
+        while True:
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning("Metrics snapshot error: %s", e)
+            time.sleep(self.interval)
+
+    def write(self):
+        """Write this process's snapshot for the other workers (or just refresh its time if unchanged)"""
+        data = json.dumps({"pid": os.getpid(), "metrics": self.snapshot()}, separators=(',', ':'))
+        path = self._path(os.getpid())
+        if data == self._written and os.path.exists(path):
+            os.utime(path)
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._written = data
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)["metrics"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _others(self):
+        """
+        Snapshots of the other workers under the same master, plus the archive
+        of exited workers' counters (folding newly exited workers into it)
+
+        Returns:
+            list: (snapshot, live) pairs
+        """
+        prefix = f"{os.getppid()}-"
+        archive_path = os.path.join(self.directory, f"{os.getppid()}-archive.json")
+        own = os.path.basename(self._path(os.getpid()))
+        now = time.time()
+        live, exited = [], []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.json') or name == own or name.endswith('-archive.json'):
+                continue
+            try:
+                age = now - os.stat(path).st_mtime
+            except OSError:
+                continue
+            if not name.startswith(prefix):
+                # Left behind by an earlier server (another master)
+                if age > self.stale_after:
+                    self._remove(path)
+                continue
+            (exited if age > self.stale_after else live).append(path)
+
+        if exited:
+            lock_file = None
+            try:
+                if fcntl:
+                    lock_file = open(archive_path + '.lock', 'w')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                archive = self._read(archive_path) or {}
+                for path in exited:
+                    snapshot = self._read(path)
+                    if snapshot is not None:
+                        _merge(archive, snapshot, include_gauges=False)
+                tmp = f"{archive_path}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump({"pid": None, "metrics": archive}, f, separators=(',', ':'))
+                os.replace(tmp, archive_path)
+                for path in exited:
+                    self._remove(path)
+            finally:
+                if lock_file:
+                    lock_file.close()
+
+        others = [(self._read(path), True) for path in live]
+        others.append((self._read(archive_path), False))
+        return [(snapshot, is_live) for snapshot, is_live in others if snapshot]
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def collect(self):
+        """
+        Metrics of every worker, summed
+
+        Returns:
+            tuple: (merged snapshot, number of live worker processes)
+        """
+        self.ensure_writer()
+        merged = {}
+        _merge(merged, self.snapshot(), include_gauges=True)
+        workers = 1
+        if self.directory is not None:
+            for snapshot, live in self._others():
+                _merge(merged, snapshot, include_gauges=live)
+                workers += live
+        return merged, workers
+
+    def render(self):
+        """
+        All workers' metrics in the Prometheus text exposition format
+
+        Returns:
+            str: The /metrics response body
+        """
+        merged, workers = self.collect()
+        lines = ["# HELP chatbot_workers Worker processes reporting metrics", "# TYPE chatbot_workers gauge",
+                 f"chatbot_workers {workers}"]
+        for name in sorted(merged):
+            entry = merged[name]
+            lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            labelnames = entry["labelnames"]
+            for labels, value in sorted(entry["samples"], key=lambda sample: sample[0]):
+                if entry["type"] != 'histogram':
+                    lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(entry["buckets"] + ["+Inf"], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(float(bound))
+                    lines.append(f"{name}_bucket{_labels(labelnames, labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(into, snapshot, include_gauges):
+    """Add a snapshot's samples into another (histograms bucket by bucket)"""
+    for name, entry in snapshot.items():
+        if entry["type"] == 'gauge' and not include_gauges:
+            continue
+        target = into.setdefault(name, {**entry, "samples": []})
+        index = {tuple(sample[0]): sample for sample in target["samples"]}
+        for labels, value in entry["samples"]:
+            sample = index.get(tuple(labels))
+            if sample is None:
+                sample = [list(labels), [0] * len(value) if isinstance(value, list) else 0]
+                target["samples"].append(sample)
+                index[tuple(labels)] = sample
+            if isinstance(value, list):
+                sample[1] = [a + b for a, b in zip(sample[1], value)]
+            else:
+                sample[1] += value
+
+
+def component_stats():
+    """
+    Cache and memory counters the components already keep in their stats(),
+    read at snapshot time rather than counted again on every lookup
+    """
+    name, help = "chatbot_cache_lookups_total", "Cache lookups by cache and result"
+    caches = (
+        ('response_cache', 'response_cache', 'response', ("memory_hits", "disk_hits"), "misses"),
+        ('semantic_cache', 'semantic_cache', 'semantic', ("hits",), "misses"),
+        ('weather_service', 'weather', 'weather', ("hits",), "misses"),
+        ('conversation_memory', 'memory', 'conversation', ("cache_hits",), "cache_misses"),
+    )
+    for module_name, attribute, cache, hits, misses in caches:
+        module = sys.modules.get(module_name)  # Only components this process uses
+        component = getattr(module, attribute, None)
+        if component is None:
+            continue
+        stats = component.stats()
+        yield name, 'counter', help, {"cache": cache, "result": "hit"}, sum(stats.get(key, 0) for key in hits)
+        yield name, 'counter', help, {"cache": cache, "result": "miss"}, stats.get(misses, 0)
+        if cache == 'weather':
+            yield name, 'counter', help, {"cache": cache, "result": "coalesced"}, stats.get("coalesced", 0)
+
+
+def log_stats():
+    """Log records the structured logging pipeline dropped (queue full) or sampled out"""
+    module = sys.modules.get('structured_logging')
+    if module is None:
+        return
+    stats = module.log_pipeline.stats()
+    name, help = "chatbot_log_records_discarded_total", "Log records not written, by reason"
+    yield name, 'counter', help, {"reason": "queue_full"}, stats["dropped"]
+    yield name, 'counter', help, {"reason": "sampled_out"}, stats["sampled_out"]
+
+
+def _default_directory():
+    # One directory per checkout, so two deployments on a host don't mix
+    digest = hashlib.sha1(BASE_DIR.encode()).hexdigest()[:8]
+    return os.path.join(tempfile.gettempdir(), f"chatbot-metrics-{digest}")
+
+
+# Global registry and the metrics shared by app.py, asgi_app.py and http_client.py
+registry = MetricsRegistry(
+    directory=os.getenv('METRICS_DIR', _default_directory()) or None,
+    interval=float(os.getenv('METRICS_INTERVAL', '1'))
+)
+registry.add_collector(component_stats)
+registry.add_collector(log_stats)
+
+REQUESTS = registry.counter(
+    "chatbot_requests_total", "Requests by endpoint and the route the pipeline took", ("endpoint", "route"))
+REQUEST_SECONDS = registry.histogram(
+    "chatbot_request_seconds", "Request duration by endpoint, until the last byte of streamed replies", ("endpoint",))
+IN_FLIGHT = registry.gauge("chatbot_requests_in_flight", "Requests being served")
+STAGE_SECONDS = registry.histogram(
+    "chatbot_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+TTFT_SECONDS = registry.histogram(
+    "chatbot_llm_ttft_seconds", "Time from request start to the first LLM token (whole reply if not streamed)",
+    ("route",))
+UPSTREAM_REQUESTS = registry.counter(
+    "chatbot_upstream_requests_total", "Upstream API calls by host and status (error: no response)",
+    ("upstream", "status"))
+UPSTREAM_RETRIES = registry.counter("chatbot_upstream_retries_total", "Upstream API retries by host", ("upstream",))
+UPSTREAM_SECONDS = registry.histogram(
+    "chatbot_upstream_seconds", "Upstream API call time including retries (to the headers of streamed replies)",
+    ("upstream",))
+
+
+def stage(name):
+    """Context manager timing a pipeline stage into chatbot_stage_seconds"""
+    return STAGE_SECONDS.time(name)
@@ -0,0 +1,362 @@
+"""
+Price Store Module for Chatbot
+
+This module answers market price questions from market_prices.json (or a CSV
+feed with the same columns). Rows are held in columnar NumPy arrays with
+crop-name and region indexes, crop keywords act as aliases, and a keyword
+automaton finds the crops and regions a message mentions. The source file is
+re-read when it changes and the new data is swapped in atomically, so price
+updates don't need a restart.
+"""
+
+import bisect
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from local_knowledge import normalize_text
+from matchers import KeywordMatcher
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Trailing words dropped from keywords so "maize price" is an alias of maize
+_ALIAS_SUFFIXES = (" prices", " price", " cost")
+
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£"}
+
+
+def _alias(keyword):
+    alias = normalize_text(keyword)
+    for suffix in _ALIAS_SUFFIXES:
+        if alias.endswith(suffix):
+            return alias[:-len(suffix)]
+    return alias
+
+
+def _read_rows(path):
+    """Yield (name, price, currency, unit, region, keywords) from a JSON or CSV feed"""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = {column.strip(): position for position, column in enumerate(next(reader))}
+            columns = [header.get(column) for column in ('name', 'price', 'currency', 'unit', 'region', 'keywords')]
+            defaults = (None, None, 'USD', 'kg', 'Global', '')
+            for row in reader:
+                name, price, currency, unit, region, keywords = (
+                    row[position] if position is not None and position < len(row) and row[position] else default
+                    for position, default in zip(columns, defaults)
+                )
+                yield name, float(price), currency, unit, region, keywords.split(';') if keywords else []
+    else:
+        with open(path, encoding='utf-8') as f:
+            for item in json.load(f):
+                yield (item['name'], float(item['price']), item.get('currency', 'USD'),
+                       item.get('unit', 'kg'), item.get('region', 'Global'), item.get('keywords', []))
+
+
+class _Column:
+    """Categorical column: one small integer code per row plus the table of values"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self.row_codes = []
+
+    def add(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        self.row_codes.append(code)
+        return code
+
+    def freeze(self):
+        """Return the row codes as an array and a (row order, group starts) index"""
+        codes = np.array(self.row_codes, dtype=np.int32)
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        starts = np.searchsorted(codes[order], np.arange(len(self.values) + 1))
+        self.row_codes = None
+        return codes, order, starts
+
+
+class PriceTable:
+    """An immutable snapshot of the price feed and its indexes"""
+
+    def __init__(self, rows):
+        names, currencies, units, regions = _Column(), _Column(), _Column(), _Column()
+        prices = []
+        aliases = {}  # normalized alias -> set of name codes
+        seen = set()  # (name code, keywords) already aliased; feeds repeat them for every region
+        for name, price, currency, unit, region, keywords in rows:
+            code = names.add(name)
+            currencies.add(currency)
+            units.add(unit)
+            regions.add(region)
+            prices.append(price)
+            key = (code, tuple(keywords))
+            if key not in seen:
+                seen.add(key)
+                for alias in [name, *keywords]:
+                    alias = _alias(alias)
+                    if alias:
+                        aliases.setdefault(alias, set()).add(code)
+
+        self.prices = np.array(prices, dtype=np.float64)
+        self.names = names.values
+        self.currencies = currencies.values
+        self.units = units.values
+        self.regions = regions.values
+        self.name_codes, self._name_order, self._name_starts = names.freeze()
+        self.currency_codes = np.array(currencies.row_codes, dtype=np.int16)
+        self.unit_codes = np.array(units.row_codes, dtype=np.int16)
+        self.region_codes, self._region_order, self._region_starts = regions.freeze()
+
+        self.aliases = {alias: sorted(codes) for alias, codes in aliases.items()}
+        self.region_lookup = {normalize_text(region): code for code, region in enumerate(self.regions)}
+        self._sorted_aliases = sorted(self.aliases)
+
+        # Crop aliases and region names in free text ("price of corn in asia");
+        # space-padded so "rice" doesn't match inside "price"
+        self._matcher = KeywordMatcher(cache_size=0)
+        for alias, codes in self.aliases.items():
+            for code in codes:
+                self._matcher.add_keywords(('crop', code), [f" {alias} "])
+        for region, code in self.region_lookup.items():
+            self._matcher.add_keywords(('region', code), [f" {region} "])
+        self._matcher.scan(" ")  # Build the automaton now rather than on the first query
+
+    def __len__(self):
+        return len(self.prices)
+
+    def rows_for_names(self, codes):
+        """Row numbers of the given crop names, in file order"""
+        parts = [self._name_order[self._name_starts[c]:self._name_starts[c + 1]] for c in codes]
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int32)
+
+    def rows_for_region(self, code):
+        return self._region_order[self._region_starts[code]:self._region_starts[code + 1]]
+
+    def mentions(self, text):
+        """
+        Crops and regions mentioned in a message
+
+        Returns:
+            tuple: (sorted crop name codes, sorted region codes)
+        """
+        hits = self._matcher.scan(f" {normalize_text(text)} ")
+        categories = hits.categories()
+        return (sorted(code for kind, code in categories if kind == 'crop'),
+                sorted(code for kind, code in categories if kind == 'region'))
+
+    def crop_codes(self, crop):
+        """Crop name codes for a name or alias, or else every crop with an alias starting with it"""
+        alias = _alias(crop)
+        codes = self.aliases.get(alias)
+        if codes is None:
+            codes = sorted({code for match in self.prefix(alias) for code in self.aliases[match]})
+        return codes
+
+    def prefix(self, prefix, limit=None):
+        """Aliases starting with a prefix, in alphabetical order"""
+        prefix = normalize_text(prefix)
+        start = bisect.bisect_left(self._sorted_aliases, prefix)
+        result = []
+        for alias in self._sorted_aliases[start:]:
+            if not alias.startswith(prefix) or (limit and len(result) >= limit):
+                break
+            result.append(alias)
+        return result
+
+    def item(self, row):
+        return {
+            "name": self.names[self.name_codes[row]],
+            "price": float(self.prices[row]),
+            "currency": self.currencies[self.currency_codes[row]],
+            "unit": self.units[self.unit_codes[row]],
+            "region": self.regions[self.region_codes[row]]
+        }
+
+
+class PriceStore:
+    def __init__(self, path, page_size=5, check_interval=2.0):
+        """
+        Initialize the store. The feed is loaded on first use.
+
+        Args:
+            path (str): market_prices.json or a CSV file with name, price,
+                currency, unit, region and keywords (';'-separated) columns
+            page_size (int): Default number of prices per page
+            check_interval (float): Minimum seconds between checks of the file
+                for changes
+        """
+        self.path = path
+        self.page_size = page_size
+        self.check_interval = check_interval
+        self._table = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stats = {"queries": 0, "reloads": 0, "reload_errors": 0}
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _load(self, signature):
+        """Build a new snapshot and swap it in; a broken file keeps the old one"""
+        start = time.perf_counter()
+        try:
+            table = PriceTable(_read_rows(self.path))
+        except Exception as e:
+            logger.warning("Price feed error (%s): %s", self.path, e)
+            with self._lock:
+                self._stats["reload_errors"] += 1
+            table = self._table if self._table is not None else PriceTable([])
+        else:
+            logger.info("Loaded %d prices from %s in %.0fms", len(table), self.path,
+                        (time.perf_counter() - start) * 1000)
+            with self._lock:
+                self._stats["reloads"] += 1
+        self._table, self._signature = table, signature
+
+    def _reload(self, signature):
+        try:
+            self._load(signature)
+        finally:
+            self._reload_lock.release()
+
+    def table(self):
+        """
+        The current snapshot. The first call loads the feed; later calls notice
+        a changed file and rebuild the snapshot in a background thread, serving
+        the previous one until the new one is swapped in.
+
+        Returns:
+            PriceTable: Prices and indexes
+        """
+        now = time.monotonic()
+        if self._table is not None and now - self._checked_at < self.check_interval:
+            return self._table
+        # Only one thread checks the file; the others carry on with the current snapshot
+        if not self._reload_lock.acquire(blocking=self._table is None):
+            return self._table
+        if self._table is None:
+            try:
+                self._checked_at = now
+                self._load(self._file_signature())
+            finally:
+                self._reload_lock.release()
+            return self._table
+
+        self._checked_at = now
+        signature = self._file_signature()
+        if signature == self._signature:
+            self._reload_lock.release()
+        else:
+            threading.Thread(target=self._reload, args=(signature,), name="price-reload", daemon=True).start()
+        return self._table
+
+    def reload(self):
+        """Reload the feed now, waiting for the new snapshot"""
+        with self._reload_lock:
+            self._checked_at = time.monotonic()
+            self._load(self._file_signature())
+
+    def resolve_crop(self, crop):
+        """
+        Crop names matching a name, keyword alias or prefix
+
+        Args:
+            crop (str): What the user typed (e.g. "corn", "Maize", "whe")
+
+        Returns:
+            list: Crop names; an exact name or alias wins over prefix matches
+        """
+        table = self.table()
+        return [table.names[code] for code in table.crop_codes(crop)]
+
+    def complete(self, prefix, limit=10):
+        """Crop names and aliases starting with a prefix, for autocompletion"""
+        return self.table().prefix(prefix, limit)
+
+    def search(self, crop=None, region=None, text=None, page=1, page_size=None):
+        """
+        Look up prices
+
+        Args:
+            crop (str): Crop name, keyword alias or prefix
+            region (str): Region name
+            text (str): Message to find crops and regions in when crop or region
+                is not given
+            page (int): 1-based page number
+            page_size (int): Prices per page (defaults to the store's page_size)
+
+        Returns:
+            dict: "items" (price dicts with name, price, currency, unit and
+                region), "page", "page_size", "pages" and "total"
+        """
+        table = self.table()
+        page_size = page_size or self.page_size
+        mentioned_crops, mentioned_regions = table.mentions(text) if text and not (crop and region) else ([], [])
+
+        name_codes = table.crop_codes(crop) if crop else (mentioned_crops or None)
+        if region:
+            region_code = table.region_lookup.get(normalize_text(region), -1)
+        else:
+            region_code = mentioned_regions[0] if mentioned_regions else None
+
+        if name_codes is not None:
+            rows = table.rows_for_names(name_codes)
+            if region_code is not None:
+                rows = rows[table.region_codes[rows] == region_code]
+        elif region_code is not None:
+            rows = table.rows_for_region(region_code) if region_code >= 0 else np.zeros(0, dtype=np.int32)
+        else:
+            rows = None  # everything, in file order
+
+        total = len(table) if rows is None else len(rows)
+        pages = max(1, -(-total // page_size))
+        page = min(max(1, page), pages)
+        start = (page - 1) * page_size
+        selected = range(start, min(start + page_size, total)) if rows is None else rows[start:start + page_size]
+        with self._lock:
+            self._stats["queries"] += 1
+        return {
+            "items": [table.item(int(row)) for row in selected],
+            "page": page,
+            "page_size": page_size,
+            "pages": pages,
+            "total": total
+        }
+
+    def stats(self):
+        """
+        Store statistics for this worker
+
+        Returns:
+            dict: Queries answered, reloads, failed reloads and the number of rows loaded
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["rows"] = len(self._table) if self._table is not None else 0
+        return stats
+
+
+# Global store shared by app.py and asgi_app.py
+price_store = PriceStore(
+    os.getenv('MARKET_PRICES_PATH', os.path.join(BASE_DIR, 'market_prices.json')),
+    page_size=int(os.getenv('MARKET_PRICES_PAGE_SIZE', '5'))
+)
@@ -0,0 +1,252 @@
+"""
+Response Cache Module for Chatbot
+
+This module caches LLM replies keyed on a canonical hash of the request (model,
+sampling parameters and messages, system prompt included), so repeated prompts
+are answered without a Groq call. A small in-memory LRU sits in front of a
+SQLite table that all gunicorn workers on the host share. The async lookups
+(aget, aset) answer from the LRU on the event loop and do the SQLite I/O in a
+thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Request fields that determine the reply; anything else (e.g. "stream") is ignored
+KEY_FIELDS = ('model', 'temperature', 'max_tokens', 'messages')
+
+
+class ResponseCache:
+    def __init__(self, path=None, memory_entries=256, disk_entries=10000, ttl=86400, enabled=True):
+        """
+        Initialize the cache. The database is opened lazily, once per thread.
+
+        Args:
+            path (str): SQLite file for the shared tier (None keeps the cache in memory only)
+            memory_entries (int): Replies kept in this process's LRU
+            disk_entries (int): Replies kept in the SQLite tier; the oldest go first
+            ttl (int): Seconds a reply stays valid
+            enabled (bool): Set to False to bypass the cache entirely
+        """
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._memory = OrderedDict()  # key -> (expires_at, reply)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_trim = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                       "writes": 0, "memory_evictions": 0, "disk_evictions": 0, "expired": 0}
+
+    @staticmethod
+    def key(payload):
+        """
+        Canonical hash of a chat completion request
+
+        Args:
+            payload (dict): Request body (model, temperature, messages, ...)
+
+        Returns:
+            str: Hex SHA-256 of the fields that determine the reply
+        """
+        canonical = json.dumps({field: payload.get(field) for field in KEY_FIELDS},
+                               sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _db(self):
+        """Return this thread's connection, creating the table on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, reply TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _remember(self, key, expires_at, reply):
+        with self._lock:
+            self._memory[key] = (expires_at, reply)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self._stats["memory_evictions"] += 1
+
+    def get(self, payload):
+        """
+        Look up the reply to a request
+
+        Args:
+            payload (dict): Chat completion request
+
+        Returns:
+            str: The cached reply, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        key = self.key(payload)
+        now = time.time()
+        reply = self._get_memory(key, now)
+        if reply is not None:
+            return reply
+        return self._get_disk(key, now)
+
+    async def aget(self, payload):
+        """get() for the event loop: a disk tier lookup runs in a thread"""
+        if not self.enabled:
+            return None
+        key = self.key(payload)
+        now = time.time()
+        reply = self._get_memory(key, now)
+        if reply is not None:
+            return reply
+        if not self.path:
+            return self._get_disk(key, now)
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self._stats["expired"] += 1
+        return None
+
+    def _get_disk(self, key, now):
+        """Look a key up in the SQLite tier (counts a miss when it isn't there either)"""
+        if self.path:
+            try:
+                row = self._db().execute(
+                    "SELECT reply, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Response cache read error: %s", e)
+                row = None
+            if row is not None and row[1] > now:
+                self._remember(key, row[1], row[0])
+                self._count("disk_hits")
+                return row[0]
+            if row is not None:
+                self._count("expired")
+
+        self._count("misses")
+        return None
+
+    def set(self, payload, reply):
+        """
+        Store the reply to a request
+
+        Args:
+            payload (dict): Chat completion request
+            reply (str): The model's complete reply
+        """
+        if not self.enabled or not reply:
+            return
+        key, now = self._set_memory(payload, reply)
+        if self.path:
+            self._set_disk(key, reply, now)
+
+    async def aset(self, payload, reply):
+        """set() for the event loop: the disk tier write runs in a thread"""
+        if not self.enabled or not reply:
+            return
+        key, now = self._set_memory(payload, reply)
+        if self.path:
+            await asyncio.to_thread(self._set_disk, key, reply, now)
+
+    def _set_memory(self, payload, reply):
+        key = self.key(payload)
+        now = time.time()
+        self._remember(key, now + self.ttl, reply)
+        self._count("writes")
+        return key, now
+
+    def _set_disk(self, key, reply, now):
+        expires_at = now + self.ttl
+        try:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                       (key, reply, expires_at, now))
+            with self._lock:
+                self._writes_since_trim += 1
+                trim = self._writes_since_trim >= 100
+                if trim:
+                    self._writes_since_trim = 0
+            if trim:
+                self._trim(db, now)
+        except sqlite3.Error as e:
+            logger.warning("Response cache write error: %s", e)
+
+    def _trim(self, db, now):
+        """Drop expired rows and the oldest rows beyond disk_entries"""
+        expired = db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,)).rowcount
+        excess = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.disk_entries
+        evicted = 0
+        if excess > 0:
+            evicted = db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY created_at LIMIT ?)", (excess,)
+            ).rowcount
+        self._count("expired", max(expired, 0))
+        self._count("disk_evictions", max(evicted, 0))
+
+    def clear(self):
+        """Remove every cached reply"""
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            self._db().execute("DELETE FROM responses")
+
+    def stats(self):
+        """
+        Cache statistics for this worker
+
+        Returns:
+            dict: Hit, miss, write, eviction and expiry counters, the hit rate and
+                the number of replies held in memory
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+# Global cache shared by every chat completion call (see http_client.py)
+response_cache = ResponseCache(
+    path=os.getenv('RESPONSE_CACHE_PATH', os.path.join(BASE_DIR, 'response_cache.sqlite3')) or None,
+    memory_entries=int(os.getenv('RESPONSE_CACHE_MEMORY_ENTRIES', '256')),
+    disk_entries=int(os.getenv('RESPONSE_CACHE_DISK_ENTRIES', '10000')),
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', '86400')),
+    enabled=os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('true', 'yes', '1')
+)
@@ -0,0 +1,231 @@
+"""
+Response Formatter Module for Chatbot
+
+This module tidies the Markdown of chat replies: list and heading spacing, pipe
+tables, code fences, links and pros/cons headings, plus an analysis outline for
+long unstructured answers. The rules are compiled once and applied in a single
+pass over the lines, so formatting time grows linearly with the reply (a 100 KB
+reply takes a few milliseconds). Streamed replies are formatted once they are
+complete, since the outline, table and pros/cons rules depend on the whole reply.
+"""
+
+import itertools
+import re
+
+SECTION_HEADING = re.compile(r'#{2,3}\s+\w+')
+LIST_NUMBER = re.compile(r'\d+\.')
+FENCE_TAIL = re.compile(r'```(\w*)\s*$')
+BLANK = re.compile(r'\s*')
+PROS_CONS = re.compile(r'\b(pros|cons|advantages|disadvantages|benefits|drawbacks)\b')
+LIST_HEADING = re.compile(r'(?i)(pros)|(cons)|(advantages)|(disadvantages)|(benefits)|(drawbacks)')
+LINE_LIST_HEADING = re.compile(r'\n(?i:(pros)|(cons)|(advantages)|(disadvantages)|(benefits)|(drawbacks))')
+LIST_HEADING_GAP = re.compile(r'[:\s]*')
+LINK_GAP = re.compile(r'\]\s+\(')
+
+# "advantages" also finds "disadvantages"
+LIST_HEADING_WORDS = ("pros", "cons", "advantages", "benefits", "drawbacks")
+
+# In LIST_HEADING group order
+LIST_HEADINGS = ("### Pros\n\n", "### Cons\n\n", "### Advantages\n\n", "### Disadvantages\n\n",
+                 "### Benefits\n\n", "### Drawbacks\n\n")
+
+OUTLINE_MIN_CHARS = 500
+REASONING_WORDS = ("why", "how", "explain", "analyze", "compare", "evaluate", "reason", "think", "consider")
+
+
+def _outline(text):
+    """Turn paragraphs into introduction, analysis, numbered steps and conclusion"""
+    parts = text.split('\n\n')
+    if len(parts) < 3:
+        return text
+    pieces = [parts[0], "\n\n## Analysis\n\n", parts[1], "\n\n## Step-by-Step Reasoning\n\n"]
+    for step, part in enumerate(parts[2:-1], start=1):
+        stripped = part.strip()
+        if stripped:
+            pieces += (f"### Step {step}: {stripped[:40].split('.')[0]}\n\n", part, "\n\n")
+    pieces += ("## Conclusion\n\n", parts[-1])
+    return "".join(pieces)
+
+
+def _list_item(lines, index):
+    """
+    "1.   item" -> "1. item". A number alone on its line takes the next non-blank
+    line as its item.
+
+    Args:
+        lines (list): Lines of the reply
+        index (int): The line, which starts with a digit
+
+    Returns:
+        tuple: (formatted line, index of the last line it used)
+    """
+    line = lines[index]
+    number = LIST_NUMBER.match(line)
+    if number is None:
+        return line, index
+    number, rest = line[:number.end()], line[number.end():]
+    gap = BLANK.match(rest).end()
+    if gap < len(rest):
+        return (f"{number} {rest[gap:]}" if gap else line), index
+
+    for following in range(index + 1, len(lines)):
+        item = lines[following]
+        gap = BLANK.match(item).end()
+        if gap < len(item):
+            return f"{number} {item[gap:]}", following
+
+    # Only whitespace up to the end: its last non-newline character becomes the item
+    tail = "\n".join(lines[index:])[len(number):]
+    last = len(tail.rstrip('\n')) - 1
+    if last > 0:
+        return f"{number} {tail[last:]}", len(lines) - 1
+    return line, index
+
+
+def _heading(line):
+    """Add the missing space in headings like ##Title"""
+    title = line.lstrip('#')
+    hashes = len(line) - len(title)
+    if hashes <= 6 and len(title) > 1 and not title[0].isspace():
+        return f"{line[:hashes]} {title}"
+    return line
+
+
+def _is_table_row(line):
+    # A pipe after the first two characters and before the last one
+    return not line.startswith('|') and line.find('|', 2, len(line) - 1) != -1
+
+
+def _format_lines(text, tables):
+    """
+    Apply the line rules in order: list item spacing, heading spacing, table
+    separators (if tables) and code fence whitespace
+    """
+    lines = text.split('\n')
+    last = len(lines) - 1
+    formatted = []
+    row = False  # whether the previous line was a table row
+    index = 0
+    while index <= last:
+        line = lines[index]
+        first = line[:1]
+        if first == '#':
+            line = _heading(line)
+        elif first.isdecimal():
+            line, index = _list_item(lines, index)
+
+        separator = None
+        if tables:
+            is_row = '|' in line and _is_table_row(line)
+            if is_row and not row:
+                separator = '|' + '---|' * line.count('|')
+            row = is_row
+
+        if '```' in line:
+            # Only a fence with whitespace after it, or blank lines below it, changes
+            blank_below = separator is None and index + 1 < last and not lines[index + 1].strip()
+            fence = FENCE_TAIL.search(line) if line[-1:].isspace() or blank_below else None
+            if fence and (separator or index < last):
+                line = line[:fence.end(1)]
+                if blank_below:
+                    # The blank lines go too (except a last one with no newline
+                    # after it), though they still ended any table
+                    following = index + 1
+                    while following < last and BLANK.fullmatch(lines[following]):
+                        following += 1
+                    row = False
+                    index = following - 1
+
+        formatted.append(line)
+        if separator:
+            formatted.append(separator)
+        index += 1
+    return "\n".join(formatted)
+
+
+def _list_headings(text):
+    """
+    Make "Pros:", "Cons", "Benefits -" and the like at the start of a line into
+    ### headings. A heading may run straight into another ("Pros: Cons: ..."), but
+    only into a later one in LIST_HEADINGS order unless a newline came between.
+    """
+    pieces = []
+    copied, checked = 0, -1
+    first = LIST_HEADING.match(text)
+    for match in itertools.chain([first] if first else [], LINE_LIST_HEADING.finditer(text)):
+        kind = match.lastindex
+        position = match.start(kind)
+        if position <= checked:
+            continue
+        kind -= 1
+        while True:
+            pieces += (text[copied:position], LIST_HEADINGS[kind])
+            copied = checked = LIST_HEADING_GAP.match(text, match.end()).end()
+            newline = copied > match.end() and text[copied - 1] == '\n'
+            match = LIST_HEADING.match(text, copied)
+            if match is None:
+                break
+            following = match.lastindex - 1
+            if following == kind or (following < kind and not newline):
+                break
+            kind, position = following, copied
+    pieces.append(text[copied:])
+    return "".join(pieces)
+
+
+def _link_spacing(text):
+    """Remove the space in links like [text] (url)"""
+    pieces = []
+    copied = 0
+    close = gap_end = target_end = -1
+    next_paren = -2  # first ')' from some earlier position, -1 once none are left
+    start = text.find('[')
+    while start != -1:
+        if close < start:
+            close = text.find(']', start + 1)
+            if close == -1:
+                break
+            gap_end = BLANK.match(text, close + 1).end()
+            target_end = -1
+            if text.startswith('(', gap_end):
+                if next_paren == -2 or -1 < next_paren <= gap_end:
+                    next_paren = text.find(')', gap_end + 1)
+                target_end = next_paren
+        if close > start + 1 and target_end > gap_end + 1:
+            if gap_end > close + 1:
+                pieces.append(text[copied:close + 1])
+                copied = gap_end
+            start = text.find('[', target_end + 1)
+        else:
+            start = text.find('[', start + 1)
+    pieces.append(text[copied:])
+    return "".join(pieces)
+
+
+def enhance_response_formatting(text):
+    """
+    Enhance the response text with better formatting for certain content types
+    and improve reasoning structure
+
+    Args:
+        text (str): Reply from the model
+
+    Returns:
+        str: The formatted reply
+    """
+    # Add reasoning structure if it appears to be a complex answer without structure
+    # (the substring checks skip regex scans of the whole reply that can't match)
+    if len(text) > OUTLINE_MIN_CHARS and not ('##' in text and SECTION_HEADING.search(text)):
+        lowered = text.lower()
+        if any(word in lowered for word in REASONING_WORDS):
+            text = _outline(text)
+
+    # Tables that already have a separator are left alone
+    text = _format_lines(text, tables='---' not in text)
+
+    lowered = text.lower()
+    if any(word in lowered for word in LIST_HEADING_WORDS) and PROS_CONS.search(lowered):
+        text = _list_headings(text)
+    if ']' in text and LINK_GAP.search(text):
+        text = _link_spacing(text)
+    return text
@@ -0,0 +1,307 @@
+"""
+Semantic Cache Module for Chatbot
+
+This module reuses LLM replies for paraphrased questions ("how do I improve soil"
+/ "ways to improve my soil"), which the exact-match response cache misses.
+Queries become sparse vectors of hashed, lightly stemmed words and word bigrams.
+Cached entries are held in fixed-width NumPy arrays with an inverted index, so a
+lookup only scores the entries that share a term with the query and stays well
+under a millisecond at 100k entries.
+"""
+
+import math
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+from dotenv import load_dotenv
+
+from token_budget import STOP_WORDS, WORD_PATTERN, stem
+
+load_dotenv()
+
+# References to earlier turns: the reply depends on the history, not just the query
+CONTEXT_WORDS = frozenset("""
+it its it's this these those they them above previous again same else another
+""".split())
+
+
+class SemanticCache:
+    def __init__(self, max_entries=100000, threshold=0.85, ttl=86400, features_per_entry=16,
+                 dim=2 ** 18, min_terms=2, max_query_chars=500, max_candidates=2048, enabled=True):
+        """
+        Initialize the cache. Storage grows by doubling up to max_entries; after
+        that each new reply replaces the oldest one.
+
+        Args:
+            max_entries (int): Replies kept across all partitions
+            threshold (float): Minimum cosine similarity for a cached reply to be reused
+            ttl (int): Seconds a reply stays valid
+            features_per_entry (int): Terms kept per query (the highest-weighted ones)
+            dim (int): Size of the hashed feature space
+            min_terms (int): Queries with fewer content words are neither cached nor looked up
+            max_query_chars (int): Longer inputs (pasted documents) bypass the cache
+            max_candidates (int): Upper bound on entries scored per lookup; terms
+                shared by more entries than this are too common to narrow the search
+            enabled (bool): Set to False to bypass the cache entirely
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.features_per_entry = features_per_entry
+        self.dim = dim
+        self.min_terms = min_terms
+        self.max_query_chars = max_query_chars
+        self.max_candidates = max_candidates
+        self.enabled = enabled
+        self.rebuild_every = max(1024, max_entries // 8)
+
+        self._lock = threading.Lock()
+        self._capacity = 0
+        self._size = 0
+        self._next = 0  # Slot the next entry goes to once the cache is full
+        self._features = np.zeros((0, features_per_entry), dtype=np.int32)
+        self._weights = np.zeros((0, features_per_entry), dtype=np.float32)
+        self._partitions = np.zeros(0, dtype=np.int16)
+        self._expires = np.zeros(0, dtype=np.float64)
+        self._replies = []
+        self._partition_ids = {}
+        self._query = np.zeros(dim, dtype=np.float32)  # Dense scratch copy of the query vector
+
+        # Inverted index: (feature, row) pairs sorted by feature, rebuilt every
+        # rebuild_every writes; newer rows are in _recent. Rows overwritten since
+        # the rebuild may still be listed under old features, which only makes
+        # them candidates - they are scored on what they hold now.
+        self._index_features = np.zeros(0, dtype=np.int32)
+        self._index_rows = np.zeros(0, dtype=np.int32)
+        self._recent = {}
+        self._writes_since_rebuild = 0
+
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "skipped": 0,
+                       "writes": 0, "evictions": 0, "seconds": 0.0}
+
+    @staticmethod
+    def partition(style, educational=False, deep_reasoning=False):
+        """
+        Partition key for a reply, so answers written for one style or mode are
+        never served for another
+
+        Args:
+            style (str): Response style (key of app.STYLES)
+            educational (bool): Educational response mode
+            deep_reasoning (bool): Deep reasoning mode
+
+        Returns:
+            str: Partition key
+        """
+        modes = [mode for mode, on in (("educational", educational), ("deep", deep_reasoning)) if on]
+        return "/".join([style] + (modes or ["standard"]))
+
+    def vectorize(self, query, partition):
+        """
+        Hashed, L2-normalized term vector of a query
+
+        Args:
+            query (str): User message
+            partition (str): Partition key from partition()
+
+        Returns:
+            tuple: (features, weights) as NumPy arrays, or None when the query is
+                too short, too long or refers to earlier turns
+        """
+        if len(query) > self.max_query_chars:
+            return None
+        words = WORD_PATTERN.findall(query.lower())
+        if any(word in CONTEXT_WORDS for word in words):
+            return None
+        terms = [stem(word) for word in words if word not in STOP_WORDS]
+        if len(set(terms)) < self.min_terms:
+            return None
+
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for first, second in zip(terms, terms[1:]):
+            bigram = first + " " + second
+            counts[bigram] = counts.get(bigram, 0) + 1
+
+        # Terms are hashed together with the partition, so partitions share no features
+        mask = self.dim - 1
+        prefix = partition + "\x1f"
+        features = {}
+        for term, count in counts.items():
+            feature = zlib.crc32((prefix + term).encode('utf-8')) & mask
+            features[feature] = features.get(feature, 0.0) + 1.0 + math.log(count)
+
+        ranked = sorted(features.items(), key=lambda item: -item[1])[:self.features_per_entry]
+        feature_ids = np.array([feature for feature, _ in ranked], dtype=np.int32)
+        weights = np.array([weight for _, weight in ranked], dtype=np.float32)
+        weights /= np.linalg.norm(weights)
+        return feature_ids, weights
+
+    def _grow(self):
+        """Double the storage, up to max_entries rows"""
+        capacity = min(self.max_entries, max(1024, self._capacity * 2))
+        extra = capacity - self._capacity
+        self._features = np.concatenate([self._features, np.zeros((extra, self.features_per_entry), np.int32)])
+        self._weights = np.concatenate([self._weights, np.zeros((extra, self.features_per_entry), np.float32)])
+        self._partitions = np.concatenate([self._partitions, np.zeros(extra, np.int16)])
+        self._expires = np.concatenate([self._expires, np.zeros(extra, np.float64)])
+        self._replies.extend([None] * extra)
+        self._capacity = capacity
+
+    def _rebuild_index(self):
+        width = self.features_per_entry
+        features = self._features[:self._size].ravel()
+        rows = np.repeat(np.arange(self._size, dtype=np.int32), width)
+        used = self._weights[:self._size].ravel() > 0
+        features, rows = features[used], rows[used]
+        order = np.argsort(features, kind='stable')
+        self._index_features = features[order]
+        self._index_rows = rows[order]
+        self._recent = {}
+        self._writes_since_rebuild = 0
+
+    def _candidates(self, features):
+        """Rows sharing a feature with the query, rarest features first"""
+        starts = np.searchsorted(self._index_features, features, side='left')
+        ends = np.searchsorted(self._index_features, features, side='right')
+        postings = []
+        for feature, start, end in zip(features.tolist(), starts.tolist(), ends.tolist()):
+            recent = self._recent.get(feature, ())
+            if end > start or recent:
+                postings.append((end - start + len(recent), start, end, recent))
+        postings.sort(key=lambda posting: posting[0])
+
+        parts, total = [], 0
+        for count, start, end, recent in postings:
+            if total + count > self.max_candidates and parts:
+                break
+            if end > start:
+                parts.append(self._index_rows[start:end])
+            if recent:
+                parts.append(np.array(recent, dtype=np.int32))
+            total += count
+        if not parts:
+            return None
+        return np.concatenate(parts)[:self.max_candidates]
+
+    def get(self, query, partition):
+        """
+        Look up the reply to the closest cached query in the partition
+
+        Args:
+            query (str): User message
+            partition (str): Partition key from partition()
+
+        Returns:
+            tuple: (reply, similarity), or None when nothing is similar enough
+        """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        vector = self.vectorize(query, partition)
+        with self._lock:
+            if vector is None:
+                self._stats["skipped"] += 1
+                return None
+            features, weights = vector
+            partition_id = self._partition_ids.get(partition)
+            candidates = self._candidates(features) if partition_id is not None else None
+
+            result = None
+            if candidates is not None:
+                # Cosine similarity of every candidate at once (vectors are unit length)
+                self._query[features] = weights
+                candidate_features = self._features.take(candidates, axis=0)
+                candidate_weights = self._weights.take(candidates, axis=0)
+                scores = np.einsum('ij,ij->i', candidate_weights, self._query.take(candidate_features))
+                self._query[features] = 0.0
+                stale = (self._partitions[candidates] != partition_id) | (self._expires[candidates] <= time.time())
+                scores[stale] = 0.0
+                best = int(scores.argmax())
+                if scores[best] >= self.threshold:
+                    result = (self._replies[candidates[best]], float(scores[best]))
+
+            self._stats["lookups"] += 1
+            self._stats["hits" if result else "misses"] += 1
+            self._stats["seconds"] += time.perf_counter() - start
+        return result
+
+    def set(self, query, partition, reply):
+        """
+        Store the reply to a query
+
+        Args:
+            query (str): User message
+            partition (str): Partition key from partition()
+            reply (str): The reply to reuse for similar queries
+        """
+        if not self.enabled or not reply:
+            return
+        vector = self.vectorize(query, partition)
+        if vector is None:
+            return
+        features, weights = vector
+        with self._lock:
+            if self._size < self.max_entries:
+                if self._size == self._capacity:
+                    self._grow()
+                row = self._size
+                self._size += 1
+            else:
+                row = self._next
+                self._next = (self._next + 1) % self.max_entries
+                self._stats["evictions"] += 1
+
+            partition_id = self._partition_ids.setdefault(partition, len(self._partition_ids))
+            self._features[row] = 0
+            self._weights[row] = 0.0
+            self._features[row, :len(features)] = features
+            self._weights[row, :len(weights)] = weights
+            self._partitions[row] = partition_id
+            self._expires[row] = time.time() + self.ttl
+            self._replies[row] = reply
+            self._stats["writes"] += 1
+
+            for feature in features.tolist():
+                self._recent.setdefault(feature, []).append(row)
+            self._writes_since_rebuild += 1
+            if self._writes_since_rebuild >= self.rebuild_every:
+                self._rebuild_index()
+
+    def clear(self):
+        """Remove every cached reply"""
+        with self._lock:
+            self._size = self._next = 0
+            self._replies = [None] * self._capacity
+            self._weights[:] = 0.0
+            self._rebuild_index()
+
+    def stats(self):
+        """
+        Cache statistics for this worker
+
+        Returns:
+            dict: Lookup, hit, miss, write and eviction counters, lookups skipped
+                (queries too short, too long or referring to earlier turns), the
+                hit rate, the number of entries and mean lookup latency in us
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+        seconds = stats.pop("seconds")
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["avg_lookup_us"] = seconds / stats["lookups"] * 1e6 if stats["lookups"] else 0.0
+        return stats
+
+
+# Global instance for use across the application
+semantic_cache = SemanticCache(
+    max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '100000')),
+    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85')),
+    ttl=int(os.getenv('SEMANTIC_CACHE_TTL', '86400')),
+    enabled=os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() in ('true', 'yes', '1')
+)
@@ -0,0 +1,258 @@
+"""
+Structured Logging Module for Chatbot
+
+This module routes the chatbot's log records through an in-memory queue to a
+background writer thread, so logging from a request only formats the message
+and enqueues it; the request never waits on stdout. Records are written one
+JSON object per line (LOG_FORMAT=text for a human-readable line) with their
+level, logger, message, the id of the request they belong to, the milliseconds
+since that request started and any fields passed in `extra`. If the writer
+falls behind and the queue fills up, records are dropped and counted instead of
+blocking. DEBUG records are sampled per request (LOG_DEBUG_SAMPLE_RATE), so a
+sampled request keeps all of its debug lines.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The request being served by this thread (Flask) or task (Quart)
+_request_id = contextvars.ContextVar('request_id', default=None)
+_request_start = contextvars.ContextVar('request_start', default=None)
+
+# Request ids taken from an X-Request-ID header must look like one
+REQUEST_ID = re.compile(r'[\w.:-]{1,64}')
+
+# HTTP client libraries log every call; /metrics counts those already
+QUIET_LOGGERS = ('httpx', 'httpcore', 'urllib3')
+
+# Attributes every LogRecord has; any other attribute came from `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'taskName', 'request_id', 'elapsed_ms'}
+
+
+def begin_request(request_id=None):
+    """
+    Tag the log records of the current request with an id and its start time
+
+    Args:
+        request_id (str): Id given by the client or a proxy (X-Request-ID);
+            a new one is made if it is missing or malformed
+
+    Returns:
+        str: The request id
+    """
+    if not request_id or not REQUEST_ID.fullmatch(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    _request_start.set(time.perf_counter())
+    return request_id
+
+
+def end_request():
+    """Stop tagging log records (a Flask thread serves other requests next)"""
+    _request_id.set(None)
+    _request_start.set(None)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the request id and elapsed time to records, in the thread that logs
+    them, and samples DEBUG records per request
+    """
+
+    def __init__(self, debug_sample_rate=1.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        request_id = record.request_id = _request_id.get()
+        start = _request_start.get()
+        record.elapsed_ms = round((time.perf_counter() - start) * 1000, 2) if start is not None else None
+        if record.levelno > logging.DEBUG or self.debug_sample_rate >= 1:
+            return True
+        if request_id is not None:
+            # The same decision for every debug line of a request
+            keep = zlib.crc32(request_id.encode()) < self.debug_sample_rate * 2 ** 32
+        else:
+            keep = random.random() < self.debug_sample_rate
+        if not keep:
+            self.sampled_out += 1
+        return keep
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full instead of waiting"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only the message and traceback are rendered here (their arguments may
+        # change once the request moves on); JSON encoding is the writer's job
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Writer(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits (a while) for room in a full queue"""
+
+    def start(self):
+        super().start()
+        self._thread.name = "log-writer"
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel, timeout=5)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+            entry["elapsed_ms"] = record.elapsed_ms
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """A readable line: time, level, request, logger, message and key=value fields"""
+
+    def format(self, record):
+        created = datetime.fromtimestamp(record.created).strftime('%H:%M:%S.%f')[:-3]
+        request_id = getattr(record, 'request_id', None)
+        context = f" [{request_id} +{record.elapsed_ms:.0f}ms]" if request_id is not None else ""
+        fields = "".join(f" {key}={value}" for key, value in vars(record).items()
+                         if key not in _RECORD_ATTRIBUTES and value is not None)
+        line = f"{created} {record.levelname:<7}{context} {record.name}: {record.getMessage()}{fields}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class LogPipeline:
+    """The root logger's queue handler and the writer thread draining it"""
+
+    def __init__(self, level='INFO', fmt='json', queue_size=10000, debug_sample_rate=1.0, stream=None):
+        """
+        Args:
+            level (str): Lowest level logged (DEBUG, INFO, WARNING, ...)
+            fmt (str): 'json' or 'text'
+            queue_size (int): Records held for the writer before new ones are dropped
+            debug_sample_rate (float): Fraction of requests whose DEBUG records are kept
+            stream: Where the writer thread writes (default: stdout)
+        """
+        self.level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        if not isinstance(self.level, int):
+            self.level = logging.INFO
+        self.formatter = TextFormatter() if fmt == 'text' else JsonFormatter()
+        self.queue_size = queue_size
+        self.stream = stream
+        self.context = RequestContextFilter(debug_sample_rate)
+        self.handler = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def install(self):
+        """Send the root logger's records through the queue (once per process)"""
+        with self._lock:
+            if self.handler is not None:
+                return
+            self.handler = NonBlockingQueueHandler(queue.Queue(self.queue_size))
+            self.handler.addFilter(self.context)
+            root = logging.getLogger()
+            root.addHandler(self.handler)
+            root.setLevel(self.level)
+            for name in QUIET_LOGGERS:
+                logging.getLogger(name).setLevel(max(self.level, logging.WARNING))
+            self._start_writer()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # The writer thread doesn't survive a fork (gunicorn --preload); each
+            # worker gets a fresh queue and writer
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_writer(self):
+        writer = logging.StreamHandler(self.stream or sys.stdout)
+        writer.setFormatter(self.formatter)
+        self._listener = _Writer(self.handler.queue, writer)
+        self._listener.start()
+
+    def _after_fork(self):
+        self.handler.queue = queue.Queue(self.queue_size)
+        self._lock = threading.Lock()
+        self._start_writer()
+
+    def stop(self):
+        """Write out the queued records and stop the writer thread"""
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        try:
+            listener.stop()
+        except queue.Full:
+            pass  # The writer is stuck; it is a daemon thread, so exit without it
+
+    def stats(self):
+        """
+        Returns:
+            dict: queued, dropped (queue full) and sampled_out (DEBUG sampling) record counts
+        """
+        return {
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped": self.handler.dropped if self.handler else 0,
+            "sampled_out": self.context.sampled_out,
+        }
+
+
+# Global log pipeline, installed by app.py
+log_pipeline = LogPipeline(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    fmt=os.getenv('LOG_FORMAT', 'json').lower(),
+    queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+    debug_sample_rate=float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.1'))
+)
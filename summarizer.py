@@ -0,0 +1,194 @@
+"""
+Summarizer Module for Chatbot
+
+This module folds older conversation turns into a short running summary, so
+long sessions send summary + recent turns instead of their whole history.
+ExtractiveSummarizer picks the most informative sentences locally (no network,
+well under a millisecond per turn); LLMSummarizer rewrites the summary with a
+small model in a background thread, off the request path.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from token_budget import CODE_BLOCK_PATTERN, STOP_WORDS, WORD_PATTERN, elide_code, estimate_tokens, stem
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+[.!?]*")
+MARKDOWN_PATTERN = re.compile(r"[#*_`>|]+")
+
+ROLE_LABELS = {'user': "User", 'bot': "Bot"}
+
+
+def _sentences(role, content, max_chars):
+    """Summary candidates from one message: its prose sentences, labelled with the speaker"""
+    text = MARKDOWN_PATTERN.sub(" ", CODE_BLOCK_PATTERN.sub(" ", content))
+    label = ROLE_LABELS.get(role, role.title())
+    for sentence in SENTENCE_PATTERN.findall(text):
+        sentence = " ".join(sentence.split())
+        if len(sentence.split()) >= 3:
+            yield f"{label}: {sentence[:max_chars]}"
+
+
+class ExtractiveSummarizer:
+    def __init__(self, max_tokens=300, max_sentence_chars=240, carry_weight=0.8, user_weight=1.5,
+                 redundancy=0.6):
+        """
+        Initialize the summarizer
+
+        Args:
+            max_tokens (int): Estimated token limit of the summary
+            max_sentence_chars (int): Longer sentences are cut
+            carry_weight (float): Score multiplier for sentences already in the
+                summary, so older details slowly give way to newer ones
+            user_weight (float): Score multiplier for what the user said, which
+                names the topics better than the replies do
+            redundancy (float): Word overlap (Jaccard) above which a sentence
+                counts as a repeat of one already in the summary
+        """
+        self.max_tokens = max_tokens
+        self.max_sentence_chars = max_sentence_chars
+        self.carry_weight = carry_weight
+        self.user_weight = user_weight
+        self.redundancy = redundancy
+
+    def fold(self, summary, messages):
+        """
+        Merge messages into a summary
+
+        Args:
+            summary (str): Current summary ("" for none): "- Speaker: sentence"
+                lines from an earlier fold, or prose from LLMSummarizer
+            messages (list): (role, content) tuples, oldest first
+
+        Returns:
+            str: The new summary
+        """
+        candidates = []
+        for line in summary.split("\n"):
+            if line.startswith("- "):
+                candidates.append((line[2:], self.carry_weight))
+            else:  # Prose from LLMSummarizer
+                candidates.extend((" ".join(sentence.split()), self.carry_weight)
+                                  for sentence in SENTENCE_PATTERN.findall(line) if len(sentence.split()) >= 3)
+        for role, content in messages:
+            weight = self.user_weight if role == 'user' else 1.0
+            candidates.extend((sentence, weight) for sentence in _sentences(role, content, self.max_sentence_chars))
+        if not candidates:
+            return summary
+
+        # Sentences score by how often their words occur across everything being
+        # summarized, normalized so long sentences don't win on length alone
+        terms = []
+        frequency = {}
+        for sentence, _ in candidates:
+            words = {stem(word) for word in WORD_PATTERN.findall(sentence.lower())
+                     if word not in STOP_WORDS and word not in ('user', 'bot')}
+            terms.append(words)
+            for word in words:
+                frequency[word] = frequency.get(word, 0) + 1
+        scored = []
+        for position, ((sentence, weight), words) in enumerate(zip(candidates, terms)):
+            score = weight * sum(frequency[word] for word in words) / math.sqrt(len(words) + 1)
+            scored.append((score, position, sentence))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+
+        chosen, tokens, covered = [], 0, []
+        for _, position, sentence in scored:
+            cost = estimate_tokens(sentence) + 1
+            if tokens + cost > self.max_tokens:
+                continue
+            # Skip sentences that mostly repeat one already chosen
+            words = terms[position]
+            if any(len(words & other) > self.redundancy * len(words | other) for other in covered):
+                continue
+            chosen.append((position, sentence))
+            covered.append(words)
+            tokens += cost
+        chosen.sort()
+        return "\n".join(f"- {sentence}" for _, sentence in chosen)
+
+
+class LLMSummarizer:
+    def __init__(self, model='llama3-8b-8192', max_words=150, timeout=(3.05, 30), http=None, max_workers=2):
+        """
+        Initialize the summarizer. The thread pool and HTTP client are set up on first use.
+
+        Args:
+            model (str): Chat model used for summaries
+            max_words (int): Length limit given to the model
+            timeout (float or tuple): (connect, read) timeout of the API call
+            http: Client with chat_completion(); defaults to the shared pooled client
+            max_workers (int): Summaries generated at once
+        """
+        self.model = model
+        self.max_words = max_words
+        self.timeout = timeout
+        self.http = http
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def summarize(self, summary, messages):
+        """
+        Merge messages into a summary with the LLM (blocking)
+
+        Args:
+            summary (str): Current summary ("" for none)
+            messages (list): (role, content) tuples, oldest first
+
+        Returns:
+            str: The new summary
+        """
+        if self.http is None:
+            from http_client import client
+            self.http = client
+        turns = "\n\n".join(f"{ROLE_LABELS.get(role, role.title())}: {elide_code(content)}"
+                            for role, content in messages)
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": (
+                    "You maintain a running summary of a conversation between a user and an assistant. "
+                    "Merge the new turns into the summary. Keep names, numbers, decisions and open "
+                    f"questions. Reply with the summary only, at most {self.max_words} words.")},
+                {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{turns}"}
+            ],
+            "temperature": 0.2
+        }
+        return self.http.chat_completion(payload, timeout=self.timeout, cache=False).strip()
+
+    def submit(self, summary, messages, callback):
+        """
+        Summarize in a background thread and pass the new summary to callback
+        (None if the call failed, which is logged)
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summarizer")
+            executor = self._executor
+
+        def run():
+            try:
+                result = self.summarize(summary, messages)
+            except Exception as e:
+                logger.warning("Summary error: %s", e)
+                result = None
+            callback(result)
+
+        executor.submit(run)
+
+
+def create_llm_summarizer():
+    """Build the LLM summarizer if MEMORY_LLM_SUMMARY is switched on"""
+    if os.getenv('MEMORY_LLM_SUMMARY', 'false').lower() not in ('true', 'yes', '1'):
+        return None
+    return LLMSummarizer(model=os.getenv('SUMMARY_MODEL', 'llama3-8b-8192'))
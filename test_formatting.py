@@ -0,0 +1,26 @@
+"""
+Reply formatting against the golden corpus (formatting_golden.json)
+
+Each entry is a model reply and the formatted text users were shown for it.
+A change to response_formatter.py that alters any of them fails here.
+
+Run with:
+    python -m pytest test_formatting.py
+"""
+
+import json
+import os
+
+import pytest
+
+from response_formatter import enhance_response_formatting
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'formatting_golden.json'),
+          encoding='utf-8') as f:
+    GOLDEN = json.load(f)
+
+
+@pytest.mark.parametrize("item", GOLDEN, ids=range(len(GOLDEN)))
+def test_golden_corpus(item):
+    assert enhance_response_formatting(item["input"]) == item["output"]
+
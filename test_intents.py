@@ -0,0 +1,31 @@
+"""
+Intent routing: which messages are answered locally and which go to the LLM
+
+Run with:
+    python -m pytest test_intents.py
+"""
+
+import warnings
+
+from intent_classifier import IntentClassifier
+from local_knowledge import local_index
+
+
+def test_placeholder_intent_goes_to_llm():
+    # The math intent's only reply is a placeholder, so arithmetic is the LLM's job
+    tag, probability, _ = IntentClassifier().classify("what is 5 plus 3")
+    assert tag == 'math' and probability >= 0.4
+    assert local_index.responses_for(tag) == []
+    assert local_index.get_response("What is 2 plus 2?") is None
+
+
+def test_intents_with_real_replies_stay_local():
+    assert local_index.responses_for('greeting')
+    assert local_index.get_response("Hi") is not None
+
+
+def test_model_from_another_scikit_learn_is_retrained():
+    # Unpickling a model saved by another version warns; it is retrained instead
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert IntentClassifier().classify("what is 5 plus 3")[0] == 'math'
@@ -0,0 +1,102 @@
+"""
+Response cache: memory and disk tiers, expiry, and which streamed replies get cached
+
+Run with:
+    python -m pytest test_response_cache.py
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+import response_cache as response_cache_module
+from response_cache import ResponseCache
+
+PAYLOAD = {"model": "m", "temperature": 0.2, "messages": [{"role": "user", "content": "how do I plant maize"}]}
+OTHER = {**PAYLOAD, "messages": [{"role": "user", "content": "how do I plant beans"}]}
+
+
+def test_memory_and_disk_hits(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"), memory_entries=1)
+    assert cache.get(PAYLOAD) is None
+    cache.set(PAYLOAD, "In the long rains")
+    cache.set(OTHER, "After the maize")  # Pushes PAYLOAD out of the memory tier
+    assert cache.get(OTHER) == "After the maize"
+    assert cache.get(PAYLOAD) == "In the long rains"
+    # Another worker sharing the file
+    assert ResponseCache(path=str(tmp_path / "cache.sqlite3")).get(PAYLOAD) == "In the long rains"
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_key_ignores_fields_that_do_not_change_the_reply():
+    cache = ResponseCache()
+    cache.set(PAYLOAD, "In the long rains")
+    assert cache.get({**PAYLOAD, "stream": True}) == "In the long rains"
+    assert cache.get({**PAYLOAD, "temperature": 0.9}) is None
+
+
+def test_entries_expire(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache_module.time, "time", lambda: now[0])
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache.set(PAYLOAD, "In the long rains")
+    now[0] += 59
+    assert cache.get(PAYLOAD) == "In the long rains"
+    now[0] += 2
+    assert cache.get(PAYLOAD) is None
+    assert cache.stats()["expired"] == 2  # Memory and disk copies
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """Streams one delta; /complete/ ends the stream properly, /truncated/ just closes"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk = {"choices": [{"index": 0, "delta": {"content": "Plant at the"}, "finish_reason": None}]}
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        if self.path.startswith("/complete/"):
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stream_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache()
+    monkeypatch.setattr(http_client, "response_cache", cache)
+    return cache
+
+
+@pytest.mark.parametrize("ending, cached", [("complete", "Plant at the"), ("truncated", None)])
+def test_only_complete_streams_are_cached(stream_server, cache, monkeypatch, ending, cached):
+    monkeypatch.setattr(http_client, "GROQ_API_BASE", f"{stream_server}/{ending}")
+    client = http_client.HTTPClient(max_retries=0)
+    assert list(client.stream_chat_completion(PAYLOAD)) == ["Plant at the"]
+    assert cache.get(PAYLOAD) == cached
+
+    async def stream():
+        async_client = http_client.AsyncHTTPClient(max_retries=0)
+        try:
+            return [delta async for delta in async_client.stream_chat_completion(OTHER)]
+        finally:
+            await async_client.aclose()
+
+    assert asyncio.run(stream()) == ["Plant at the"]
+    assert cache.get(OTHER) == cached
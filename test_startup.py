@@ -0,0 +1,34 @@
+"""
+Cold start budget for app:app
+
+A gunicorn worker imports app before it serves its first request. These tests
+import it in fresh interpreters and fail when that takes longer than
+STARTUP_BUDGET seconds or loads a dependency that should wait for first use.
+
+Run with:
+    python -m pytest test_startup.py
+"""
+
+import os
+
+import pytest
+
+from benchmark import startup_profile
+
+# Seconds a cold `import app` may take (median of three runs); it took about 0.6s when this was set
+STARTUP_BUDGET = float(os.getenv('STARTUP_BUDGET', '1.0'))
+
+
+@pytest.fixture(scope="module")
+def profile():
+    return startup_profile("app", runs=3)
+
+
+def test_cold_start_within_budget(profile):
+    assert profile["seconds"] < STARTUP_BUDGET, (
+        f"import app took {profile['seconds']:.2f}s (budget {STARTUP_BUDGET:g}s); "
+        f"slowest packages: {profile['packages'][:5]}")
+
+
+def test_optional_dependencies_load_on_first_use(profile):
+    assert profile["lazy_loaded"] == []
@@ -0,0 +1,106 @@
+"""
+Weather lookups against the fake OpenWeatherMap server (fake_upstream.py)
+
+Run with:
+    python -m pytest test_weather.py
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from fake_upstream import WEATHER_PATH, FakeUpstream, serve
+from http_client import AsyncHTTPClient
+from weather_service import WeatherError, WeatherService
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    fake = FakeUpstream(weather_latency="fixed:200", seed=1)
+    server = serve(fake, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fake.url = f"http://127.0.0.1:{server.server_address[1]}{WEATHER_PATH}"
+    yield fake
+    server.shutdown()
+
+
+def service(upstream, **kwargs):
+    return WeatherService(api_url=upstream.url, api_key="test", async_http=AsyncHTTPClient(max_retries=0),
+                          **kwargs)
+
+
+def run(weather, lookups):
+    async def main():
+        try:
+            return await lookups()
+        finally:
+            await weather.async_http.aclose()
+    return asyncio.run(main())
+
+
+def test_concurrent_lookups_share_one_upstream_call(upstream):
+    weather = service(upstream)
+
+    async def lookups():
+        return await asyncio.gather(*[weather.areport("Nakuru") for _ in range(10)])
+
+    reports = run(weather, lookups)
+    assert len(set(reports)) == 1 and reports[0].startswith("📍 Nakuru")
+    assert weather.stats()["upstream_calls"] == 1
+    assert weather.stats()["coalesced"] == 9
+
+
+def test_cancelled_lookup_does_not_cancel_the_others(upstream):
+    # The first lookup starts the shared fetch; its client goes away mid-call
+    weather = service(upstream)
+
+    async def lookups():
+        leader = asyncio.create_task(weather.aget("Kisumu"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(weather.aget("Kisumu"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        data = await waiter
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return data
+
+    assert run(weather, lookups)["name"] == "Kisumu"
+    assert weather.stats()["upstream_calls"] == 1
+
+
+def test_unknown_location_is_reported_not_cached(upstream):
+    weather = service(upstream)
+
+    async def lookups():
+        return await weather.areport("nowhere")
+
+    assert run(weather, lookups) == "Couldn't fetch weather data"
+    assert weather.stats()["size"] == 0
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class _IncompleteClient:
+    """Answers 200 with 'main' but without the wind the report shows"""
+
+    async def get(self, url, **kwargs):
+        return _Response({"main": {"temp": 20, "feels_like": 19, "humidity": 50},
+                          "weather": [{"description": "clear sky"}]})
+
+
+def test_incomplete_response_is_an_error_and_not_cached():
+    weather = WeatherService(api_key="test", async_http=_IncompleteClient())
+    with pytest.raises(WeatherError):
+        asyncio.run(weather.aget("Eldoret"))
+    assert asyncio.run(weather.areport("Eldoret")) == "Couldn't fetch weather data"
+    assert weather.stats()["size"] == 0
@@ -0,0 +1,76 @@
+"""
+Token Budget Module for Chatbot
+
+This module estimates LLM token counts locally, without a tokenizer, and
+shortens code blocks, for fitting conversation history and prompts into the
+model's context window. It also holds the word matching (stop words and a
+light stemmer) shared by the semantic cache and the summarizer.
+"""
+
+import re
+
+# Words, numbers and single punctuation marks; a rough stand-in for BPE tokens
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+CODE_BLOCK_PATTERN = re.compile(r"```([^\n`]*)\n(.*?)```", re.DOTALL)
+
+# Lowercase words, for matching texts by what they are about
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Words that frame a question without saying what it is about
+STOP_WORDS = frozenset("""
+a an and are as at be been but by can could did do does for from get got had has
+have how i i'm if in into is me my of on or our should so than the their there
+to was we what when where which who why will with would you your
+way ways tip tips method methods step steps guide please tell explain help need
+want know best good some any about
+""".split())
+
+SUFFIXES = ('ing', 'ed', 'es', 's', 'e')
+
+
+def stem(word):
+    """Strip one common suffix so 'improve', 'improved' and 'improving' match"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in a text without a tokenizer
+
+    Args:
+        text (str): Any text
+
+    Returns:
+        int: Roughly one token per word or punctuation mark, more for long words
+    """
+    pieces = TOKEN_PATTERN.findall(text)
+    # Long words and identifiers split into several tokens (about 4 characters each)
+    return len(pieces) + sum(len(piece) // 6 for piece in pieces if len(piece) > 6)
+
+
+def elide_code(text, keep_lines=3, min_lines=8):
+    """
+    Shorten fenced code blocks to their first lines
+
+    Args:
+        text (str): Message text
+        keep_lines (int): Lines of each block to keep
+        min_lines (int): Blocks with fewer lines are left alone
+
+    Returns:
+        str: The text with long code blocks cut down, or the text itself if it has none
+    """
+    if '```' not in text:
+        return text
+
+    def shorten(match):
+        lines = match.group(2).rstrip('\n').split('\n')
+        if len(lines) < min_lines:
+            return match.group(0)
+        kept = '\n'.join(lines[:keep_lines])
+        return f"```{match.group(1)}\n{kept}\n... ({len(lines) - keep_lines} more lines omitted)\n```"
+
+    return CODE_BLOCK_PATTERN.sub(shorten, text)
@@ -1,37 +1,45 @@
 import json
-import random
+import os
 import pickle
-import numpy as np
 import sys
 
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import make_pipeline
 
-with open('intents.json') as file:
-    data = json.load(file)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INTENTS_PATH = os.path.join(BASE_DIR, 'intents.json')
+MODEL_PATH = os.path.join(BASE_DIR, 'chatbot_model.pkl')
 
-X, y = [], []
 
-for intent in data['intents']:
-    for pattern in intent['patterns']:
-        X.append(pattern)
-        y.append(intent['tag'])
+def build_model(intents_path=INTENTS_PATH):
+    """
+    Train the intent model on the patterns of intents.json
 
-model = make_pipeline(CountVectorizer(), MultinomialNB())
-model.fit(X, y)
+    Returns:
+        Pipeline: CountVectorizer + MultinomialNB
+    """
+    with open(intents_path) as file:
+        data = json.load(file)
 
-with open('chatbot_model.pkl', 'wb') as f:
-    pickle.dump(model, f)
+    X, y = [], []
 
-print("Model trained and saved as chatbot_model.pkl")
+    for intent in data['intents']:
+        for pattern in intent['patterns']:
+            X.append(pattern)
+            y.append(intent['tag'])
 
-# Added code to allow running the script from the command line
+    model = make_pipeline(CountVectorizer(), MultinomialNB())
+    model.fit(X, y)
+    return model
+
+
+# Run from the command line (and at image build time, so the pickle matches
+# the installed scikit-learn)
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "train":
-        model.fit(X, y)
-        with open('chatbot_model.pkl', 'wb') as f:
-            pickle.dump(model, f)
-        print("Model retrained and saved as chatbot_model.pkl")
+        with open(MODEL_PATH, 'wb') as f:
+            pickle.dump(build_model(), f)
+        print("Model trained and saved as chatbot_model.pkl")
     else:
         print("Usage: python train_bot.py train")
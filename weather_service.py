@@ -0,0 +1,434 @@
+"""
+Weather Service Module for Chatbot
+
+This module answers weather questions from OpenWeatherMap through a TTL cache
+keyed on the normalized location, so "Nairobi", " nairobi " and "NAIROBI" share
+one entry. Concurrent lookups for a location share a single upstream call,
+locations that keep being asked about are refreshed in the background before
+they expire, and get_many looks up many locations at once. The async lookups
+(aget, areport) do the same on the event loop with the async HTTP client.
+Point WEATHER_API_URL at a local fake server to test without the real API.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from http_client import client as http_client, async_client
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'http://api.openweathermap.org/data/2.5/weather')
+WEATHER_TIMEOUT = (3.05, 10)
+
+
+class WeatherError(Exception):
+    """Raised when the weather for a location can't be fetched"""
+
+
+def normalize_location(location):
+    """
+    Canonical form of a location name, used as the cache key
+
+    Args:
+        location (str): Location as the user typed it (e.g. " Nairobi , KE ")
+
+    Returns:
+        str: Case-folded name with spacing and punctuation normalized (e.g. "nairobi,ke")
+    """
+    location = unicodedata.normalize('NFKC', location).casefold()
+    location = re.sub(r'\s*,\s*', ',', location)
+    location = re.sub(r'\s+', ' ', location)
+    return location.strip(' .,;:!?')
+
+
+def format_weather(location, data):
+    return (
+        f"📍 {location}\n"
+        f"🌡️ Temp: {data['main']['temp']}°C (Feels like {data['main']['feels_like']}°C)\n"
+        f"☁️ Conditions: {data['weather'][0]['description']}\n"
+        f"💧 Humidity: {data['main']['humidity']}%\n"
+        f"🌬️ Wind: {data['wind']['speed']} m/s"
+    )
+
+
+class _Entry:
+    __slots__ = ('data', 'fetched_at', 'hits')
+
+    def __init__(self, data, fetched_at):
+        self.data = data
+        self.fetched_at = fetched_at
+        self.hits = 0
+
+
+class _Call:
+    """An upstream fetch in progress that other lookups can wait on"""
+    __slots__ = ('done', 'data', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+        self.error = None
+
+
+class WeatherService:
+    def __init__(self, api_url=WEATHER_API_URL, api_key=None, ttl=600, refresh_ahead=0.8,
+                 hot_threshold=2, max_stale=3600, max_entries=5000, timeout=WEATHER_TIMEOUT,
+                 http=None, async_http=None, max_workers=8):
+        """
+        Initialize the service. The background thread pool starts on first use.
+
+        Args:
+            api_url (str): OpenWeatherMap current-weather endpoint (or a fake of it)
+            api_key (str): API key; defaults to WEATHER_API_KEY
+            ttl (int): Seconds a report is served from the cache
+            refresh_ahead (float): Share of the TTL after which a hot location is
+                refreshed in the background, so its readers never wait
+            hot_threshold (int): Cache hits since the last fetch that make a location hot
+            max_stale (int): Seconds past the TTL a report may still be served
+                when the upstream call fails
+            max_entries (int): Locations kept; the least recently used go first
+            timeout (float or tuple): (connect, read) timeout of upstream calls
+            http: Client with a requests-style get(); defaults to the shared pooled client
+            async_http: Client with an async get(); defaults to the shared async client
+            max_workers (int): Threads for background refreshes and batch lookups
+        """
+        self.api_url = api_url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.hot_threshold = hot_threshold
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.http = http or http_client
+        self.async_http = async_http or async_client
+        self.max_workers = max_workers
+        self._cache = OrderedDict()  # normalized location -> _Entry
+        self._inflight = {}  # normalized location -> _Call
+        self._ainflight = {}  # normalized location -> asyncio.Future of the async fetch
+        self._tasks = set()  # async background refreshes (referenced until done)
+        self._refreshing = set()  # locations with a background refresh queued or running
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0,
+                       "refreshes": 0, "stale_served": 0, "errors": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="weather")
+            return self._executor
+
+    def _params(self, key):
+        with self._lock:
+            self._stats["upstream_calls"] += 1
+        return {"q": key, "appid": self.api_key or os.getenv('WEATHER_API_KEY'), "units": "metric"}
+
+    @staticmethod
+    def _parse(response):
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code != 200 or 'main' not in data:
+            raise WeatherError(f"{response.status_code}: {data.get('message', 'unexpected response')}")
+        # Only cache responses that have every field the report shows
+        try:
+            format_weather("", data)
+        except (KeyError, IndexError, TypeError) as e:
+            raise WeatherError(f"{response.status_code}: incomplete response") from e
+        return data
+
+    def _store(self, key, data):
+        with self._lock:
+            self._cache[key] = _Entry(data, time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _fetch(self, key):
+        """Call the API for a normalized location"""
+        return self._parse(self.http.get(self.api_url, params=self._params(key), timeout=self.timeout))
+
+    async def _afetch(self, key):
+        """Call the API for a normalized location with the async client"""
+        return self._parse(await self.async_http.get(self.api_url, params=self._params(key), timeout=self.timeout))
+
+    def _load(self, key):
+        """
+        Fetch a location, sharing the call with concurrent lookups of the same one
+
+        Returns:
+            dict: OpenWeatherMap response
+        """
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.data
+
+        try:
+            call.data = self._fetch(key)
+            self._store(key, call.data)
+            return call.data
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def _refresh(self, key):
+        try:
+            self._load(key)
+        except Exception as e:
+            logger.warning("Weather refresh error (%s): %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _aload(self, key):
+        """_load for the event loop: concurrent lookups await one shared fetch"""
+        task = self._ainflight.get(key)
+        if task is None:
+            # The fetch is its own task, so cancelling the lookup that started
+            # it (a client disconnecting) doesn't cancel it for the others
+            task = self._ainflight[key] = asyncio.ensure_future(self._afetch_and_store(key))
+            task.add_done_callback(lambda done: self._afetch_done(key, done))
+        else:
+            with self._lock:
+                self._stats["coalesced"] += 1
+        # shield: a cancelled lookup only stops waiting
+        return await asyncio.shield(task)
+
+    async def _afetch_and_store(self, key):
+        data = await self._afetch(key)
+        self._store(key, data)
+        return data
+
+    def _afetch_done(self, key, task):
+        if self._ainflight.get(key) is task:
+            del self._ainflight[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here, so a fetch every lookup gave up on doesn't warn
+
+    async def _arefresh(self, key):
+        try:
+            await self._aload(key)
+        except Exception as e:
+            logger.warning("Weather refresh error (%s): %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _lookup(self, key):
+        """
+        A fresh cache entry, and whether a refresh-ahead should be started for
+        it (which is then marked as refreshing)
+
+        Returns:
+            tuple: (cached response or None when missing or expired, refresh)
+        """
+        now = time.monotonic()
+        refresh = False
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or now - entry.fetched_at >= self.ttl:
+                return None, False
+            self._cache.move_to_end(key)
+            entry.hits += 1
+            self._stats["hits"] += 1
+            if (now - entry.fetched_at >= self.ttl * self.refresh_ahead
+                    and entry.hits >= self.hot_threshold
+                    and key not in self._refreshing and key not in self._inflight
+                    and key not in self._ainflight):
+                self._refreshing.add(key)
+                self._stats["refreshes"] += 1
+                refresh = True
+        return entry.data, refresh
+
+    def _cached(self, key):
+        """
+        Serve a fresh cache entry, scheduling a refresh-ahead in the thread pool when it is hot
+
+        Returns:
+            dict: Cached response, or None when the entry is missing or expired
+        """
+        data, refresh = self._lookup(key)
+        if refresh:
+            self._get_executor().submit(self._refresh, key)
+        return data
+
+    def _acached(self, key):
+        """_cached for the event loop: the refresh-ahead is a task using the async client"""
+        data, refresh = self._lookup(key)
+        if refresh:
+            task = asyncio.get_running_loop().create_task(self._arefresh(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return data
+
+    def _stale(self, key, error):
+        """
+        A recent-enough report to serve when fetching failed
+
+        Raises:
+            WeatherError: When there is none
+        """
+        with self._lock:
+            self._stats["errors"] += 1
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry.fetched_at < self.ttl + self.max_stale:
+                self._stats["stale_served"] += 1
+                return entry.data
+        if isinstance(error, WeatherError):
+            raise error
+        raise WeatherError(str(error)) from error
+
+    def get(self, location):
+        """
+        Current weather for a location
+
+        Args:
+            location (str): Location name, in any case or spacing
+
+        Returns:
+            dict: OpenWeatherMap response
+
+        Raises:
+            WeatherError: The location is unknown or the API can't be reached
+                (and no recent report is cached)
+        """
+        key = normalize_location(location)
+        if not key:
+            raise WeatherError("No location given")
+        data = self._cached(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            self._stats["misses"] += 1
+        try:
+            return self._load(key)
+        except Exception as e:
+            return self._stale(key, e)
+
+    async def aget(self, location):
+        """
+        Async get(): answered on the event loop, with the async HTTP client on a miss
+
+        Args:
+            location (str): Location name, in any case or spacing
+
+        Returns:
+            dict: OpenWeatherMap response
+
+        Raises:
+            WeatherError: As get()
+        """
+        key = normalize_location(location)
+        if not key:
+            raise WeatherError("No location given")
+        data = self._acached(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            self._stats["misses"] += 1
+        try:
+            return await self._aload(key)
+        except Exception as e:
+            return self._stale(key, e)
+
+    def get_many(self, locations):
+        """
+        Current weather for many locations, fetched concurrently
+
+        Args:
+            locations (list): Location names; spellings of one place are fetched once
+
+        Returns:
+            dict: Location (as given) -> OpenWeatherMap response, or None when it
+                couldn't be fetched
+        """
+        def fetch(location):
+            try:
+                return self.get(location)
+            except WeatherError as e:
+                logger.warning("Weather error (%s): %s", location, e)
+                return None
+
+        by_key = {}
+        for location in locations:
+            by_key.setdefault(normalize_location(location), location)
+        keys = list(by_key)
+        results = dict(zip(keys, self._get_executor().map(fetch, [by_key[key] for key in keys])))
+        return {location: results[normalize_location(location)] for location in locations}
+
+    def report(self, location):
+        """
+        Weather report for a chat reply
+
+        Args:
+            location (str): Location name
+
+        Returns:
+            str: Formatted report, or an apology when it can't be fetched
+        """
+        try:
+            return format_weather(location.strip(), self.get(location))
+        except WeatherError as e:
+            logger.warning("Weather error: %s", e)
+            return "Couldn't fetch weather data"
+
+    async def areport(self, location):
+        """Async report(), for the ASGI app"""
+        try:
+            return format_weather(location.strip(), await self.aget(location))
+        except WeatherError as e:
+            logger.warning("Weather error: %s", e)
+            return "Couldn't fetch weather data"
+
+    def stats(self):
+        """
+        Cache statistics for this worker
+
+        Returns:
+            dict: Hit, miss, coalesced-lookup, upstream-call, refresh-ahead,
+                stale-served and error counters, the hit rate and the number of
+                cached locations
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._cache)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+# Global instance for use across the application
+weather = WeatherService(
+    ttl=int(os.getenv('WEATHER_CACHE_TTL', '600')),
+    refresh_ahead=float(os.getenv('WEATHER_REFRESH_AHEAD', '0.8')),
+    max_stale=int(os.getenv('WEATHER_MAX_STALE', '3600'))
+)